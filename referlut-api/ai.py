@@ -1,20 +1,206 @@
-import openai
-from typing import List, Dict, Optional, Any
+from typing import List, Dict, Optional, Any, AsyncIterator, Tuple
 import json
+import hashlib
 from pydantic import BaseModel, Field
 from datetime import datetime
-from openai import AsyncOpenAI
 import asyncio
-import random
 import logging
 import os
 
-# Initialize OpenAI client
-client = AsyncOpenAI()
+from resilience import CircuitBreaker, LatencyTracker, call_with_resilience
+from json_stream import iter_json_array
+from merchants import merchant_index, normalize_merchant
+from money import DISPLAY_CURRENCY, display_totals, from_minor, to_minor
+from cache import get_cache
+from local_classifier import LOCAL_CONFIDENCE_THRESHOLD, extract_features, flush_labels, get_model, record_label
+from recurring import monthly_subscription_cost
+from prompts import MAX_ITEM_TOKENS, PROMPT_BUDGETS, PromptBuilder, record_usage, truncate_tokens
+
+# OpenAI client, created on first use so importing this module stays cheap
+_client = None
+
+def get_client():
+    global _client
+    if _client is None:
+        from openai import AsyncOpenAI
+        _client = AsyncOpenAI()
+    return _client
 
 # Configure logger
 logger = logging.getLogger(__name__)
 
+# In-flight OpenAI requests keyed by their full payload, shared by identical concurrent calls,
+# and how many callers are still waiting on each
+_inflight_requests: Dict[str, asyncio.Task] = {}
+_inflight_waiters: Dict[asyncio.Task, int] = {}
+# In-flight streamed completions keyed the same way, fanned out to every identical caller
+_inflight_streams: Dict[str, "_SharedStream"] = {}
+coalescing_stats = {"upstream_calls": 0, "coalesced_calls": 0}
+
+# Per-call deadlines (seconds) so a slow provider can't hold a request past our budget
+DEFAULT_DEADLINES = {"gpt-3.5-turbo": 10.0, "gpt-4": 30.0}
+_breakers: Dict[str, CircuitBreaker] = {}
+_latencies: Dict[str, LatencyTracker] = {}
+
+def _request_key(request: Dict[str, Any]) -> str:
+    return hashlib.sha256(json.dumps(request, sort_keys=True, default=str).encode()).hexdigest()
+
+async def create_chat_completion(*, deadline: Optional[float] = None, hedge: bool = False, **request):
+    """
+    Call client.chat.completions.create, coalescing identical concurrent requests.
+
+    Requests with the same model, messages and parameters made while one is still in
+    flight await that call's result instead of issuing another upstream request.
+    Upstream calls run under a per-model deadline and circuit breaker (see
+    resilience.py); with `hedge`, a duplicate request is raced after the p95 latency.
+    Raises CircuitOpenError while the model's breaker is open, so callers fall back.
+
+    The upstream call runs in its own task, so cancelling one caller (a deadline or a
+    client disconnect) leaves it running for the others; it is cancelled only once no
+    caller is waiting for it any more.
+    """
+    key = _request_key(request)
+    task = _inflight_requests.get(key)
+    if task is not None:
+        coalescing_stats["coalesced_calls"] += 1
+    else:
+        coalescing_stats["upstream_calls"] += 1
+        task = asyncio.create_task(_upstream_completion(deadline, hedge, request))
+        _inflight_requests[key] = task
+        task.add_done_callback(lambda done: _finish_request(key, done))
+
+    _inflight_waiters[task] = _inflight_waiters.get(task, 0) + 1
+    try:
+        return await asyncio.shield(task)
+    finally:
+        _inflight_waiters[task] -= 1
+        if not _inflight_waiters[task]:
+            del _inflight_waiters[task]
+            if not task.done():
+                task.cancel()
+
+async def _upstream_completion(deadline: Optional[float], hedge: bool, request: Dict[str, Any]):
+    model = request.get("model", "")
+    response = await call_with_resilience(
+        lambda: get_client().chat.completions.create(**request),
+        deadline=deadline or DEFAULT_DEADLINES.get(model, 30.0),
+        breaker=_breakers.setdefault(model, CircuitBreaker(model)),
+        latency=_latencies.setdefault(model, LatencyTracker()),
+        hedge=hedge
+    )
+    record_usage(model, getattr(response, "usage", None))
+    return response
+
+def _finish_request(key: str, task: asyncio.Task):
+    if _inflight_requests.get(key) is task:
+        del _inflight_requests[key]
+    if not task.cancelled():
+        task.exception()  # waiters see it; don't warn when there are none
+
+class _SharedStream:
+    """
+    One upstream completion stream and the queues of the callers reading it. Callers that join
+    late are replayed the deltas published so far; None on a queue marks the end of the stream.
+    """
+    def __init__(self):
+        self.deltas: List[str] = []
+        self.queues: List[asyncio.Queue] = []
+        self.task: Optional[asyncio.Task] = None
+
+    def subscribe(self) -> asyncio.Queue:
+        queue: asyncio.Queue = asyncio.Queue()
+        for delta in self.deltas:
+            queue.put_nowait(delta)
+        if self.task.done():
+            queue.put_nowait(None)
+        self.queues.append(queue)
+        return queue
+
+    def publish(self, delta: Optional[str]):
+        if delta is not None:
+            self.deltas.append(delta)
+        for queue in self.queues:
+            queue.put_nowait(delta)
+
+async def stream_chat_completion(*, deadline: Optional[float] = None, **request) -> AsyncIterator[str]:
+    """
+    Call client.chat.completions.create with stream=True and yield the content deltas.
+
+    Identical concurrent streams are coalesced like create_chat_completion: one upstream stream
+    is read in its own task and every caller receives all of its deltas. The whole stream runs
+    under the model's deadline, circuit breaker and latency tracker, so a failure or timeout
+    mid-stream counts against the breaker. Streams are not hedged: deltas already handed to
+    callers can't be swapped for a faster duplicate's. The upstream stream is cancelled once no
+    caller is reading it any more.
+    """
+    key = _request_key({**request, "stream": True})
+    shared = _inflight_streams.get(key)
+    if shared is not None:
+        coalescing_stats["coalesced_calls"] += 1
+    else:
+        coalescing_stats["upstream_calls"] += 1
+        shared = _SharedStream()
+        shared.task = asyncio.create_task(_upstream_stream(shared, deadline, request))
+        _inflight_streams[key] = shared
+        shared.task.add_done_callback(lambda done: _finish_stream(key, shared, done))
+
+    queue = shared.subscribe()
+    try:
+        while True:
+            delta = await queue.get()
+            if delta is None:
+                break
+            yield delta
+        # raises the upstream error, if the stream ended with one
+        shared.task.result()
+    finally:
+        shared.queues.remove(queue)
+        if not shared.queues and not shared.task.done():
+            shared.task.cancel()
+
+async def _upstream_stream(shared: _SharedStream, deadline: Optional[float], request: Dict[str, Any]):
+    model = request.get("model", "")
+
+    async def read():
+        stream = await get_client().chat.completions.create(stream=True, stream_options={"include_usage": True}, **request)
+        try:
+            async for chunk in stream:
+                if chunk.usage is not None:
+                    record_usage(model, chunk.usage)
+                if chunk.choices and chunk.choices[0].delta.content:
+                    shared.publish(chunk.choices[0].delta.content)
+        finally:
+            await stream.close()
+
+    await call_with_resilience(
+        read,
+        deadline=deadline or DEFAULT_DEADLINES.get(model, 30.0),
+        breaker=_breakers.setdefault(model, CircuitBreaker(model)),
+        latency=_latencies.setdefault(model, LatencyTracker())
+    )
+
+def _finish_stream(key: str, shared: _SharedStream, task: asyncio.Task):
+    if _inflight_streams.get(key) is shared:
+        del _inflight_streams[key]
+    shared.publish(None)
+    if not task.cancelled():
+        task.exception()  # readers see it; don't warn when there are none
+
+def get_coalescing_stats() -> Dict[str, int]:
+    """Upstream OpenAI calls made versus calls saved by coalescing"""
+    return {
+        "upstream_calls": coalescing_stats["upstream_calls"],
+        "coalesced_calls": coalescing_stats["coalesced_calls"],
+        "in_flight": len(_inflight_requests) + len(_inflight_streams)
+    }
+
+def get_resilience_stats() -> Dict[str, Dict[str, Any]]:
+    """Circuit state and p95 latency per model"""
+    return {
+        model: {"circuit": breaker.state, "p95_seconds": _latencies[model].p95() if model in _latencies else None}
+        for model, breaker in _breakers.items()
+    }
+
 class Transaction(BaseModel):
     transactionId: str
     bookingDate: str
@@ -53,10 +239,44 @@ class Deal(BaseModel):
     expires: Optional[str] = Field(description="Deal expiration date")
     url: Optional[str] = Field(description="URL to access the deal")
 
+# Keyword rules used when the LLM is unavailable (circuit open, timeout, error)
+CATEGORY_KEYWORDS = {
+    "groceries": ["tesco", "sainsbury", "asda", "aldi", "lidl", "waitrose", "morrisons", "co-op", "ocado", "iceland"],
+    "transportation": ["tfl", "uber", "trainline", "national rail", "shell", "bp ", "esso", "parking", "bus", "rail"],
+    "dining_out": ["restaurant", "cafe", "coffee", "pret", "starbucks", "costa", "mcdonald", "nando", "deliveroo", "just eat", "pizza"],
+    "entertainment": ["netflix", "spotify", "disney", "prime video", "cinema", "odeon", "vue", "ticketmaster", "steam"],
+    "shopping": ["amazon", "asos", "zara", "h&m", "primark", "argos", "currys", "john lewis", "uniqlo", "ebay"],
+    "bills": ["rent", "council tax", "british gas", "octopus", "edf", "thames water", "vodafone", "ee ", "o2", "virgin media", "insurance"],
+}
+
+def classify_transaction_by_rules(transaction: Transaction) -> str:
+    """
+    Rule-based fallback classification by merchant keywords.
+    """
+    description = f" {transaction.remittanceInformationUnstructured.lower()} "
+    for category, keywords in CATEGORY_KEYWORDS.items():
+        if any(keyword in description for keyword in keywords):
+            return category
+    return "other"
+
+CLASSIFY_SYSTEM_PROMPT = (
+    "You are a financial transaction classifier. Categories: "
+    "groceries (supermarkets), transportation (transport, fuel, car), dining_out (restaurants, cafes, takeout), "
+    "entertainment (events, streaming), shopping (retail), bills (utilities, rent, subscriptions), other. "
+    "Input: description | amount | date | debit/credit. Respond with only the category name."
+)
+
 async def classify_transaction_with_llm(transaction: Transaction) -> str:
     """
     Classify a transaction into a category using OpenAI's GPT model.
     """
+    return (await _classify_with_llm(transaction))[0]
+
+async def _classify_with_llm(transaction: Transaction) -> Tuple[str, bool]:
+    """
+    The LLM's category and True, or the rule-based fallback and False when the call fails,
+    times out, the circuit is open or the answer is unusable.
+    """
     try:
         # Extract relevant information for classification
         description = transaction.remittanceInformationUnstructured
@@ -64,115 +284,161 @@ async def classify_transaction_with_llm(transaction: Transaction) -> str:
         date = transaction.bookingDate
         tx_type = "debit" if float(amount) < 0 else "credit"
 
-        # Create a prompt for the AI
-        prompt = f"""
-        Analyze this transaction and classify it into one of these categories:
-        - groceries (food, household items from supermarkets)
-        - transportation (public transport, fuel, car maintenance)
-        - dining_out (restaurants, cafes, takeout)
-        - entertainment (movies, events, subscriptions)
-        - shopping (clothes, electronics, general retail)
-        - bills (utilities, rent, subscriptions)
-        - other (anything that doesn't fit above)
-
-        Transaction details:
-        Description: {description}
-        Amount: {amount}
-        Date: {date}
-        Type: {tx_type}
-
-        Respond with ONLY the category name, nothing else.
-        """
+        # The category list lives in the system prompt; each request only adds one compact line
+        prompt = truncate_tokens(
+            f"{description} | {amount} | {date} | {tx_type}", PROMPT_BUDGETS["classify"], "gpt-3.5-turbo"
+        )
 
         # Call OpenAI API
-        response = await client.chat.completions.create(
+        response = await create_chat_completion(
             model="gpt-3.5-turbo",
             messages=[
-                {"role": "system", "content": "You are a financial transaction classifier. Respond with only the category name."},
+                {"role": "system", "content": CLASSIFY_SYSTEM_PROMPT},
                 {"role": "user", "content": prompt}
             ],
             temperature=0.3,
-            max_tokens=10
+            max_tokens=10,
+            deadline=5.0,
+            hedge=True
         )
 
         # Extract and validate the category
         content = response.choices[0].message.content
         if not content:
-            logger.warning("Empty response from AI. Defaulting to other category.")
-            return "other"
+            logger.warning("Empty response from AI. Falling back to rules.")
+            return classify_transaction_by_rules(transaction), False
 
         category = content.strip().lower()
         valid_categories = ["groceries", "transportation", "dining_out", "entertainment", "shopping", "bills", "other"]
 
         if category not in valid_categories:
-            logger.warning(f"Invalid category returned by AI: {category}")
-            return "other"
+            logger.warning(f"Invalid category returned by AI: {category}. Falling back to rules.")
+            return classify_transaction_by_rules(transaction), False
 
-        return category
+        # Keep the label as training data for the local classifier; the file append runs off the loop
+        if record_label(description, float(amount), transaction.proprietaryBankTransactionCode, category):
+            await asyncio.to_thread(flush_labels)
+        return category, True
 
     except Exception as e:
         logger.error(f"Error classifying transaction: {str(e)}")
-        return "other"
+        return classify_transaction_by_rules(transaction), False
+
+# Caches shared across worker processes on the node (see cache.py)
+classification_cache = get_cache("classification", ttl=30 * 24 * 3600)
+# Rule-based guesses made while the LLM was unavailable, kept briefly so an outage doesn't pin them for a month
+fallback_classification_cache = get_cache("classification_fallback", ttl=10 * 60)
+tips_cache = get_cache("tips", ttl=6 * 3600)
+deals_cache = get_cache("deals", ttl=12 * 3600)
+
+classification_stats = {"local": 0, "llm": 0}
+
+async def classify_transaction(transaction: Transaction) -> str:
+    """
+    Classify a transaction with the local model, escalating to the LLM only when it is unsure.
+    Results are cached per canonical merchant and direction.
+    """
+    return (await classify_transaction_checked(transaction))[0]
+
+async def classify_transaction_checked(transaction: Transaction) -> Tuple[str, bool]:
+    """
+    Like classify_transaction, but also says whether the category came from the local model
+    or the LLM (True) rather than the rule-based fallback used while the LLM is unavailable
+    (False). Only the former are cached for long, and only they should be stored.
+    """
+    amount_sign = "debit" if float(transaction.transactionAmount.get("amount", "0")) < 0 else "credit"
+    cache_key = f"{normalize_merchant(transaction.remittanceInformationUnstructured)}|{amount_sign}"
+    cached = classification_cache.get(cache_key)
+    if cached is not None:
+        return cached, True
+    fallback = fallback_classification_cache.get(cache_key)
+    if fallback is not None:
+        return fallback, False
+    category, reliable = await _classify_uncached(transaction)
+    (classification_cache if reliable else fallback_classification_cache).set(cache_key, category)
+    return category, reliable
+
+async def _classify_uncached(transaction: Transaction) -> Tuple[str, bool]:
+    # local classifier trained from LLM labels (see local_classifier.py), reloaded after retraining
+    model = get_model()
+    if model is not None:
+        features = extract_features(
+            transaction.remittanceInformationUnstructured,
+            float(transaction.transactionAmount.get("amount", "0")),
+            transaction.proprietaryBankTransactionCode
+        )
+        category, confidence = model.predict(features)
+        if confidence >= LOCAL_CONFIDENCE_THRESHOLD:
+            classification_stats["local"] += 1
+            return category, True
+    classification_stats["llm"] += 1
+    return await _classify_with_llm(transaction)
 
 async def analyze_transactions(transactions: List[Transaction]) -> SpendingAnalysis:
     """
     Analyze a list of transactions and return spending insights.
     """
-    category_spending = {}
-    top_merchants = {}
-    monthly_spending = {}
-    total_rewards = 0
+    # (key, currency) -> minor units, converted to the display currency at the end
+    category_spending: Dict[tuple, int] = {}
+    top_merchants: Dict[tuple, int] = {}
+    monthly_spending: Dict[tuple, int] = {}
+    total_rewards: Dict[tuple, int] = {}
 
     print("\n=== Transaction Classification Results ===")
     print("----------------------------------------")
 
     for transaction in transactions:
-        amount = float(transaction.transactionAmount["amount"])
+        currency = transaction.transactionAmount.get("currency") or DISPLAY_CURRENCY
+        minor = to_minor(transaction.transactionAmount["amount"], currency)
         merchant = transaction.remittanceInformationUnstructured
-        date = datetime.strptime(transaction.bookingDate, "%Y-%m-%d")
-        month_key = date.strftime("%Y-%m")
+        merchant_id = merchant_index.id_for(merchant)
+        month_key = transaction.bookingDate[:7]
 
-        # Classify transaction using LLM
-        category = await classify_transaction_with_llm(transaction)
+        # Classify transaction (local model first, LLM when unsure)
+        category = await classify_transaction(transaction)
 
         # Print classification result
         print(f"Transaction: {merchant}")
-        print(f"Amount: £{abs(amount):.2f}")
+        print(f"Amount: {abs(from_minor(minor, currency))} {currency}")
         print(f"Category: {category}")
         print("----------------------------------------")
 
         if category == "Rewards":
-            total_rewards += amount
+            total_rewards[("rewards", currency)] = total_rewards.get(("rewards", currency), 0) + minor
             continue
 
         if category == "Income":
             continue
 
         # Update category spending (use absolute value for spending)
-        category_spending[category] = category_spending.get(category, 0) + abs(amount)
+        category_spending[(category, currency)] = category_spending.get((category, currency), 0) + abs(minor)
 
         # Update merchant spending (use absolute value)
-        top_merchants[merchant] = top_merchants.get(merchant, 0) + abs(amount)
+        top_merchants[(merchant_id, currency)] = top_merchants.get((merchant_id, currency), 0) + abs(minor)
 
         # Update monthly spending (use absolute value)
-        monthly_spending[month_key] = monthly_spending.get(month_key, 0) + abs(amount)
+        monthly_spending[(month_key, currency)] = monthly_spending.get((month_key, currency), 0) + abs(minor)
 
+    category_totals = display_totals(category_spending)
     print("\n=== Spending Summary ===")
     print("Category Totals:")
-    for category, amount in category_spending.items():
+    for category, amount in category_totals.items():
         print(f"{category}: £{amount:.2f}")
 
-    print(f"\nTotal Rewards Earned: £{total_rewards:.2f}")
+    print(f"\nTotal Rewards Earned: £{display_totals(total_rewards).get('rewards', 0.0):.2f}")
 
     print("\nTop Merchants:")
-    sorted_merchants = dict(sorted(top_merchants.items(), key=lambda x: x[1], reverse=True)[:5])
+    sorted_merchants = {
+        merchant_index.name(merchant_id): amount
+        for merchant_id, amount in sorted(display_totals(top_merchants).items(), key=lambda x: x[1], reverse=True)[:5]
+    }
     for merchant, amount in sorted_merchants.items():
         print(f"{merchant}: £{amount:.2f}")
 
     return SpendingAnalysis(
-        category_spending=category_spending,
+        category_spending=category_totals,
         top_merchants=sorted_merchants,
-        monthly_spending=monthly_spending
+        monthly_spending=display_totals(monthly_spending)
     )
 
 async def get_spending_insights(prompt: str) -> str:
@@ -180,7 +446,7 @@ async def get_spending_insights(prompt: str) -> str:
     Generate spending insights based on a prompt with transaction data.
     """
     try:
-        response = await client.chat.completions.create(
+        response = await create_chat_completion(
             model="gpt-4",
             messages=[
                 {"role": "system", "content": "You are a financial advisor providing spending insights and recommendations."},
@@ -194,10 +460,12 @@ async def get_spending_insights(prompt: str) -> str:
         print(f"Error getting spending insights: {e}")
         return "Unable to generate spending insights at this time."
 
-async def scrape_best_deals(category: str) -> List[Dict[str, Any]]:
+async def stream_best_deals(category: str) -> AsyncIterator[Dict[str, Any]]:
     """
-    Find best deals based on the spending category.
-    Returns a list of deals relevant to the category.
+    Find best deals based on the spending category, yielding each deal as soon as its
+    JSON object closes in the streamed completion.
+
+    Falls back to the fixed deals for the category when the model produces none.
     """
     categories_mapping = {
         "Groceries": "supermarket deals",
@@ -211,34 +479,32 @@ async def scrape_best_deals(category: str) -> List[Dict[str, Any]]:
     }
 
     search_term = categories_mapping.get(category, category)
-
+    cache_key = f"{search_term}|{datetime.now().strftime('%Y-%m')}"
+    cached = deals_cache.get(cache_key)
+    if cached is not None:
+        for deal in cached:
+            yield deal
+        return
+
+    deals = []
     try:
         # Current date for contextual information
         current_date = datetime.now().strftime("%B %Y")
 
-        prompt = f"""
-        Find the current best deals for {search_term} available in the UK as of {current_date}.
-
-        For each deal, provide:
-        1. Title of the deal
-        2. Description of what the customer gets
-        3. The merchant/provider offering it
-        4. The discount percentage or amount
-        5. Expiration date (if applicable)
-        6. URL to access the deal (if available)
-
-        Return the deals as a JSON list with 5-8 deals. Each deal should have these fields:
-        - title: string
-        - description: string
-        - merchant: string
-        - discount: string
-        - expires: string (optional)
-        - url: string (optional)
-
-        Ensure all deals are current and actually available, not speculative.
-        """
-
-        response = await client.chat.completions.create(
+        # The category comes from the query string; cap it so the prompt stays within budget
+        search_term = truncate_tokens(search_term, MAX_ITEM_TOKENS, "gpt-4")
+        prompt = (
+            PromptBuilder("gpt-4", PROMPT_BUDGETS["deals"])
+            .text(
+                f"List 5-8 current deals on {search_term} available in the UK as of {current_date}; "
+                "only deals that actually exist. "
+                'Return JSON: {"deals": [{"title", "description", "merchant", "discount", "expires"?, "url"?}]}, '
+                "all values strings."
+            )
+            .build()
+        )
+
+        chunks = stream_chat_completion(
             model="gpt-4",
             messages=[
                 {"role": "system", "content": "You are a deals researcher who finds current promotions and offers."},
@@ -247,29 +513,29 @@ async def scrape_best_deals(category: str) -> List[Dict[str, Any]]:
             temperature=0.3,
             response_format={"type": "json_object"}
         )
-
-        content = response.choices[0].message.content
-
-        if not content:
-            return create_fallback_deals(category)
-
-        try:
-            deals_data = json.loads(content)
-            deals = deals_data.get("deals", [])
-
-            # If no deals were found or format is wrong, use fallback
-            if not deals or not isinstance(deals, list):
-                return create_fallback_deals(category)
-
-            return deals
-
-        except json.JSONDecodeError:
-            print(f"Error decoding JSON from response: {content}")
-            return create_fallback_deals(category)
-
+        async for deal in iter_json_array(chunks):
+            if isinstance(deal, dict) and deal.get("title"):
+                deals.append(deal)
+                yield deal
     except Exception as e:
         print(f"Error finding deals: {e}")
-        return create_fallback_deals(category)
+        if deals:
+            return
+    else:
+        if deals:
+            deals_cache.set(cache_key, deals)
+            return
+
+    # If no deals were found or format is wrong, use fallback
+    for deal in create_fallback_deals(category):
+        yield deal
+
+async def scrape_best_deals(category: str) -> List[Dict[str, Any]]:
+    """
+    Find best deals based on the spending category.
+    Returns a list of deals relevant to the category.
+    """
+    return [deal async for deal in stream_best_deals(category)]
 
 def create_fallback_deals(category: str) -> List[Dict[str, Any]]:
     """Create fallback deals when the API fails"""
@@ -391,10 +657,12 @@ def create_fallback_deals(category: str) -> List[Dict[str, Any]]:
 
     return category_deals.get(category, category_deals["Other"])
 
-async def analyze_spending_patterns(spending_data: SpendingAnalysis) -> List[SpendingTip]:
+async def analyze_spending_patterns(spending_data: SpendingAnalysis,
+                                    subscriptions: Optional[List[Dict[str, Any]]] = None) -> List[SpendingTip]:
     """
     Return tips based on actual spending patterns.
     Only returns tips for categories with non-zero spending.
+    `subscriptions` are the detected recurring payments (recurring.detect_subscriptions).
     """
     tips = []
 
@@ -436,19 +704,17 @@ async def analyze_spending_patterns(spending_data: SpendingAnalysis) -> List[Spe
             alternatives=["Home cooking", "Meal prep", "Special occasion dining"]
         ))
 
-    # Entertainment tip - based on subscription spending
-    if spending_data.category_spending.get("Entertainment", 0) > 0:
-        subscriptions = ["netflix", "spotify", "prime", "disney"]
-        has_multiple_subs = sum(1 for sub in subscriptions if any(sub in m.lower() for m in spending_data.top_merchants.keys())) > 1
-
-        if has_multiple_subs:
-            tips.append(SpendingTip(
-                category="Entertainment",
-                current_spending=spending_data.category_spending.get("Entertainment", 0),
-                tip="Consider consolidating your streaming subscriptions or sharing with family",
-                potential_savings=spending_data.category_spending.get("Entertainment", 0) * 0.3,
-                alternatives=["Family sharing", "Subscription rotation", "Free alternatives"]
-            ))
+    # Subscriptions tip - based on the recurring payments found by recurring.RecurringDetector
+    active = [s for s in subscriptions or [] if s.get("active")]
+    if len(active) > 1:
+        monthly_cost = monthly_subscription_cost(active)
+        tips.append(SpendingTip(
+            category="Subscriptions",
+            current_spending=monthly_cost,
+            tip=f"You have {len(active)} recurring payments costing about {monthly_cost:.2f} {DISPLAY_CURRENCY} a month. Cancel the ones you no longer use or share plans with family",
+            potential_savings=monthly_cost * 0.3,
+            alternatives=[s["merchant"] for s in active[:3]] + ["Family sharing", "Subscription rotation"]
+        ))
 
     # If we have no tips (all spending is zero), return a general tip
     if not tips:
@@ -462,105 +728,100 @@ async def analyze_spending_patterns(spending_data: SpendingAnalysis) -> List[Spe
 
     return tips
 
-async def get_expert_tips(spending_data: Dict) -> List[str]:
+def subscription_lines(subscriptions: List[Dict[str, Any]]) -> List[str]:
     """
-    Generate personalized financial advice using OpenAI's GPT model based on spending patterns.
+    Active recurring payments as prompt lines, most expensive first (the order detection returns).
     """
-    try:
-        # Check if OpenAI API key is configured
-        api_key = os.getenv("OPENAI_API_KEY")
-        if not api_key:
-            print("ERROR: OpenAI API key not found in environment variables")
-            return get_fallback_tips()
-
-        print("\n=== OpenAI Configuration ===")
-        print("API Key configured:", "Yes" if api_key else "No")
-
-        # Extract spending data
-        category_spending = spending_data.get("category_spending", {})
-        weekly_averages = spending_data.get("weekly_averages", {})
-
-        print("\n=== Preparing AI Prompt ===")
-        print("Category Spending:", json.dumps(category_spending, indent=2))
-        print("Weekly Averages:", json.dumps(weekly_averages, indent=2))
-
-        # Create a detailed prompt for the AI
-        prompt = f"""
-        Based on this user's spending data, provide 5 specific, actionable financial tips.
-        Focus on their actual spending patterns and provide personalized advice.
-
-        Category Spending:
-        {json.dumps(category_spending, indent=2)}
-
-        Weekly Averages:
-        {json.dumps(weekly_averages, indent=2)}
-
-        Provide tips that are:
-        1. Specific to their spending patterns
-        2. Actionable and practical
-        3. Focused on saving money
-        4. Based on their actual spending data
-        5. Personalized to their lifestyle
-
-        For each tip:
-        - Reference specific spending amounts
-        - Suggest concrete actions
-        - Explain potential savings
-        - Consider their spending habits
-
-        Return the tips as a JSON array of strings.
-        """
-
-        print("\n=== Calling OpenAI API ===")
-        print("Using model: gpt-3.5-turbo")
-
-        try:
-            # Call OpenAI API
-            response = await client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "system", "content": "You are a financial advisor providing personalized money-saving tips based on actual spending data."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.7,
-                response_format={"type": "json_object"}
-            )
-
-            content = response.choices[0].message.content
-            print("\n=== API Response ===")
-            print("Raw response:", content)
-
-            if not content:
-                print("No content in API response, using fallback tips")
-                return get_fallback_tips()
-
-            try:
-                tips_data = json.loads(content)
-                tips = tips_data.get("tips", [])
-                if not tips or not isinstance(tips, list):
-                    print("Invalid tips format in API response, using fallback tips")
-                    return get_fallback_tips()
-
-                print("\n=== Parsed Tips ===")
-                for i, tip in enumerate(tips, 1):
-                    print(f"{i}. {tip}")
+    return [
+        f"{s['merchant']}: {s['amount']:.2f} {s.get('currency') or DISPLAY_CURRENCY} {s['cadence']}"
+        for s in subscriptions if s.get("active")
+    ]
 
-                return tips
+def build_tips_prompt(category_spending: Dict[str, float], weekly_averages: Dict[str, float],
+                      subscriptions: Optional[List[str]] = None) -> str:
+    # Spending maps are sent as compact JSON, largest categories first, within the tips budget
+    builder = (
+        PromptBuilder("gpt-3.5-turbo", PROMPT_BUDGETS["tips"])
+        .text("Based on this user's spending data (GBP), provide 5 specific, actionable money-saving tips.")
+        .amounts("Category spending", category_spending)
+        .amounts("Weekly averages", weekly_averages)
+    )
+    if subscriptions:
+        builder.items("Recurring payments", subscriptions)
+    return (
+        builder.text(
+            "Each tip should reference their actual amounts, suggest a concrete action and estimate the saving. "
+            'Return JSON: {"tips": [string, ...]}.'
+        )
+        .build()
+    )
 
-            except json.JSONDecodeError as e:
-                print(f"Error decoding JSON from response: {e}")
-                print("Raw content:", content)
-                return get_fallback_tips()
+async def stream_expert_tips(spending_data: Dict) -> AsyncIterator[str]:
+    """
+    Personalized financial tips from OpenAI's GPT model, yielded one at a time as each
+    tip's JSON string closes in the streamed completion.
 
-        except Exception as api_error:
-            print(f"OpenAI API Error: {str(api_error)}")
-            print("API Error Details:", api_error.__class__.__name__)
-            return get_fallback_tips()
+    Falls back to the fixed tips when the model produces none; a stream that fails
+    part-way ends after the tips it already yielded.
+    """
+    # Check if OpenAI API key is configured
+    if not os.getenv("OPENAI_API_KEY"):
+        print("ERROR: OpenAI API key not found in environment variables")
+        for tip in get_fallback_tips():
+            yield tip
+        return
+
+    # Extract spending data
+    category_spending = spending_data.get("category_spending", {})
+    weekly_averages = spending_data.get("weekly_averages", {})
+    subscriptions = subscription_lines(spending_data.get("subscriptions", []))
+
+    cache_key = _request_key({
+        "category_spending": category_spending,
+        "weekly_averages": weekly_averages,
+        "subscriptions": subscriptions
+    })
+    cached = tips_cache.get(cache_key)
+    if cached is not None:
+        for tip in cached:
+            yield tip
+        return
 
+    tips = []
+    try:
+        prompt = build_tips_prompt(category_spending, weekly_averages, subscriptions)
+        chunks = stream_chat_completion(
+            model="gpt-3.5-turbo",
+            messages=[
+                {"role": "system", "content": "You are a financial advisor providing personalized money-saving tips based on actual spending data."},
+                {"role": "user", "content": prompt}
+            ],
+            temperature=0.7,
+            response_format={"type": "json_object"}
+        )
+        async for tip in iter_json_array(chunks):
+            if isinstance(tip, str) and tip:
+                tips.append(tip)
+                yield tip
     except Exception as e:
         print(f"Error generating expert tips: {e}")
         print("Error Details:", e.__class__.__name__)
-        return get_fallback_tips()
+        if tips:
+            return
+    else:
+        if tips:
+            tips_cache.set(cache_key, tips)
+            return
+        print("Invalid tips format in API response, using fallback tips")
+
+    for tip in get_fallback_tips():
+        yield tip
+
+async def get_expert_tips(spending_data: Dict) -> List[str]:
+    """
+    Generate personalized financial advice using OpenAI's GPT model based on spending patterns.
+    """
+    return [tip async for tip in stream_expert_tips(spending_data)]
 
 def get_fallback_tips() -> List[str]:
     """Provide fallback tips when the API fails"""
@@ -0,0 +1,305 @@
+import time
+import asyncio
+from collections import OrderedDict
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from ai import classify_transaction_checked, get_expert_tips, scrape_best_deals, stream_best_deals
+from merchants import normalize_merchant
+from money import DISPLAY_CURRENCY, display_totals, get_fx_rates, minor_units_by_currency, to_minor, unconverted_currencies
+from records import TransactionRecord
+from recurring import RecurringDetector, detect_subscriptions
+from storage import Storage
+
+INSIGHT_MONTHS = 12  # history covered by the precomputed insights
+# History the recurring-payment detector is fed: an annual charge is only recognised with its
+# previous renewal in view, and the latest one can be up to a year old
+RECURRING_MONTHS = 25
+TOP_DEAL_CATEGORIES = 3  # spending categories we look for deals in
+TOP_MERCHANTS = 10
+SNAPSHOT_TTL = 5 * 60  # seconds a snapshot is served before it is rebuilt, even at the same version
+MAX_DETECTORS = 1024  # users whose recurring-payment detectors the precompute worker keeps between runs
+CLASSIFY_CONCURRENCY = 8  # classifications (local model or LLM calls) in flight per classify_records call
+
+def records_from_transactions(transactions: List[Dict[str, Any]]) -> List[TransactionRecord]:
+    """
+    Nordigen-shaped transactions from our own code (mock_data) as records build_insights can read.
+    """
+    records = []
+    for tx in transactions:
+        amount = tx.get("transactionAmount", {})
+        merchant = tx.get("remittanceInformationUnstructured")
+        records.append(TransactionRecord(
+            transaction_id=tx.get("transactionId"),
+            amount=amount.get("amount", 0),
+            amount_minor=to_minor(amount.get("amount", 0), amount.get("currency")),
+            currency=amount.get("currency"),
+            merchant_name=merchant,
+            merchant_canonical=normalize_merchant(merchant),
+            booking_date=tx.get("bookingDate"),
+            value_date=tx.get("valueDate"),
+            proprietary_bank_transaction_code=tx.get("proprietaryBankTransactionCode"),
+            internal_transaction_id=tx.get("internalTransactionId")
+        ))
+    return records
+
+def week_key(day: str) -> str:
+    booked = date.fromisoformat(day[:10])
+    return (booked - timedelta(days=booked.weekday())).isoformat()
+
+def build_insights(records: List[TransactionRecord], currency: str = DISPLAY_CURRENCY) -> Dict[str, Any]:
+    """
+    Everything the statistics and AI endpoints derive from a user's classified transactions, in one pass:
+    the statistics summary, the weekly spending chart, spend per category and its weekly average.
+
+    Sums are exact integers in minor units per currency, converted to `currency` once at the end.
+    """
+    # (key, currency) -> minor units
+    totals: Dict[Tuple[str, str], int] = {}
+    category_spending: Dict[Tuple[str, str], int] = {}
+    monthly_spending: Dict[Tuple[str, str], int] = {}
+    merchant_totals: Dict[Tuple[str, str], int] = {}
+    weekly: Dict[Tuple[str, str], int] = {}
+    weekly_categories: Dict[Tuple[Tuple[str, str], str], int] = {}
+
+    for record in records:
+        day = record.booking_date
+        if not day:
+            continue
+        minor = record.minor
+        source = record.currency or currency
+        category = record.spending_category or "other"
+        merchant = record.merchant_canonical or normalize_merchant(record.merchant_name)
+
+        monthly_spending[(day[:7], source)] = monthly_spending.get((day[:7], source), 0) + minor
+        category_spending[(category, source)] = category_spending.get((category, source), 0) + minor
+        merchant_totals[(merchant, source)] = merchant_totals.get((merchant, source), 0) + minor
+        if minor >= 0:
+            totals[("income", source)] = totals.get(("income", source), 0) + minor
+            continue
+
+        week = week_key(day)
+        totals[("spending", source)] = totals.get(("spending", source), 0) - minor
+        weekly[(week, source)] = weekly.get((week, source), 0) - minor
+        weekly_categories[((week, category), source)] = weekly_categories.get(((week, category), source), 0) - minor
+
+    rates = get_fx_rates()
+    display_total = display_totals(totals, currency, rates)
+    weekly_display = display_totals(weekly, currency, rates)
+    weekly_categories_display = display_totals(weekly_categories, currency, rates)
+    merchants_display = display_totals(merchant_totals, currency, rates)
+
+    chart: Dict[str, Dict[str, Any]] = {week: {"total": total, "categories": {}} for week, total in weekly_display.items()}
+    category_weeks: Dict[str, Dict[str, float]] = {}
+    for (week, category), spend in weekly_categories_display.items():
+        chart.setdefault(week, {"total": 0.0, "categories": {}})["categories"][category] = spend
+        category_weeks.setdefault(category, {})[week] = spend
+
+    spending_by_category = {category: sum(weeks.values()) for category, weeks in category_weeks.items()}
+    return {
+        "summary": {
+            "total_spending": display_total.get("spending", 0.0),
+            "total_income": display_total.get("income", 0.0),
+            "category_spending": display_totals(category_spending, currency, rates),
+            "monthly_spending": display_totals(monthly_spending, currency, rates),
+            "top_merchants": dict(sorted(merchants_display.items(), key=lambda x: x[1], reverse=True)[:TOP_MERCHANTS]),
+            "savings_opportunities": [],
+            "currency": currency,
+            # exact sums the display amounts were converted from
+            "minor_units_by_currency": minor_units_by_currency(totals),
+            "unconverted_currencies": unconverted_currencies(totals, currency, rates)
+        },
+        "weekly": [
+            {"week": week, "total": data["total"], "categories": data["categories"]}
+            for week, data in sorted(chart.items())
+        ],
+        "spending_by_category": spending_by_category,
+        "weekly_averages": {
+            category: sum(weeks.values()) / len(weeks) for category, weeks in category_weeks.items()
+        }
+    }
+
+def top_spending_categories(spending_by_category: Dict[str, float], n: int = TOP_DEAL_CATEGORIES) -> List[str]:
+    return [category for category, _ in sorted(spending_by_category.items(), key=lambda x: x[1], reverse=True)[:n]]
+
+async def classify_records(records: List[TransactionRecord]) -> Dict[str, str]:
+    """
+    Classify the records that have no spending category yet, in place, once per canonical merchant
+    and direction with at most CLASSIFY_CONCURRENCY classifications in flight.
+
+    Returns transaction_id -> category for the categories worth storing: those from the rule-based
+    fallback (see ai.classify_transaction_checked) are only set on the records for this run.
+    """
+    # (canonical merchant, debit) -> records sharing that classification
+    groups: Dict[Tuple[str, bool], List[TransactionRecord]] = {}
+    for record in records:
+        if not record.spending_category:
+            merchant = record.merchant_canonical or normalize_merchant(record.merchant_name)
+            groups.setdefault((merchant, record.minor < 0), []).append(record)
+    semaphore = asyncio.Semaphore(CLASSIFY_CONCURRENCY)
+
+    async def classify(record: TransactionRecord) -> Tuple[str, bool]:
+        async with semaphore:
+            return await classify_transaction_checked(record)
+
+    results = await asyncio.gather(*(classify(group[0]) for group in groups.values()))
+    classified: Dict[str, str] = {}
+    for group, (category, reliable) in zip(groups.values(), results):
+        for record in group:
+            record.spending_category = category
+            if reliable:
+                classified[record.transaction_id] = category
+    return classified
+
+async def find_deals(categories: List[str]) -> List[Dict[str, Any]]:
+    results = await asyncio.gather(*(scrape_best_deals(category) for category in categories))
+    # copy: scrape_best_deals may hand back cached dicts
+    return [{**deal, "category": category} for category, category_deals in zip(categories, results) for deal in category_deals]
+
+async def stream_deals(categories: List[str]) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Deals for several categories as they arrive, streaming every category at once.
+    """
+    queue: asyncio.Queue = asyncio.Queue()
+    finished = object()
+
+    async def pump(category: str):
+        try:
+            async for deal in stream_best_deals(category):
+                await queue.put({**deal, "category": category})
+        finally:
+            await queue.put(finished)
+
+    tasks = [asyncio.create_task(pump(category)) for category in categories]
+    try:
+        remaining = len(tasks)
+        while remaining:
+            item = await queue.get()
+            if item is finished:
+                remaining -= 1
+            else:
+                yield item
+    finally:
+        for task in tasks:
+            task.cancel()
+
+def derive_statistics(records: List[TransactionRecord],
+                      subscriptions: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
+    """
+    The statistics panels for records that have already been classified; no AI calls.
+    Recurring payments are detected from `records` unless already known (`subscriptions`).
+    """
+    insights = build_insights(records)
+    return {
+        **insights,
+        "top_categories": top_spending_categories(insights["spending_by_category"]),
+        "subscriptions": subscriptions if subscriptions is not None else detect_subscriptions(records),
+        "transaction_count": len(records),
+        "computed_at": datetime.now(timezone.utc).isoformat()
+    }
+
+async def derive_ai_panels(statistics: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Expert tips and deals for the statistics from derive_statistics.
+    """
+    tips, deals = await asyncio.gather(
+        get_expert_tips({
+            "category_spending": statistics["spending_by_category"],
+            "weekly_averages": statistics["weekly_averages"],
+            "subscriptions": statistics.get("subscriptions", [])
+        }),
+        find_deals(statistics["top_categories"])
+    )
+    return {"tips": tips, "deals": deals}
+
+async def derive_insights(records: List[TransactionRecord],
+                          subscriptions: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
+    """
+    Insights, tips and deals for records that have already been classified.
+    """
+    statistics = derive_statistics(records, subscriptions)
+    return {**statistics, **await derive_ai_panels(statistics)}
+
+# Recurring-payment detectors kept across precompute runs, so each run only feeds in new transactions
+_detectors: "OrderedDict[str, RecurringDetector]" = OrderedDict()
+
+def user_detector(user_id: str) -> RecurringDetector:
+    detector = _detectors.pop(user_id, None) or RecurringDetector()
+    _detectors[user_id] = detector
+    if len(_detectors) > MAX_DETECTORS:
+        _detectors.popitem(last=False)
+    return detector
+
+async def precompute_user_insights(storage: Storage, user_id: str, months: int = INSIGHT_MONTHS) -> Dict[str, Any]:
+    """
+    Classify the user's new transactions, rebuild their insights, regenerate tips and deals,
+    and store the result for the API to serve.
+    """
+    since = (date.today() - timedelta(days=30 * months)).isoformat()
+    history = storage.user_transaction_records(
+        user_id, date.today() - timedelta(days=30 * max(months, RECURRING_MONTHS))
+    )
+    # statistics and classification cover the insight window, recurring payments the whole history
+    records = [record for record in history if (record.booking_date or "") >= since]
+    classified = await classify_records(records)
+    if classified:
+        storage.set_spending_categories(classified)
+    detector = user_detector(user_id)
+    detector.add(history)
+    rec = {"user_id": user_id, **await derive_insights(records, detector.subscriptions())}
+    storage.save_user_insights(rec)
+    return rec
+
+class SnapshotStore:
+    """
+    Per-user analytics snapshots shared by every endpoint that reads them.
+
+    A snapshot is reused while the user's data version is unchanged and it is younger
+    than `ttl`; precomputed insights are versioned by their computed_at, so the worker's
+    next write is picked up on the following request without invalidation. Concurrent requests for a missing snapshot await a single build, which
+    runs in its own task: cancelling the request that started it leaves it running for
+    the others, and its result is cached either way.
+    """
+    def __init__(self, ttl: float = SNAPSHOT_TTL, max_users: int = 4096):
+        self.ttl = ttl
+        self.max_users = max_users
+        # user_id -> (version, built at monotonic time, snapshot)
+        self.snapshots: "OrderedDict[str, Tuple[str, float, Dict[str, Any]]]" = OrderedDict()
+        self._inflight: Dict[Tuple[str, str], asyncio.Task] = {}
+        self.stats = {"hits": 0, "builds": 0, "shared_builds": 0}
+
+    async def get(self, user_id: str, version: str, build: Callable[[], Awaitable[Dict[str, Any]]]) -> Dict[str, Any]:
+        entry = self.snapshots.get(user_id)
+        if entry is not None and entry[0] == version and time.monotonic() - entry[1] < self.ttl:
+            self.snapshots.move_to_end(user_id)
+            self.stats["hits"] += 1
+            return entry[2]
+
+        key = (user_id, version)
+        task = self._inflight.get(key)
+        if task is not None:
+            self.stats["shared_builds"] += 1
+        else:
+            self.stats["builds"] += 1
+            task = asyncio.create_task(self._build(user_id, version, build))
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._finish(key, done))
+        return await asyncio.shield(task)
+
+    async def _build(self, user_id: str, version: str, build: Callable[[], Awaitable[Dict[str, Any]]]) -> Dict[str, Any]:
+        snapshot = await build()
+        self.snapshots[user_id] = (version, time.monotonic(), snapshot)
+        self.snapshots.move_to_end(user_id)
+        if len(self.snapshots) > self.max_users:
+            self.snapshots.popitem(last=False)
+        return snapshot
+
+    def _finish(self, key: Tuple[str, str], task: asyncio.Task):
+        del self._inflight[key]
+        if not task.cancelled():
+            task.exception()  # waiters see it; don't warn when there are none
+
+# Process-wide snapshots used by the statistics and AI endpoints: the statistics panels on their own,
+# so they never wait for the AI calls, and the full snapshot with tips and deals
+statistics_snapshots = SnapshotStore()
+analytics_snapshots = SnapshotStore()
@@ -1,10 +1,18 @@
 import os
+import json
+import time
+import hashlib
 from nordigen import NordigenClient
 from dotenv import load_dotenv
-from datetime import datetime, timedelta, timezone
-from supabase import create_client, Client
-from typing import Literal
-from postgrest.types import CountMethod
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, List, Literal, Optional
+from scheduler import PRIORITY_NEW
+from merchants import normalize_merchant
+from money import row_minor, to_minor
+from heavy_hitters import GLOBAL_SCOPE, SpaceSaving, merchant_heavy_hitters
+from quota import DAILY_FETCH_LIMIT, QUOTA_WINDOW, PLANNED_SCOPES, next_refresh_at
+from storage import get_storage
+from notifier import notify_queue
 
 # Load environment variables
 load_dotenv()
@@ -16,62 +24,69 @@ print(f"NORDIGEN_SECRET_KEY: {'Set' if os.getenv('NORDIGEN_SECRET_KEY') else 'No
 
 NORDIGEN_SECRET_ID = os.getenv("NORDIGEN_SECRET_ID", "")
 NORDIGEN_SECRET_KEY = os.getenv("NORDIGEN_SECRET_KEY", "")
-SUPABASE_URL = os.getenv("SUPABASE_URL", "")
-SUPABASE_KEY = os.getenv("SUPABASE_KEY", "")
 
-# Validate required environment variables
-if not SUPABASE_URL or not SUPABASE_KEY:
-    raise ValueError("SUPABASE_URL and SUPABASE_KEY environment variables must be set")
+# Nordigen client; constructing it is cheap, the token exchange happens on first use
+client = NordigenClient(
+    secret_id=NORDIGEN_SECRET_ID,
+    secret_key=NORDIGEN_SECRET_KEY,
+    base_url="https://bankaccountdata.gocardless.com/api/v2"
+)
+_nordigen_ready = False
 
-# Initialize Nordigen client with debug logging
-try:
-    client = NordigenClient(
-        secret_id=NORDIGEN_SECRET_ID,
-        secret_key=NORDIGEN_SECRET_KEY,
-        base_url="https://bankaccountdata.gocardless.com/api/v2"
-    )
-
-    # Create new access and refresh token
-    # Parameters can be loaded from .env or passed as a string
-    # Note: access_token is automatically injected to other requests after you successfully obtain it
-    token_data = client.generate_token()
+def nordigen() -> NordigenClient:
+    """
+    Return the Nordigen client, obtaining its access token on first use.
+    """
+    global _nordigen_ready
+    if not _nordigen_ready:
+        try:
+            # Create new access and refresh token
+            # Parameters can be loaded from .env or passed as a string
+            # Note: access_token is automatically injected to other requests after you successfully obtain it
+            token_data = client.generate_token()
+
+            # Use existing token
+            client.token = "YOUR_TOKEN"
+            client.exchange_token(token_data["refresh"])
+            _nordigen_ready = True
+            print("Nordigen client initialized successfully")
+        except Exception as e:
+            print(f"Error initializing Nordigen client: {str(e)}")
+            raise
+    return client
 
-    # Use existing token
-    client.token = "YOUR_TOKEN"
-    new_token = client.exchange_token(token_data["refresh"])
+# Supabase by default; see storage.STORAGE_BACKEND
+storage = get_storage()
 
-    print("Nordigen client initialized successfully")
-except Exception as e:
-    print(f"Error initializing Nordigen client: {str(e)}")
+def can_fetch(account_id: str, scope: Literal['account','details','balances','transactions']) -> bool:
+    since = datetime.now(timezone.utc) - QUOTA_WINDOW
+    # count fetches for this account and scope in last 24h, from its rolling counter
+    return storage.count_fetches(account_id, scope, since) < DAILY_FETCH_LIMIT
 
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+def recent_fetches(account_id: str, scope: Literal['account','details','balances','transactions']) -> List[datetime]:
+    """
+    Timestamps of fetches for this account and scope inside the quota window.
+    """
+    return storage.fetch_times(account_id, scope, datetime.now(timezone.utc) - QUOTA_WINDOW)
 
-def can_fetch(account_id: str, scope: Literal['account','details','balances','transactions']) -> bool:
-    since = (datetime.now(timezone.utc) - timedelta(hours=24)).isoformat()
-    # count logs for this account and scope in last 24h
-    result = supabase.table('fetch_logs').select('*', count=CountMethod.exact, head=True) \
-        .eq('account_id', account_id) \
-        .eq('scope', scope) \
-        .gte('fetched_at', since) \
-        .execute()
-    return (result.count or 0) < 4
-    return (result.count or 0) < 4
+def plan_refreshes(account_id: str, user_triggered: bool = False) -> Dict[str, datetime]:
+    """
+    Next planned refresh time for each of the account's balance and transaction scopes.
+    """
+    now = datetime.now(timezone.utc)
+    return {scope: next_refresh_at(recent_fetches(account_id, scope), now, user_triggered) for scope in PLANNED_SCOPES}
 
 def log_fetch(account_id: str, scope: Literal['account','details','balances','transactions']):
-    supabase.table('fetch_logs').insert({
-        'account_id': account_id,
-        'scope': scope,
-        'fetched_at': datetime.now(timezone.utc).isoformat()
-    }).execute()
+    # the counter only needs as many fetch times as the quota can count
+    storage.log_fetch(account_id, scope, datetime.now(timezone.utc), keep=DAILY_FETCH_LIMIT)
 
 def verify_supabase_table():
     try:
-        # Try to create the table if it doesn't exist
-        supabase.table("requisitions").select("*").limit(1).execute()
-        print("Supabase requisitions table exists")
+        storage.verify()
+        print(f"{type(storage).__name__} requisitions table exists")
     except Exception as e:
-        print(f"Error verifying Supabase table: {str(e)}")
-        print("Please ensure the requisitions table exists in your Supabase database with the following columns:")
+        print(f"Error verifying storage table: {str(e)}")
+        print("Please ensure the requisitions table exists in your database with the following columns:")
         print("- requisition_id (text, primary key)")
         print("- user_id (text)")
         print("- institution_id (text)")
@@ -79,18 +94,15 @@ def verify_supabase_table():
         print("- status (text)")
         raise
 
-# Verify Supabase table on startup
-verify_supabase_table()
-
 def get_institutions(country_code: str = "GB"):
     # Fetch available institutions for the given country
-    institutions = client.institution.get_institutions(country=country_code)
+    institutions = nordigen().institution.get_institutions(country=country_code)
     return institutions
 
 def initiate_requisition(user_id: str, institution_id: str, redirect_url: str):
     try:
         # Create a requisition for the user to link their bank account
-        requisition = client.requisition.create_requisition(
+        requisition = nordigen().requisition.create_requisition(
             redirect_uri=redirect_url,
             institution_id=institution_id,
             reference_id=user_id
@@ -100,18 +112,17 @@ def initiate_requisition(user_id: str, institution_id: str, redirect_url: str):
 
         # Store the requisition details in Supabase immediately
         try:
-            result = supabase.table("requisitions").insert({
+            result = storage.insert_requisition({
                 "requisition_id": requisition_id,
                 "user_id": user_id,
                 "institution_id": institution_id,
                 "created_at": datetime.now().isoformat(),
                 "status": "CR"  # Created status
-            }).execute()
-            print(f"Supabase insert result: {result}")
+            })
+            print(f"Requisition insert result: {result}")
         except Exception as e:
-            print(f"Supabase error: {str(e)}")
-            print(f"Supabase URL: {SUPABASE_URL}")
-            print(f"Supabase Key length: {len(SUPABASE_KEY) if SUPABASE_KEY else 0}")
+            print(f"Storage error: {str(e)}")
+            print(f"Storage backend: {type(storage).__name__}")
             raise
 
         return {"link": consent_link, "requisition_id": requisition_id}
@@ -121,20 +132,18 @@ def initiate_requisition(user_id: str, institution_id: str, redirect_url: str):
 
 def handle_requisition_callback(ref: str):
     # First try to find the requisition by reference (user_id)
-    response = supabase.table("requisitions").select("*").eq("user_id", ref).order("created_at", desc=True).limit(1).execute()
+    latest = storage.latest_requisition(ref)
 
-    if not response.data:
+    if not latest:
         raise Exception("No requisition found for this reference")
 
-    requisition_id = response.data[0]["requisition_id"]
+    requisition_id = latest["requisition_id"]
 
     # Exchange the requisition ID for access tokens and store in Supabase
-    requisition = client.requisition.get_requisition_by_id(requisition_id)
+    requisition = nordigen().requisition.get_requisition_by_id(requisition_id)
     if requisition["status"] == "LN":
         # Update the requisition status in Supabase
-        supabase.table("requisitions").update({
-            "status": "LN"
-        }).eq("requisition_id", requisition_id).execute()
+        storage.update_requisition_status(requisition_id, "LN")
         return {"status": "success", "requisition": requisition}
     return {"status": "error", "message": "Requisition not linked"}
 
@@ -143,7 +152,7 @@ def fetch_accounts(requisition_id: str, user_id: str):
     Fetch all accounts for a given requisition, upsert metadata into Supabase,
     enqueue each account for transaction import, and return the account records.
     """
-    requisition = client.requisition.get_requisition_by_id(requisition_id)
+    requisition = nordigen().requisition.get_requisition_by_id(requisition_id)
     account_ids = requisition.get("accounts", [])
     records = []
     for account_id in account_ids:
@@ -161,9 +170,9 @@ def fetch_accounts(requisition_id: str, user_id: str):
         # 5. Append the account to the queue for transactions to be processed
 
         # Safely check existing account without erroring if no rows
-        existing = supabase.table('accounts').select('*').eq('account_id', account_id).limit(1).execute()
-        if existing.data:
-            records.append(existing.data[0])
+        existing = storage.get_account(account_id)
+        if existing:
+            records.append(existing)
             continue
         # Account not found locally; initialize empty info
         fetched_account = False
@@ -173,22 +182,21 @@ def fetch_accounts(requisition_id: str, user_id: str):
         metadata = {}
         details = {}
 
-        if can_fetch(account_id, 'account'):
-            acct = client.account_api(id=account_id)
-            metadata = acct.get_metadata()
-            fetched_account = True
-        else:
+        # Both calls are needed to build the record, so don't spend one without the other
+        if not can_fetch(account_id, 'account'):
             # If we cannot fetch, then we will have to log an error that we cannot fetch the account and continue
             print(f"Cannot fetch account {account_id} due to rate limit")
             continue
-
-        if can_fetch(account_id, 'details'):
-            details = acct.get_details()
-            fetched_details = True
-        else:
+        if not can_fetch(account_id, 'details'):
             print(f"Cannot fetch account details for {account_id} due to rate limit")
             continue
 
+        acct = nordigen().account_api(id=account_id)
+        metadata = acct.get_metadata()
+        fetched_account = True
+        details = acct.get_details()
+        fetched_details = True
+
 
         # pull metadata because these fields need irt
         ''''
@@ -212,7 +220,7 @@ def fetch_accounts(requisition_id: str, user_id: str):
             "currency": details.get("account", {}).get("currency"),
             "user_id": user_id
         }
-        supabase.table("accounts").upsert(rec, on_conflict="account_id").execute()
+        storage.upsert_account(rec)
 
         # Log fetches after the account record exists
         if fetched_account:
@@ -221,11 +229,15 @@ def fetch_accounts(requisition_id: str, user_id: str):
             log_fetch(account_id, 'details')
 
         # Enqueue for transaction fetching
-        supabase.table("account_queue").upsert({
+        storage.enqueue_account({
             "account_id": account_id,
             "user_id": user_id,
-            "status": "pending"
-        }, on_conflict="account_id").execute()
+            "status": "pending",
+            "priority": PRIORITY_NEW,
+            "attempts": 0,
+            "next_attempt_at": None
+        })
+        notify_queue(account_id)
         records.append(rec)
     return records
 
@@ -236,50 +248,221 @@ def fetch_balances(account_id: str):
     # GET balances if under daily limit
     if not can_fetch(account_id, 'balances'):
         return []
-    acct = client.account_api(id=account_id)
+    acct = nordigen().account_api(id=account_id)
     resp = acct.get_balances()
     log_fetch(account_id, 'balances')
     return resp.get('balances', [])
 
-def fetch_transactions(account_id: str) -> int:
+def refresh_balances(account_id: str) -> List[dict]:
     """
-    Fetch and upsert transactions for the past 90 days into Supabase. Returns count inserted.
+    Fetch the account's balances and store them on the account row.
+    """
+    balances = fetch_balances(account_id)
+    if balances:
+        storage.save_account_balances(account_id, balances, datetime.now(timezone.utc))
+    return balances
+
+SYNC_OVERLAP_DAYS = 3  # re-request this many days before the watermark to catch late bookings
+TRANSACTION_CODE_MAP = {"FPO": "debit", "BGC": "credit", "FPI": "credit", "CSH": "cash", "TFR": "transfer"}
+
+def get_sync_state(account_id: str):
+    """
+    Return the sync watermark for an account, or None if it has never been imported.
+    """
+    return storage.get_sync_state(account_id)
+
+def save_sync_state(account_id: str, last_booked_date):
+    # pending rows are reconciled against the stored transactions, so only the watermark is kept
+    storage.save_sync_state({
+        'account_id': account_id,
+        'last_booked_date': last_booked_date,
+        'synced_at': datetime.now(timezone.utc).isoformat()
+    })
+
+PENDING_MATCH_DAYS = 5  # how far a booked date may drift from its pending authorisation
+HASHED_FIELDS = (
+    "account_id", "status", "entry_reference", "internal_transaction_id", "additional_information",
+    "merchant_name", "amount", "currency", "booking_date", "value_date", "proprietary_bank_transaction_code"
+)
+
+def _content_hash(rec: dict) -> str:
     """
-    end_date = datetime.now()
-    start_date = end_date - timedelta(days=90)
-    # Format date strings for last 90 days
-    date_from = start_date.strftime("%Y-%m-%d")
-    date_to = end_date.strftime("%Y-%m-%d")
+    Stable hash of the fields we store for a transaction, used to skip unchanged rows.
+    """
+    payload = json.dumps([rec.get(f) for f in HASHED_FIELDS], separators=(",", ":"), default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+def _transaction_record(account_id: str, t: dict, status: Literal['booked', 'pending']) -> dict:
+    amt = t.get("transactionAmount", {})
+    rec = {
+        "transaction_id": t.get("transactionId"),
+        "account_id": account_id,
+        "status": status,
+        "entry_reference": t.get("entryReference"),
+        "internal_transaction_id": t.get("internalTransactionId"),
+        "additional_information": t.get("additionalInformation"),
+        "merchant_name": t.get("remittanceInformationUnstructured"),
+        "amount": float(amt.get("amount", 0)),
+        "currency": amt.get("currency"),
+        "booking_date": t.get("bookingDate"),
+        "value_date": t.get("valueDate"),
+        "proprietary_bank_transaction_code": t.get("proprietaryBankTransactionCode"),
+        "category": TRANSACTION_CODE_MAP.get(t.get("proprietaryBankTransactionCode"), "other")
+    }
+    rec["content_hash"] = _content_hash(rec)
+    rec["amount_minor"] = to_minor(amt.get("amount", 0), rec["currency"])
+    rec["merchant_canonical"] = normalize_merchant(rec["merchant_name"])
+    return rec
+
+def _assign_missing_ids(records: List[dict]) -> List[dict]:
+    """
+    Give id-less items (usually pending) an id derived from their content so reruns are idempotent.
+    Identical items in one response (two coffees on the same day) are told apart by occurrence.
+    """
+    occurrences: Dict[str, int] = {}
+    for rec in records:
+        if not rec["transaction_id"]:
+            n = occurrences.get(rec["content_hash"], 0) + 1
+            occurrences[rec["content_hash"]] = n
+            rec["transaction_id"] = f"pending-{rec['content_hash'][:32]}" + (f"-{n}" if n > 1 else "")
+    return records
+
+MERCHANT_STATS_MAX_AGE = 60  # seconds before the API re-reads a persisted sketch
+
+def load_merchant_stats(scope: str, max_age: Optional[float] = None):
+    """
+    Return the merchant heavy-hitter sketch for a scope ("global" or a user id),
+    reading the persisted snapshot if we have none or ours is older than max_age.
+    """
+    loaded_at = merchant_heavy_hitters.loaded_at(scope)
+    if loaded_at is None or (max_age is not None and time.monotonic() - loaded_at > max_age):
+        row = storage.get_merchant_stats(scope)
+        return merchant_heavy_hitters.load(scope, row["sketch"] if row else None)
+    return merchant_heavy_hitters.sketch(scope)
+
+MERCHANT_STATS_WRITE_ATTEMPTS = 5  # compare-and-set retries when another process wrote the same sketch
+
+def record_merchant_spend(user_id: Optional[str], rows: List[dict]):
+    """
+    Feed newly imported spending into the streaming per-user and global top merchants,
+    then persist the updated sketches so other processes can serve them.
+
+    The worker and the API both write the global sketch, so each write re-reads the stored
+    sketch, applies this import's spend to it and saves it only if nobody wrote in between
+    (compare-and-set on updated_at), retrying otherwise.
+    """
+    spend = [
+        (rec["merchant_canonical"], -rec["amount"])
+        for rec in rows if rec["status"] == "booked" and rec["amount"] < 0
+    ]
+    if not spend:
+        return
+    for scope in [GLOBAL_SCOPE] + ([user_id] if user_id else []):
+        for _ in range(MERCHANT_STATS_WRITE_ATTEMPTS):
+            row = storage.get_merchant_stats(scope)
+            sketch = SpaceSaving.from_dict(row["sketch"]) if row else merchant_heavy_hitters.empty_sketch(scope)
+            for merchant, amount in spend:
+                sketch.update(merchant, amount)
+            data = sketch.to_dict()
+            if storage.save_merchant_stats(scope, data, datetime.now(timezone.utc), row["updated_at"] if row else None):
+                merchant_heavy_hitters.load(scope, data)
+                break
+        else:
+            print(f"Gave up recording merchant spend for {scope} after {MERCHANT_STATS_WRITE_ATTEMPTS} conflicting writes")
+
+def _settles(pending_row: dict, booked_rec: dict) -> bool:
+    """
+    Whether a booked transaction is the settlement of a stored pending one.
+    """
+    if row_minor(pending_row) != booked_rec["amount_minor"] or pending_row.get("currency") != booked_rec["currency"]:
+        return False
+    if (pending_row.get("merchant_name") or "").strip().lower() != (booked_rec["merchant_name"] or "").strip().lower():
+        return False
+    pending_date = pending_row.get("value_date") or pending_row.get("booking_date")
+    booked_date = booked_rec["booking_date"] or booked_rec["value_date"]
+    if not pending_date or not booked_date:
+        return True
+    return abs((date.fromisoformat(booked_date) - date.fromisoformat(pending_date)).days) <= PENDING_MATCH_DAYS
+
+def _pending_expired(pending_row: dict) -> bool:
+    """
+    Whether a pending row that dropped off the bank's list is too old to still be settled by a booking.
+    """
+    pending_date = pending_row.get("value_date") or pending_row.get("booking_date")
+    if not pending_date:
+        return True
+    return (date.today() - date.fromisoformat(str(pending_date)[:10])).days > PENDING_MATCH_DAYS
+
+def fetch_transactions(account_id: str, user_id: Optional[str] = None) -> int:
+    """
+    Incrementally sync transactions for an account into storage. Returns count written.
+
+    The first import requests the full history the bank makes available. Later imports
+    request only from the stored watermark (latest settled booking date) minus
+    SYNC_OVERLAP_DAYS. Rows whose content hash is unchanged are skipped. Stored pending
+    rows that have settled are removed so aggregates never count the same payment twice;
+    ones that dropped off the bank's pending list unmatched are removed once
+    PENDING_MATCH_DAYS have passed without a booking. Newly booked spending also
+    updates the streaming top-merchant statistics for `user_id` and platform-wide.
+    """
+    state = get_sync_state(account_id)
+    last_booked = state.get("last_booked_date") if state else None
+    date_from = None
+    if last_booked:
+        date_from = (date.fromisoformat(last_booked) - timedelta(days=SYNC_OVERLAP_DAYS)).isoformat()
     # skip if over daily limit
     if not can_fetch(account_id, 'transactions'):
         return 0
-    acct = client.account_api(id=account_id)
-    tx_resp = acct.get_transactions(date_from=date_from, date_to=date_to)
+    acct = nordigen().account_api(id=account_id)
+    tx_resp = acct.get_transactions(date_from=date_from, date_to=date.today().isoformat())
     log_fetch(account_id, 'transactions')
-    raw = []
-    raw.extend(tx_resp.get("transactions", {}).get("booked", []))
-    raw.extend(tx_resp.get("transactions", {}).get("pending", []))
-    code_map = {"FPO": "debit", "BGC": "credit", "FPI": "credit", "CSH": "cash", "TFR": "transfer"}
-    inserted = 0
-    for t in raw:
-        date_str = t.get("bookingDate") or t.get("valueDate")
-        if date_str and datetime.fromisoformat(date_str) < start_date:
+    booked = _assign_missing_ids([_transaction_record(account_id, t, 'booked') for t in tx_resp.get("transactions", {}).get("booked", [])])
+    pending = _assign_missing_ids([_transaction_record(account_id, t, 'pending') for t in tx_resp.get("transactions", {}).get("pending", [])])
+
+    # Stored rows that this response can overlap: the re-requested window plus every pending row
+    stored = {row["transaction_id"]: row for row in storage.transactions_for_sync(account_id, date_from)}
+
+    rows = []
+    for rec in booked:
+        date_str = rec["booking_date"] or rec["value_date"]
+        if date_str and (last_booked is None or date_str > last_booked):
+            last_booked = date_str
+        if stored.get(rec["transaction_id"], {}).get("content_hash") != rec["content_hash"]:
+            rows.append(rec)
+    current_pending = set()
+    for rec in pending:
+        current_pending.add(rec["transaction_id"])
+        if stored.get(rec["transaction_id"], {}).get("content_hash") != rec["content_hash"]:
+            rows.append(rec)
+
+    # The same id twice in one upsert batch fails the whole statement; keep the last version
+    rows = list({rec["transaction_id"]: rec for rec in rows}.values())
+
+    # Pending rows no longer reported have either settled or been released. Settled ones are
+    # replaced by their booking now; unmatched ones are kept for PENDING_MATCH_DAYS in case the
+    # booking shows up in a later fetch, then dropped as released.
+    booked_ids = {rec["transaction_id"] for rec in booked}
+    unclaimed = [rec for rec in booked if stored.get(rec["transaction_id"], {}).get("status") != "booked"]
+    settled, released = [], []
+    for tx_id, row in stored.items():
+        if row.get("status") != "pending" or tx_id in current_pending:
             continue
-        amt = t.get("transactionAmount", {})
-        rec = {
-            "transaction_id": t.get("transactionId"),
-            "account_id": account_id,
-            "entry_reference": t.get("entryReference"),
-            "internal_transaction_id": t.get("internalTransactionId"),
-            "additional_information": t.get("additionalInformation"),
-            "merchant_name": t.get("remittanceInformationUnstructured"),
-            "amount": float(amt.get("amount", 0)),
-            "currency": amt.get("currency"),
-            "booking_date": t.get("bookingDate"),
-            "value_date": t.get("valueDate"),
-            "proprietary_bank_transaction_code": t.get("proprietaryBankTransactionCode"),
-            "category": code_map.get(t.get("proprietaryBankTransactionCode"), "other")
-        }
-        supabase.table("transactions").upsert(rec, on_conflict="transaction_id").execute()
-        inserted += 1
-    return inserted
\ No newline at end of file
+        if tx_id in booked_ids:
+            # booked under the authorisation's own id; the upsert below replaces the row
+            settled.append(tx_id)
+            continue
+        match = next((rec for rec in unclaimed if _settles(row, rec)), None)
+        if match is not None:
+            unclaimed.remove(match)
+            settled.append(tx_id)
+        elif _pending_expired(row):
+            released.append(tx_id)
+
+    if rows:
+        storage.upsert_transactions(rows)
+        record_merchant_spend(user_id, [rec for rec in rows if rec["transaction_id"] not in stored])
+    if settled or released:
+        storage.delete_pending_transactions(settled + released)
+        print(f"Account {account_id}: {len(settled)} pending transactions settled, {len(released)} released")
+    save_sync_state(account_id, last_booked)
+    return len(rows)
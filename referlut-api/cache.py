@@ -0,0 +1,142 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+# "memory" keeps each process's cache to itself; "tiered" adds a shared SQLite file so a
+# fill in one uvicorn worker is visible to the others on the same node
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "tiered")
+CACHE_PATH = os.getenv("CACHE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "cache.sqlite"))
+MEMORY_CACHE_SIZE = 4096  # entries per namespace held in process
+
+class MemoryCache:
+    """
+    In-process LRU cache with per-entry expiry.
+    """
+    def __init__(self, max_entries: int = MEMORY_CACHE_SIZE):
+        self.max_entries = max_entries
+        self.entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+
+    def get(self, key: str) -> Optional[Any]:
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.time():
+            del self.entries[key]
+            return None
+        self.entries.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: Any, ttl: float):
+        self.entries[key] = (time.time() + ttl, value)
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+class SQLiteCache:
+    """
+    Cache shared by every process on the node through one SQLite file in WAL mode.
+    Values are stored as JSON.
+    """
+    def __init__(self, namespace: str, path: str = CACHE_PATH):
+        self.namespace = namespace
+        self.path = path
+        self._local = threading.local()
+
+    def _connection(self) -> sqlite3.Connection:
+        # one connection per thread and per process (connections must not cross a fork)
+        conn = getattr(self._local, "conn", None)
+        if conn is None or getattr(self._local, "pid", None) != os.getpid():
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=1.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                "namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, expires_at REAL NOT NULL, "
+                "PRIMARY KEY (namespace, key))"
+            )
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, key: str) -> Optional[Any]:
+        hit = self.get_with_expiry(key)
+        return hit[0] if hit is not None else None
+
+    def get_with_expiry(self, key: str) -> Optional[Tuple[Any, float]]:
+        row = self._connection().execute(
+            "SELECT value, expires_at FROM cache WHERE namespace = ? AND key = ?", (self.namespace, key)
+        ).fetchone()
+        if row is None or row[1] < time.time():
+            return None
+        return json.loads(row[0]), row[1]
+
+    def set(self, key: str, value: Any, ttl: float):
+        self._connection().execute(
+            "INSERT OR REPLACE INTO cache (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)",
+            (self.namespace, key, json.dumps(value), time.time() + ttl)
+        )
+
+    def purge_expired(self) -> int:
+        """Delete expired entries of every namespace in the file. Returns rows deleted."""
+        return self._connection().execute("DELETE FROM cache WHERE expires_at < ?", (time.time(),)).rowcount
+
+class Cache:
+    """
+    Named cache: an in-process tier in front of an optional shared SQLite tier.
+    A shared-tier hit is copied into the in-process tier for its remaining lifetime.
+    """
+    def __init__(self, namespace: str, ttl: float, shared: bool = True):
+        self.namespace = namespace
+        self.ttl = ttl
+        self.memory = MemoryCache()
+        self.shared = SQLiteCache(namespace) if shared else None
+
+    def get(self, key: str) -> Optional[Any]:
+        value = self.memory.get(key)
+        if value is not None or self.shared is None:
+            return value
+        try:
+            hit = self.shared.get_with_expiry(key)
+        except sqlite3.Error:
+            return None
+        if hit is None:
+            return None
+        value, expires_at = hit
+        self.memory.set(key, value, expires_at - time.time())
+        return value
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        ttl = self.ttl if ttl is None else ttl
+        self.memory.set(key, value, ttl)
+        if self.shared is not None:
+            try:
+                self.shared.set(key, value, ttl)
+            except sqlite3.Error:
+                # the shared tier is an optimisation; a locked or unwritable file must not fail requests
+                pass
+
+_caches: Dict[str, Cache] = {}
+
+def purge_expired_entries(path: str = CACHE_PATH) -> int:
+    """
+    Maintenance job for the shared tier: entries are only replaced on write, so expired ones stay
+    in the file until purged. Returns rows deleted.
+    """
+    if CACHE_BACKEND == "memory":
+        return 0
+    return SQLiteCache("", path).purge_expired()
+
+def get_cache(namespace: str, ttl: float) -> Cache:
+    """
+    Process-wide cache for a namespace, e.g. "classification", "tips", "deals", "statistics".
+    """
+    cache = _caches.get(namespace)
+    if cache is None:
+        cache = _caches[namespace] = Cache(namespace, ttl, shared=CACHE_BACKEND != "memory")
+    return cache
@@ -0,0 +1,70 @@
+import json
+import os
+import sys
+from datetime import date, timedelta
+
+# Representative per-account range read: the scan underneath public.transaction_aggregates
+RANGE_SCAN_SQL = """
+SELECT to_char(booking_date, 'YYYY-MM'), COALESCE(category, 'Uncategorized'),
+       COALESCE(merchant_canonical, merchant_name, 'Unknown'), currency, SUM(amount_minor)
+FROM public.transactions
+WHERE account_id = %s AND booking_date >= %s
+GROUP BY 1, 2, 3, 4
+"""
+CHECK_MONTHS = int(os.getenv("CHECK_MONTHS", "12"))
+
+def plan_scans(plan: dict):
+    """
+    Yield (node type, relation, heap fetches) for every scan node in an EXPLAIN (FORMAT JSON) plan tree.
+    """
+    if "Relation Name" in plan:
+        yield plan["Node Type"], plan["Relation Name"], plan.get("Heap Fetches", 0)
+    for child in plan.get("Plans", []):
+        yield from plan_scans(child)
+
+def check_range_scan(cursor, account_id: str, months: int = CHECK_MONTHS):
+    """
+    Return a list of problems with the plan for one account's last `months` months.
+    """
+    since = date.today() - timedelta(days=30 * months)
+    # Judge whether the index covers the query, not whether a small test table is cheaper to scan
+    cursor.execute("SET enable_seqscan = off")
+    cursor.execute("EXPLAIN (ANALYZE, FORMAT JSON) " + RANGE_SCAN_SQL, (account_id, since))
+    explained = cursor.fetchone()[0]
+    if isinstance(explained, str):
+        explained = json.loads(explained)
+    scans = [scan for scan in plan_scans(explained[0]["Plan"]) if scan[1].startswith("transactions")]
+    problems = []
+    for node_type, relation, heap_fetches in scans:
+        if node_type != "Index Only Scan":
+            problems.append(f"{relation}: {node_type} instead of Index Only Scan")
+        elif heap_fetches:
+            problems.append(f"{relation}: {heap_fetches} heap fetches, run VACUUM to refresh the visibility map")
+    # months + the current one + the default partition
+    if len(scans) > months + 2:
+        problems.append(f"{len(scans)} partitions scanned for {months} months; partition pruning is not applying")
+    return problems
+
+if __name__ == "__main__":
+    try:
+        import psycopg
+    except ImportError:
+        sys.exit("check_query_plans.py needs psycopg: pip install 'psycopg[binary]'")
+    database_url = os.getenv("DATABASE_URL")
+    if not database_url:
+        sys.exit("Set DATABASE_URL to the Postgres connection string (Supabase: Settings > Database)")
+    with psycopg.connect(database_url) as conn, conn.cursor() as cursor:
+        if len(sys.argv) > 1:
+            account_id = sys.argv[1]
+        else:
+            cursor.execute("SELECT account_id FROM public.accounts LIMIT 1")
+            row = cursor.fetchone()
+            if row is None:
+                sys.exit("No accounts to check; pass an account id")
+            account_id = row[0]
+        problems = check_range_scan(cursor, account_id)
+    if problems:
+        for problem in problems:
+            print(f"FAIL: {problem}")
+        sys.exit(1)
+    print(f"OK: last {CHECK_MONTHS} months for account {account_id} read by index-only scans of pruned partitions")
@@ -1,4 +1,5 @@
 import asyncio
+import logging
 import uuid
 from typing import List, Optional, Dict
 from datetime import datetime, timedelta
@@ -6,7 +7,11 @@ from datetime import datetime, timedelta
 from openai import AsyncOpenAI
 from pydantic import BaseModel, Field
 
-from ai import Transaction, analyze_transactions, classify_transaction_with_llm, get_expert_tips, get_spending_insights, scrape_best_deals
+from agents import Agent, function_tool
+
+from ai import Transaction, analyze_transactions, classify_transaction, get_expert_tips, get_fallback_tips, get_spending_insights, scrape_best_deals
+
+logger = logging.getLogger(__name__)
 
 # --- Pydantic Models for Structured Data ---
 
@@ -32,37 +37,29 @@ class FinancialInsights(BaseModel):
 
 # --- Tool Definitions ---
 
-@function_tool
-async def analyze_category_spending(transactions: List[Transaction], category: str) -> SpendingAnalysis:
-    """
-    Analyzes spending patterns for a specific category.
+ANALYSIS_DEADLINE_SECONDS = 20  # budget for the concurrent deal and tip lookups
 
-    Args:
-        transactions: List of transactions to analyze
-        category: Category to analyze
+def group_weekly_spending(transactions: List[Transaction]) -> Dict[str, Dict[str, float]]:
     """
-    # Filter transactions for the category
-    category_transactions = [tx for tx in transactions if tx.category == category]
-
-    if not category_transactions:
-        return SpendingAnalysis(
-            category=category,
-            weekly_average=0,
-            trend="No data",
-            recommendations=["No spending data available for this category"]
-        )
-
-    # Calculate weekly averages
-    weekly_totals = {}
-    for tx in category_transactions:
-        date = datetime.strptime(tx.bookingDate, "%Y-%m-%d")
-        week_start = date - timedelta(days=date.weekday())
-        week_key = week_start.strftime("%Y-%m-%d")
-
+    Single pass over the transactions: weekly spending totals keyed by category, then week start.
+    Categories that only have credits are kept with no weeks.
+    """
+    grouped: Dict[str, Dict[str, float]] = {}
+    for tx in transactions:
+        if not tx.category:
+            continue
+        weekly_totals = grouped.setdefault(tx.category, {})
         amount = float(tx.transactionAmount["amount"])
         if amount < 0:  # Only consider spending (negative amounts)
+            date = datetime.strptime(tx.bookingDate, "%Y-%m-%d")
+            week_key = (date - timedelta(days=date.weekday())).strftime("%Y-%m-%d")
             weekly_totals[week_key] = weekly_totals.get(week_key, 0) + abs(amount)
+    return grouped
 
+def summarize_category(category: str, weekly_totals: Dict[str, float]) -> SpendingAnalysis:
+    """
+    Builds the spending analysis for one category from its weekly totals.
+    """
     # Calculate average and trend
     if weekly_totals:
         weekly_average = sum(weekly_totals.values()) / len(weekly_totals)
@@ -103,19 +100,10 @@ async def analyze_category_spending(transactions: List[Transaction], category: s
         recommendations=recommendations
     )
 
-@function_tool
-async def find_relevant_offers(category: str, weekly_spending: float) -> List[MarketplaceOffer]:
+def deals_to_offers(category: str, weekly_spending: float, deals: List[Dict]) -> List[MarketplaceOffer]:
     """
-    Finds relevant marketplace offers based on spending patterns.
-
-    Args:
-        category: Category to find offers for
-        weekly_spending: Average weekly spending in this category
+    Converts scraped deals into marketplace offers scored against the user's spending.
     """
-    # Get deals from the scraping function
-    deals = await scrape_best_deals(category)
-
-    # Convert deals to marketplace offers
     offers = []
     for deal in deals:
         # Calculate relevance score based on spending
@@ -132,9 +120,41 @@ async def find_relevant_offers(category: str, weekly_spending: float) -> List[Ma
             relevance_score=relevance_score,
             url=deal.get("url")
         ))
-
     return offers
 
+# Not strict: Transaction.transactionAmount is an open dict, which strict JSON schemas reject
+@function_tool(strict_mode=False)
+async def analyze_category_spending(transactions: List[Transaction], category: str) -> SpendingAnalysis:
+    """
+    Analyzes spending patterns for a specific category.
+
+    Args:
+        transactions: List of transactions to analyze
+        category: Category to analyze
+    """
+    grouped = group_weekly_spending(transactions)
+    if category not in grouped:
+        return SpendingAnalysis(
+            category=category,
+            weekly_average=0,
+            trend="No data",
+            recommendations=["No spending data available for this category"]
+        )
+    return summarize_category(category, grouped[category])
+
+@function_tool
+async def find_relevant_offers(category: str, weekly_spending: float) -> List[MarketplaceOffer]:
+    """
+    Finds relevant marketplace offers based on spending patterns.
+
+    Args:
+        category: Category to find offers for
+        weekly_spending: Average weekly spending in this category
+    """
+    # Get deals from the scraping function
+    deals = await scrape_best_deals(category)
+    return deals_to_offers(category, weekly_spending, deals)
+
 # --- Agent Definition ---
 
 FinancialAdvisorAgent = Agent(
@@ -168,31 +188,32 @@ async def analyze_financial_data(transactions: List[Transaction]) -> FinancialIn
     Args:
         transactions: List of transactions to analyze
     """
-    # Get unique categories
-    categories = set()
-    for tx in transactions:
-        if tx.category:
-            categories.add(tx.category)
-
-    # Analyze each category
-    category_insights = []
-    marketplace_offers = []
-
-    for category in categories:
-        # Analyze spending in this category
-        analysis = await analyze_category_spending(transactions, category)
-        category_insights.append(analysis)
-
-        # Find relevant offers if spending is significant
-        if analysis.weekly_average > 0:
-            offers = await find_relevant_offers(category, analysis.weekly_average)
-            marketplace_offers.extend(offers)
-
-    # Get expert tips
-    expert_tips = await get_expert_tips({
+    # One grouped pass instead of re-filtering the transactions per category
+    grouped = group_weekly_spending(transactions)
+    category_insights = [summarize_category(category, weekly) for category, weekly in grouped.items()]
+
+    # Fan out the offer lookups and the expert tips together, bounded by one deadline
+    offer_tasks = {
+        asyncio.create_task(scrape_best_deals(insight.category)): insight
+        for insight in category_insights
+        if insight.weekly_average > 0
+    }
+    tips_task = asyncio.create_task(get_expert_tips({
         "category_spending": {insight.category: insight.weekly_average for insight in category_insights},
         "weekly_averages": {insight.category: insight.weekly_average for insight in category_insights}
-    })
+    }))
+    done, pending = await asyncio.wait([*offer_tasks, tips_task], timeout=ANALYSIS_DEADLINE_SECONDS)
+    for task in pending:
+        task.cancel()
+    if pending:
+        logger.warning(f"{len(pending)} insight lookups missed the {ANALYSIS_DEADLINE_SECONDS}s deadline")
+
+    # Assemble whatever finished in time, keeping the category order stable
+    marketplace_offers = []
+    for task, insight in offer_tasks.items():
+        if task in done and not task.exception():
+            marketplace_offers.extend(deals_to_offers(insight.category, insight.weekly_average, task.result()))
+    expert_tips = tips_task.result() if tips_task in done and not tips_task.exception() else get_fallback_tips()
 
     # Determine overall spending trend
     overall_trend = "stable"
@@ -232,7 +253,7 @@ if __name__ == "__main__":
                     internalTransactionId=tx["internalTransactionId"]
                 )
                 # Classify the transaction
-                transaction.category = await classify_transaction_with_llm(transaction)
+                transaction.category = await classify_transaction(transaction)
                 transactions.append(transaction)
             except Exception as e:
                 print(f"Error processing transaction: {e}")
@@ -0,0 +1,108 @@
+import heapq
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+class SpaceSaving:
+    """
+    Weighted Space-Saving top-k sketch in bounded memory.
+
+    Tracks at most `capacity` keys. When a new key arrives and the sketch is full,
+    the key with the smallest count is evicted and the newcomer inherits its count
+    as an overestimate (recorded in `errors`). Any key whose true weight exceeds
+    total / capacity is guaranteed to be tracked.
+    """
+    def __init__(self, capacity: int = 256):
+        self.capacity = capacity
+        self.counts: Dict[str, float] = {}
+        self.errors: Dict[str, float] = {}
+        self.total = 0.0
+        # min-heap of (count, key); stale entries are skipped lazily
+        self._heap: List[Tuple[float, str]] = []
+
+    def update(self, key: str, weight: float = 1.0):
+        self.total += weight
+        if key in self.counts:
+            self.counts[key] += weight
+        elif len(self.counts) < self.capacity:
+            self.counts[key] = weight
+            self.errors[key] = 0.0
+        else:
+            floor, evicted = self._pop_min()
+            del self.counts[evicted]
+            del self.errors[evicted]
+            self.counts[key] = floor + weight
+            self.errors[key] = floor
+        heapq.heappush(self._heap, (self.counts[key], key))
+        if len(self._heap) > 4 * self.capacity:
+            self._heap = [(count, k) for k, count in self.counts.items()]
+            heapq.heapify(self._heap)
+
+    def _pop_min(self) -> Tuple[float, str]:
+        while True:
+            count, key = heapq.heappop(self._heap)
+            if self.counts.get(key) == count:
+                return count, key
+
+    def top(self, k: int) -> List[Tuple[str, float]]:
+        return heapq.nlargest(k, self.counts.items(), key=lambda item: item[1])
+
+    def estimate(self, key: str) -> float:
+        return self.counts.get(key, 0.0)
+
+    def to_dict(self) -> Dict:
+        return {"capacity": self.capacity, "total": self.total, "counts": self.counts, "errors": self.errors}
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "SpaceSaving":
+        sketch = cls(data.get("capacity", 256))
+        sketch.total = data.get("total", 0.0)
+        sketch.counts = dict(data.get("counts", {}))
+        sketch.errors = dict(data.get("errors", {}))
+        sketch._heap = [(count, key) for key, count in sketch.counts.items()]
+        heapq.heapify(sketch._heap)
+        return sketch
+
+GLOBAL_SCOPE = "global"
+
+class MerchantHeavyHitters:
+    """
+    Merchant spend sketches per user and platform-wide, as last loaded from merchant_stats
+    (imports update the stored sketches, see banking.record_merchant_spend). Sketches are
+    kept for the most recently used `max_users` users; the global one is never evicted.
+    """
+    def __init__(self, global_capacity: int = 1024, user_capacity: int = 64, max_users: int = 10000):
+        self.global_capacity = global_capacity
+        self.user_capacity = user_capacity
+        self.max_users = max_users
+        # scope -> (monotonic time loaded, sketch or None if the scope has none stored), least recently used first
+        self.loaded: "OrderedDict[str, Tuple[float, Optional[SpaceSaving]]]" = OrderedDict()
+
+    def sketch(self, scope: str) -> Optional[SpaceSaving]:
+        entry = self.loaded.get(scope)
+        if entry is None:
+            return None
+        self.loaded.move_to_end(scope)
+        return entry[1]
+
+    def loaded_at(self, scope: str) -> Optional[float]:
+        entry = self.loaded.get(scope)
+        return entry[0] if entry else None
+
+    def empty_sketch(self, scope: str) -> SpaceSaving:
+        return SpaceSaving(self.global_capacity if scope == GLOBAL_SCOPE else self.user_capacity)
+
+    def load(self, scope: str, data: Optional[Dict]) -> Optional[SpaceSaving]:
+        """
+        Replace the scope's sketch with a persisted one, or None when nothing is stored yet.
+        """
+        sketch = SpaceSaving.from_dict(data) if data else None
+        self.loaded[scope] = (time.monotonic(), sketch)
+        self.loaded.move_to_end(scope)
+        if len(self.loaded) - (GLOBAL_SCOPE in self.loaded) > self.max_users:
+            evicted = next(key for key in self.loaded if key != GLOBAL_SCOPE)
+            del self.loaded[evicted]
+        return sketch
+
+# Process-wide merchant statistics
+merchant_heavy_hitters = MerchantHeavyHitters()
@@ -0,0 +1,104 @@
+import json
+import logging
+from contextlib import aclosing
+from typing import Any, AsyncIterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+class JSONArrayParser:
+    """
+    Incremental parser for the first JSON array in a document that arrives in chunks.
+
+    feed() returns the array elements completed by the new text, so each element of
+    {"tips": ["...", "..."]} or [{...}, {...}] is available as soon as it closes rather
+    than when the whole document has arrived. Text before the array (an enclosing
+    object and its key) and after it is ignored. Elements that fail to parse are skipped.
+    """
+    def __init__(self):
+        self.text = ""
+        self.pos = 0  # next character of self.text to scan
+        self.in_array = False
+        self.done = False
+        self.depth = 0  # nesting inside the current element
+        self.in_string = False
+        self.escaped = False
+        self.start: Optional[int] = None  # offset of the current element in self.text
+
+    def _emit(self, end: int, items: List[Any]):
+        raw = self.text[self.start:end]
+        self.start = None
+        try:
+            items.append(json.loads(raw))
+        except json.JSONDecodeError:
+            logger.warning(f"Skipping malformed array element: {raw[:80]}")
+
+    def feed(self, chunk: str) -> List[Any]:
+        items: List[Any] = []
+        if self.done:
+            return items
+        self.text += chunk
+        text = self.text
+        i = self.pos
+        while i < len(text):
+            char = text[i]
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif char == "\\":
+                    self.escaped = True
+                elif char == '"':
+                    self.in_string = False
+                    if self.in_array and self.depth == 0:
+                        self._emit(i + 1, items)
+            elif char == '"':
+                self.in_string = True
+                if self.in_array and self.depth == 0:
+                    self.start = i
+            elif not self.in_array:
+                if char == "[":
+                    self.in_array = True
+            elif char in "{[":
+                if self.depth == 0:
+                    self.start = i
+                self.depth += 1
+            elif char in "}]":
+                if self.depth == 0:
+                    # closing bracket of the array itself
+                    if self.start is not None:
+                        self._emit(i, items)
+                    self.done = True
+                    break
+                self.depth -= 1
+                if self.depth == 0:
+                    self._emit(i + 1, items)
+            elif self.depth == 0:
+                if char == ",":
+                    if self.start is not None:
+                        self._emit(i, items)
+                elif not char.isspace() and self.start is None:
+                    # number, true, false or null
+                    self.start = i
+            i += 1
+
+        # keep only the text of the element still being read
+        keep = self.start if self.start is not None else i
+        self.text = text[keep:]
+        self.pos = i - keep
+        if self.start is not None:
+            self.start = 0
+        return items
+
+async def iter_json_array(chunks: AsyncIterator[str]) -> AsyncIterator[Any]:
+    """
+    Yield the elements of the first JSON array in a stream of text chunks as each one completes.
+
+    The stream is read to its end even after the array closes: the last chunk of a
+    stream_chat_completion stream carries the token usage it records. `chunks` is closed
+    when this generator finishes or is closed early.
+    """
+    parser = JSONArrayParser()
+    async with aclosing(chunks):
+        async for chunk in chunks:
+            # feed() ignores text after the array
+            for item in parser.feed(chunk):
+                yield item
@@ -0,0 +1,206 @@
+import argparse
+import atexit
+import json
+import math
+import os
+import random
+import re
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# LLM-labelled transactions accumulate here; the trained model is written next to them
+LABELS_PATH = os.getenv("LLM_LABELS_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "llm_labels.jsonl"))
+MODEL_PATH = os.getenv("LOCAL_CLASSIFIER_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "local_classifier.json"))
+# Predictions below this posterior probability escalate to the LLM
+LOCAL_CONFIDENCE_THRESHOLD = float(os.getenv("LOCAL_CONFIDENCE_THRESHOLD", "0.9"))
+LABEL_FLUSH_SIZE = 50  # labels buffered in memory before they are appended to LABELS_PATH
+
+_TOKEN_RE = re.compile(r"[a-z][a-z&']+")
+
+def extract_features(description: str, amount: float, bank_code: Optional[str]) -> List[str]:
+    """
+    Features for one transaction: merchant-text tokens, amount sign and bank transaction code.
+    """
+    features = _TOKEN_RE.findall((description or "").lower())
+    features.append("sign:debit" if amount < 0 else "sign:credit")
+    if bank_code:
+        features.append(f"code:{bank_code}")
+    return features
+
+class NaiveBayesClassifier:
+    """
+    Multinomial naive Bayes over transaction features, with Laplace smoothing.
+    """
+    def __init__(self):
+        self.label_counts: Dict[str, int] = {}
+        self.feature_counts: Dict[str, Dict[str, int]] = {}
+        self.feature_totals: Dict[str, int] = {}
+        self.vocabulary: set = set()
+
+    def fit(self, samples: Iterable[Tuple[List[str], str]]) -> "NaiveBayesClassifier":
+        for features, label in samples:
+            self.label_counts[label] = self.label_counts.get(label, 0) + 1
+            counts = self.feature_counts.setdefault(label, {})
+            for feature in features:
+                counts[feature] = counts.get(feature, 0) + 1
+                self.vocabulary.add(feature)
+            self.feature_totals[label] = self.feature_totals.get(label, 0) + len(features)
+        return self
+
+    def predict(self, features: List[str]) -> Tuple[str, float]:
+        """
+        Most likely label and its posterior probability.
+        """
+        if not self.label_counts:
+            return "other", 0.0
+        total = sum(self.label_counts.values())
+        vocab_size = len(self.vocabulary) + 1
+        scores = {}
+        for label, count in self.label_counts.items():
+            counts = self.feature_counts.get(label, {})
+            denominator = self.feature_totals.get(label, 0) + vocab_size
+            score = math.log(count / total)
+            for feature in features:
+                score += math.log((counts.get(feature, 0) + 1) / denominator)
+            scores[label] = score
+        best = max(scores, key=scores.get)
+        normalizer = sum(math.exp(s - scores[best]) for s in scores.values())
+        return best, 1 / normalizer
+
+    def to_dict(self) -> Dict:
+        return {
+            "label_counts": self.label_counts,
+            "feature_counts": self.feature_counts,
+            "feature_totals": self.feature_totals,
+            "vocabulary": sorted(self.vocabulary)
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "NaiveBayesClassifier":
+        model = cls()
+        model.label_counts = data["label_counts"]
+        model.feature_counts = data["feature_counts"]
+        model.feature_totals = data["feature_totals"]
+        model.vocabulary = set(data["vocabulary"])
+        return model
+
+def save_model(model: NaiveBayesClassifier, path: str = MODEL_PATH):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # write then rename, so a running service never reads a half-written model
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(model.to_dict(), f)
+    os.replace(tmp_path, path)
+
+def load_model(path: str = MODEL_PATH) -> Optional[NaiveBayesClassifier]:
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return NaiveBayesClassifier.from_dict(json.load(f))
+
+# Model loaded from MODEL_PATH, reloaded when the file changes (e.g. after `train`)
+_model: Optional[NaiveBayesClassifier] = None
+_model_mtime: Optional[float] = None
+
+def get_model(path: str = MODEL_PATH) -> Optional[NaiveBayesClassifier]:
+    """
+    The trained model, or None if there is none yet. Re-read whenever the file's mtime changes.
+    """
+    global _model, _model_mtime
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        mtime = None
+    if mtime != _model_mtime:
+        _model = load_model(path) if mtime is not None else None
+        _model_mtime = mtime
+    return _model
+
+# LLM labels waiting to be appended to the training set, by path
+_pending_labels: Dict[str, List[str]] = {}
+_labels_lock = threading.Lock()
+
+def record_label(description: str, amount: float, bank_code: Optional[str], category: str, path: str = LABELS_PATH) -> bool:
+    """
+    Buffer one LLM-labelled transaction for the training set. Returns True once LABEL_FLUSH_SIZE
+    labels are waiting, so the caller can flush_labels() off the request path.
+    """
+    line = json.dumps({"description": description, "amount": amount, "bank_code": bank_code, "category": category})
+    with _labels_lock:
+        pending = _pending_labels.setdefault(path, [])
+        pending.append(line)
+        return len(pending) >= LABEL_FLUSH_SIZE
+
+def flush_labels():
+    """
+    Append the buffered labels to their files.
+    """
+    with _labels_lock:
+        batches = {path: lines for path, lines in _pending_labels.items() if lines}
+        _pending_labels.clear()
+    for path, lines in batches.items():
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "a") as f:
+            f.write("\n".join(lines) + "\n")
+
+atexit.register(flush_labels)
+
+def load_labels(path: str = LABELS_PATH) -> List[Tuple[List[str], str]]:
+    samples = []
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                row = json.loads(line)
+                samples.append((extract_features(row["description"], row["amount"], row.get("bank_code")), row["category"]))
+    return samples
+
+def split_holdout(samples: List[Tuple[List[str], str]], holdout: float) -> Tuple[List, List]:
+    """
+    Shuffle deterministically and split into (training, held-out) samples.
+    """
+    samples = list(samples)
+    random.Random(0).shuffle(samples)
+    split = int(len(samples) * (1 - holdout))
+    return samples[:split], samples[split:]
+
+def evaluate(model: NaiveBayesClassifier, samples: List[Tuple[List[str], str]], threshold: float) -> Dict:
+    """
+    Accuracy overall and above the confidence threshold, plus per-row latency.
+    """
+    correct = confident = confident_correct = 0
+    started = time.perf_counter()
+    for features, label in samples:
+        predicted, confidence = model.predict(features)
+        correct += predicted == label
+        if confidence >= threshold:
+            confident += 1
+            confident_correct += predicted == label
+    elapsed = time.perf_counter() - started
+    return {
+        "rows": len(samples),
+        "accuracy": correct / len(samples) if samples else 0.0,
+        "coverage_above_threshold": confident / len(samples) if samples else 0.0,
+        "accuracy_above_threshold": confident_correct / confident if confident else 0.0,
+        "microseconds_per_row": elapsed / len(samples) * 1e6 if samples else 0.0
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train or evaluate the local transaction classifier")
+    parser.add_argument("command", choices=["train", "report"])
+    parser.add_argument("--labels", default=LABELS_PATH)
+    parser.add_argument("--model", default=MODEL_PATH)
+    parser.add_argument("--holdout", type=float, default=0.2, help="fraction of labels held out for the report")
+    parser.add_argument("--threshold", type=float, default=LOCAL_CONFIDENCE_THRESHOLD)
+    args = parser.parse_args()
+
+    samples = load_labels(args.labels)
+    # Both commands score a model fitted without the held-out labels; scoring the shipped
+    # model on its own training labels would overstate its accuracy
+    training, held_out = split_holdout(samples, args.holdout)
+    report = evaluate(NaiveBayesClassifier().fit(training), held_out, args.threshold)
+    if args.command == "train":
+        # the shipped model is trained on everything once the holdout has been scored
+        save_model(NaiveBayesClassifier().fit(samples), args.model)
+        print(f"Trained on {len(samples)} labels, wrote {args.model}")
+    print(json.dumps(report, indent=2))
@@ -1,28 +1,25 @@
-import os
 import logging
-from fastapi import FastAPI, Depends, HTTPException, Request, Header, APIRouter, Body
+from fastapi import FastAPI, Depends, HTTPException, APIRouter, Body
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from dotenv import load_dotenv
-import datetime
-import openai
-from typing import Optional, Dict, List, Annotated, Union
-import jwt
-import requests
-from banking import (
-    initiate_requisition,
-    handle_requisition_callback,
-    fetch_accounts,
-    fetch_transactions,
-)
-from ai import Transaction, analyze_transactions, classify_transaction_with_llm, get_expert_tips, get_spending_insights, scrape_best_deals
-from pydantic import BaseModel
+from fastapi.responses import JSONResponse, StreamingResponse
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Optional, Dict, List, Annotated
+from ai import create_chat_completion, get_coalescing_stats, get_expert_tips, get_resilience_stats, scrape_best_deals, stream_best_deals, stream_expert_tips
 import asyncio
 from datetime import datetime, timedelta
 import json
-from functools import lru_cache
 
-from mock_data import MOCK_TRANSACTIONS
+from merchants import normalize_merchant
+from heavy_hitters import GLOBAL_SCOPE
+from cache import get_cache
+from mock_data import get_mock_transactions
+from storage import get_storage
+from money import DISPLAY_CURRENCY
+from recurring import monthly_subscription_cost
+from prompts import PROMPT_BUDGETS, PromptBuilder, get_token_usage, truncate_tokens
+from analytics import INSIGHT_MONTHS, analytics_snapshots, build_insights, classify_records, derive_ai_panels, derive_statistics, records_from_transactions, statistics_snapshots, stream_deals
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -31,8 +28,85 @@ logger = logging.getLogger(__name__)
 # Load environment variables
 load_dotenv()
 
+def get_banking():
+    """
+    The banking module, imported on first use: it pulls in the Nordigen and Supabase
+    clients, which dominate cold-start time.
+    """
+    import banking
+    return banking
+
+async def build_live_statistics() -> Dict:
+    """
+    Statistics computed on the request path, for users the worker hasn't processed yet.
+    """
+    records = records_from_transactions(get_mock_transactions()["transactions"]["booked"])
+    await classify_records(records)
+    return derive_statistics(records)
+
+async def insights_version(user_id: str) -> Optional[str]:
+    """
+    computed_at of the user's precomputed insights, or None when there are none to serve.
+    """
+    try:
+        return await asyncio.to_thread(get_storage().user_insights_version, user_id)
+    except Exception as e:
+        logger.warning(f"Precomputed insights unavailable for user {user_id}: {e}")
+        return None
+
+async def load_precomputed(user_id: str, version: str) -> Dict:
+    return await analytics_snapshots.get(user_id, version, lambda: asyncio.to_thread(get_storage().get_user_insights, user_id))
+
+async def get_statistics_snapshot(user_id: str) -> Dict:
+    """
+    The statistics part of the user's snapshot (summary, weekly chart, category spend), without waiting for AI panels.
+    """
+    version = await insights_version(user_id)
+    if version is not None:
+        return await load_precomputed(user_id, version)
+    return await statistics_snapshots.get(user_id, "live", build_live_statistics)
+
+async def get_analytics_snapshot(user_id: str) -> Dict:
+    """
+    The user's analytics snapshot (summary, weekly chart, tips, deals), shared by every endpoint
+    and rebuilt only when the worker stores newer insights for them.
+    """
+    version = await insights_version(user_id)
+    if version is not None:
+        return await load_precomputed(user_id, version)
+
+    async def build_live_snapshot():
+        statistics = await statistics_snapshots.get(user_id, "live", build_live_statistics)
+        return {**statistics, **await derive_ai_panels(statistics)}
+    return await analytics_snapshots.get(user_id, "live", build_live_snapshot)
+
+# Startup connectivity checks run in the background; /ready reports their outcome
+readiness = {"ready": False, "checks": {}}
+
+def run_startup_checks():
+    checks = {}
+    try:
+        get_banking().verify_supabase_table()
+        checks["supabase"] = "ok"
+    except Exception as e:
+        checks["supabase"] = f"error: {e}"
+    try:
+        get_banking().nordigen()
+        checks["nordigen"] = "ok"
+    except Exception as e:
+        checks["nordigen"] = f"error: {e}"
+    readiness["checks"] = checks
+    readiness["ready"] = all(result == "ok" for result in checks.values())
+    logger.info(f"Startup checks finished: {checks}")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    checks = asyncio.create_task(asyncio.to_thread(run_startup_checks))
+    yield
+    checks.cancel()
+
 # Initialize FastAPI app
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -59,9 +133,13 @@ banking_router = APIRouter(prefix="/api/banking", tags=["Banking"])
 statistics_router = APIRouter(prefix="/api/statistics", tags=["Statistics"])
 ai_router = APIRouter(prefix="/api/ai", tags=["AI"])
 users_router = APIRouter(prefix="/api/users", tags=["Users"])
+dashboard_router = APIRouter(prefix="/api/dashboard", tags=["Dashboard"])
+
+# Statistics summaries per user, shared across worker processes
+statistics_cache = get_cache("statistics", ttl=5 * 60)
 
-# Cache for transaction classifications
-transaction_cache = {}
+# Seconds each dashboard panel may take before it is returned empty and marked pending
+DASHBOARD_DEADLINES = {"statistics": 10.0, "ai": 3.0}
 
 # Simple mock offers for demonstration
 MOCK_OFFERS = [
@@ -99,6 +177,13 @@ MOCK_OFFERS = [
 async def root():
     return {"message": "Welcome to the Referlut API"}
 
+@app.get("/ready")
+async def ready():
+    """
+    Readiness probe: 503 until the background startup checks have passed
+    """
+    return JSONResponse(status_code=200 if readiness["ready"] else 503, content=readiness)
+
 # Banking endpoints
 @banking_router.post("/link/initiate")
 async def bank_link_initiate(
@@ -107,15 +192,14 @@ async def bank_link_initiate(
     redirect_url: str
 ):
     user_id = user_data["user_id"]
-    return initiate_requisition(user_id, institution_id, redirect_url)
+    return get_banking().initiate_requisition(user_id, institution_id, redirect_url)
 
 @banking_router.get("/link/callback")
 async def bank_link_callback(ref: str):
-    return handle_requisition_callback(ref)
+    return get_banking().handle_requisition_callback(ref)
 
 @banking_router.get("/accounts")
 async def get_user_accounts(user_data: Annotated[Dict[str, str], Depends(get_authenticated_user)]):
-    user_id = user_data["user_id"]
     try:
         # Return mock accounts
         return [
@@ -135,7 +219,6 @@ async def get_bank_connection_status(user_data: Annotated[Dict[str, str], Depend
     """
     Check if a user has any connected bank accounts
     """
-    user_id = user_data["user_id"]
     try:
         # For mock data, always return connected
         return {
@@ -155,11 +238,57 @@ async def get_account_transactions(
 ):
     try:
         # Return mock transactions
-        return MOCK_TRANSACTIONS["transactions"]["booked"]
+        return get_mock_transactions()["transactions"]["booked"]
     except Exception as e:
         logger.error(f"Error retrieving transactions: {str(e)}")
         raise HTTPException(status_code=400, detail=str(e))
 
+async def require_account_owner(user_id: str, account_id: str):
+    """
+    404 unless the account exists and belongs to the user, so other users' accounts can't be probed or refreshed.
+    """
+    account = await asyncio.to_thread(get_storage().get_account, account_id)
+    if account is None or account.get("user_id") != user_id:
+        raise HTTPException(status_code=404, detail="Account not found")
+
+@banking_router.get("/accounts/{account_id}/next-refresh")
+async def get_account_next_refresh(
+    user_data: Annotated[Dict[str, str], Depends(get_authenticated_user)],
+    account_id: str
+):
+    """
+    When the quota planner will next refresh this account's balances and transactions
+    """
+    await require_account_owner(user_data["user_id"], account_id)
+    try:
+        plan = await asyncio.to_thread(get_banking().plan_refreshes, account_id)
+        return {scope: at.isoformat() for scope, at in plan.items()}
+    except Exception as e:
+        logger.error(f"Error planning refresh: {str(e)}")
+        raise HTTPException(status_code=400, detail=str(e))
+
+@banking_router.post("/accounts/{account_id}/refresh")
+async def refresh_account_transactions(
+    user_data: Annotated[Dict[str, str], Depends(get_authenticated_user)],
+    account_id: str
+):
+    """
+    User-triggered transaction refresh, allowed to use the quota held in reserve
+    """
+    await require_account_owner(user_data["user_id"], account_id)
+    try:
+        banking = get_banking()
+        plan = await asyncio.to_thread(banking.plan_refreshes, account_id, True)
+        available_at = plan["transactions"]
+        if available_at > datetime.now(available_at.tzinfo):
+            raise HTTPException(status_code=429, detail=f"No refresh quota left until {available_at.isoformat()}")
+        return {"refreshed": await asyncio.to_thread(banking.fetch_transactions, account_id, user_data["user_id"])}
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error refreshing transactions: {str(e)}")
+        raise HTTPException(status_code=400, detail=str(e))
+
 # User endpoints
 @users_router.get("/profile")
 async def get_user_profile(user_data: Annotated[Dict[str, str], Depends(get_authenticated_user)]):
@@ -187,7 +316,6 @@ async def update_bank_status(
     """
     Manually update the user's bank connection status
     """
-    user_id = user_data["user_id"]
     try:
         # For mock data, just return success
         return {"success": True, "has_connected_bank": has_connected_bank}
@@ -205,178 +333,98 @@ async def get_statistics_summary(
     Get a summary of the user's financial statistics
     """
     user_id = user_data["user_id"]
+    cache_key = f"{user_id}|{months}"
+    cached = statistics_cache.get(cache_key)
+    if cached is not None:
+        return cached
+    if months == INSIGHT_MONTHS:
+        try:
+            return (await get_statistics_snapshot(user_id))["summary"]
+        except Exception as e:
+            logger.error(f"Error getting statistics: {str(e)}")
+            raise HTTPException(status_code=400, detail=str(e))
     try:
-        # Get mock transactions
-        transactions = MOCK_TRANSACTIONS["transactions"]["booked"]
-
-        # Initialize statistics
-        total_spending = 0
-        total_income = 0
-        category_spending = {}
-        monthly_spending = {}
-        top_merchants = {}
-        savings_opportunities = []
-
-        # Process each transaction
-        for tx in transactions:
-            try:
-                # Create a Transaction object
-                transaction = Transaction(
-                    transactionId=tx["transactionId"],
-                    bookingDate=tx["bookingDate"],
-                    valueDate=tx["valueDate"],
-                    transactionAmount=tx["transactionAmount"],
-                    remittanceInformationUnstructured=tx["remittanceInformationUnstructured"],
-                    proprietaryBankTransactionCode=tx["proprietaryBankTransactionCode"],
-                    internalTransactionId=tx["internalTransactionId"]
-                )
-
-                # Classify the transaction
-                category = await classify_transaction_with_llm(transaction)
-                amount = float(transaction.transactionAmount["amount"])
-
-                # Parse booking_date
-                date = datetime.strptime(transaction.bookingDate, "%Y-%m-%d")
-                # Skip transactions older than the requested months
-                if date < datetime.now() - timedelta(days=30*months):
-                    continue
-
-                month_key = date.strftime("%Y-%m")
-                merchant = transaction.remittanceInformationUnstructured or "Unknown"
-
-                # Update monthly spending trend
-                monthly_spending[month_key] = monthly_spending.get(month_key, 0) + amount
-
-                # Update category spending totals
-                category_spending[category] = category_spending.get(category, 0) + amount
-
-                # Tally spending per merchant
-                top_merchants[merchant] = top_merchants.get(merchant, 0) + amount
-
-                # Update overall income vs spending
-                if amount < 0:
-                    total_spending += abs(amount)
-                else:
-                    total_income += amount
-            except Exception as e:
-                logger.error(f"Error processing transaction: {str(e)}")
-                continue
-
-        # Sort and limit top merchants
-        top_merchants = dict(sorted(top_merchants.items(), key=lambda x: x[1], reverse=True)[:10])
+        # Other windows are computed on the request path, in exact minor units like the snapshot
+        since = (datetime.now() - timedelta(days=30 * months)).strftime("%Y-%m-%d")
+        records = [
+            record for record in records_from_transactions(get_mock_transactions()["transactions"]["booked"])
+            if (record.booking_date or "") >= since
+        ]
+        await classify_records(records)
+        summary = build_insights(records)["summary"]
+        statistics_cache.set(cache_key, summary)
+        return summary
+    except Exception as e:
+        logger.error(f"Error getting statistics: {str(e)}")
+        raise HTTPException(status_code=400, detail=str(e))
 
+@statistics_router.get("/subscriptions")
+async def get_subscriptions(
+    user_data: Annotated[Dict[str, str], Depends(get_authenticated_user)]
+):
+    """
+    Recurring payments detected in the user's transactions, with their next expected date and monthly cost
+    """
+    try:
+        snapshot = await get_statistics_snapshot(user_data["user_id"])
+        subscriptions = snapshot.get("subscriptions") or []
         return {
-            "total_spending": total_spending,
-            "total_income": total_income,
-            "category_spending": category_spending,
-            "monthly_spending": monthly_spending,
-            "top_merchants": top_merchants,
-            "savings_opportunities": savings_opportunities
+            "subscriptions": subscriptions,
+            "monthly_cost": monthly_subscription_cost(subscriptions),
+            "currency": DISPLAY_CURRENCY,
+            "last_updated": snapshot["computed_at"]
         }
     except Exception as e:
-        logger.error(f"Error getting statistics: {str(e)}")
+        logger.error(f"Error getting subscriptions: {str(e)}")
+        raise HTTPException(status_code=400, detail=str(e))
+
+@statistics_router.get("/merchants/top")
+async def get_top_merchants(
+    user_data: Annotated[Dict[str, str], Depends(get_authenticated_user)],
+    scope: str = "user",
+    k: int = 10
+):
+    """
+    Top merchants by spend from the streaming heavy-hitter sketch, for the user or platform-wide
+    """
+    try:
+        banking = get_banking()
+        sketch_scope = GLOBAL_SCOPE if scope == "global" else user_data["user_id"]
+        sketch = banking.load_merchant_stats(sketch_scope, banking.MERCHANT_STATS_MAX_AGE)
+        top = sketch.top(k) if sketch is not None else []
+        return {"scope": scope, "top_merchants": {merchant: spend for merchant, spend in top}}
+    except Exception as e:
+        logger.error(f"Error getting top merchants: {str(e)}")
         raise HTTPException(status_code=400, detail=str(e))
 
+def filter_chart_category(chart_data: List[Dict], category: str) -> List[Dict]:
+    """
+    Restrict weekly chart data to one category, dropping weeks without spending in it.
+    """
+    if category == "all":
+        return chart_data
+    filtered_data = []
+    for item in chart_data:
+        category_amount = item["categories"].get(category, 0)
+        if category_amount > 0:  # Only include weeks with spending in this category
+            filtered_data.append({
+                "week": item["week"],
+                "total": category_amount,
+                "categories": {category: category_amount}
+            })
+    return filtered_data
+
 @statistics_router.get("/spending/chart")
 async def get_spending_chart(
     category: str = "all",
     user_data: dict = Depends(get_authenticated_user)
 ):
     try:
-        # Get mock transactions
-        transactions = MOCK_TRANSACTIONS["transactions"]["booked"]
-
-        # Create Transaction objects and classify them
-        transaction_objects = []
-        for tx in transactions:
-            try:
-                # Create a Transaction object
-                transaction = Transaction(
-                    transactionId=tx["transactionId"],
-                    bookingDate=tx["bookingDate"],
-                    valueDate=tx["valueDate"],
-                    transactionAmount=tx["transactionAmount"],
-                    remittanceInformationUnstructured=tx["remittanceInformationUnstructured"],
-                    proprietaryBankTransactionCode=tx["proprietaryBankTransactionCode"],
-                    internalTransactionId=tx["internalTransactionId"]
-                )
-
-                # Check if we already have this transaction classified
-                cache_key = f"{transaction.transactionId}_{transaction.bookingDate}"
-                if cache_key not in transaction_cache:
-                    # Classify the transaction and cache the result
-                    tx_category = await classify_transaction_with_llm(transaction)
-                    transaction_cache[cache_key] = tx_category
-
-                # Use the cached classification
-                transaction.category = transaction_cache[cache_key]
-                transaction_objects.append(transaction)
-            except Exception as e:
-                logger.error(f"Error creating transaction object: {e}")
-                continue
-
-        # Process transactions to get weekly data
-        weekly_data = {}
-        for tx in transaction_objects:
-            try:
-                # Skip if amount is not a valid number
-                amount = float(tx.transactionAmount["amount"])
-                if amount >= 0:  # Skip credits/income
-                    continue
-
-                # Get the week start date (Monday)
-                date = datetime.strptime(tx.bookingDate, "%Y-%m-%d")
-                week_start = date - timedelta(days=date.weekday())
-                week_key = week_start.strftime("%Y-%m-%d")
-
-                # Initialize week data if not exists
-                if week_key not in weekly_data:
-                    weekly_data[week_key] = {
-                        "total": 0,
-                        "categories": {}
-                    }
-
-                # Add to total
-                weekly_data[week_key]["total"] += abs(amount)
-
-                # Add to category
-                if tx.category:
-                    if tx.category not in weekly_data[week_key]["categories"]:
-                        weekly_data[week_key]["categories"][tx.category] = 0
-                    weekly_data[week_key]["categories"][tx.category] += abs(amount)
-
-            except Exception as e:
-                logger.error(f"Error processing transaction: {e}")
-                continue
-
-        # Convert to list and sort by week
-        chart_data = [
-            {
-                "week": week,
-                "total": data["total"],
-                "categories": data["categories"]
-            }
-            for week, data in sorted(weekly_data.items())
-        ]
-
-        # Filter by category if specified
-        if category != "all":
-            filtered_data = []
-            for item in chart_data:
-                category_amount = item["categories"].get(category, 0)
-                if category_amount > 0:  # Only include weeks with spending in this category
-                    filtered_data.append({
-                        "week": item["week"],
-                        "total": category_amount,
-                        "categories": {category: category_amount}
-                    })
-            chart_data = filtered_data
-
+        snapshot = await get_statistics_snapshot(user_data["user_id"])
         return {
             "success": True,
-            "data": chart_data
+            "data": filter_chart_category(snapshot["weekly"], category)
         }
-
     except Exception as e:
         logger.error(f"Error generating spending chart: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -391,66 +439,16 @@ async def get_ai_insights():
 
     try:
         # Get mock transactions
-        transactions = MOCK_TRANSACTIONS["transactions"]["booked"]
+        transactions = get_mock_transactions()["transactions"]["booked"]
         print(f"\nFound {len(transactions)} transactions to analyze")
 
-        # Convert to Transaction objects and calculate weekly averages
-        transaction_objects = []
-        weekly_totals = {}
-        category_weekly_totals = {}
-
+        # Classify and sum per category and week, in exact minor units
+        records = records_from_transactions(transactions)
         print("\n=== Processing Transactions ===")
-        for tx in transactions:
-            try:
-                transaction = Transaction(
-                    transactionId=tx["transactionId"],
-                    bookingDate=tx["bookingDate"],
-                    valueDate=tx["valueDate"],
-                    transactionAmount=tx["transactionAmount"],
-                    remittanceInformationUnstructured=tx["remittanceInformationUnstructured"],
-                    proprietaryBankTransactionCode=tx["proprietaryBankTransactionCode"],
-                    internalTransactionId=tx["internalTransactionId"]
-                )
-                # Classify the transaction
-                transaction.category = await classify_transaction_with_llm(transaction)
-                transaction_objects.append(transaction)
-
-                # Calculate weekly totals
-                date = datetime.strptime(transaction.bookingDate, "%Y-%m-%d")
-                week_start = date - timedelta(days=date.weekday())
-                week_key = week_start.strftime("%Y-%m-%d")
-
-                amount = float(transaction.transactionAmount["amount"])
-                if amount < 0:  # Only consider spending (negative amounts)
-                    # Update overall weekly totals
-                    weekly_totals[week_key] = weekly_totals.get(week_key, 0) + abs(amount)
-
-                    # Update category weekly totals
-                    if transaction.category:
-                        if transaction.category not in category_weekly_totals:
-                            category_weekly_totals[transaction.category] = {}
-                        category_weekly_totals[transaction.category][week_key] = category_weekly_totals[transaction.category].get(week_key, 0) + abs(amount)
-
-            except Exception as e:
-                print(f"Error processing transaction: {e}")
-                continue
-
-        # Calculate category spending totals
-        category_spending = {}
-        for tx in transaction_objects:
-            try:
-                amount = float(tx.transactionAmount["amount"])
-                if amount < 0 and tx.category:  # Only consider spending (negative amounts)
-                    category_spending[tx.category] = category_spending.get(tx.category, 0) + abs(amount)
-            except Exception as e:
-                print(f"Error calculating category spending: {e}")
-                continue
-
-        # Calculate weekly averages for each category
-        weekly_averages = {}
-        for category, weekly_data in category_weekly_totals.items():
-            if weekly_data:
-                weekly_averages[category] = sum(weekly_data.values()) / len(weekly_data)
+        await classify_records(records)
+        insights = build_insights(records)
+        category_spending = insights["spending_by_category"]
+        weekly_averages = insights["weekly_averages"]
 
         print("\n=== Spending Analysis ===")
         print("\nCategory Spending:")
@@ -494,19 +492,10 @@ async def get_ai_expert_tips(
 ):
     user_id = user_data["user_id"]
     try:
-        # Get user's statistics
-        stats = await get_statistics_summary(user_data)
-
-        # Generate expert tips based on spending data
-        tips = await get_expert_tips({
-            "category_spending": stats["category_spending"],
-            "top_merchants": stats["top_merchants"],
-            "monthly_spending": stats["monthly_spending"]
-        })
-
+        snapshot = await get_analytics_snapshot(user_id)
         return {
-            "tips": tips,
-            "last_updated": datetime.utcnow().isoformat()
+            "tips": snapshot["tips"],
+            "last_updated": snapshot["computed_at"]
         }
     except Exception as e:
         logger.error(f"Error generating expert tips: {str(e)}")
@@ -519,12 +508,6 @@ async def get_ai_deals(
 ):
     user_id = user_data["user_id"]
     try:
-        # Get user's statistics to find categories they spend the most on
-        stats = await get_statistics_summary(user_data)
-
-        # Use category spending data to determine which deals to search for
-        category_spending = stats["category_spending"]
-
         # If a specific category is requested, only search for that category
         if category != "all":
             # Search for deals in the requested category
@@ -534,54 +517,120 @@ async def get_ai_deals(
                 "category": category,
                 "last_updated": datetime.utcnow().isoformat()
             }
-        else:
-            # Find the top 3 spending categories
-            top_categories = sorted(
-                [(k, v) for k, v in category_spending.items() if v < 0],
-                key=lambda x: abs(x[1]),
-                reverse=True
-            )[:3]
-
-            all_deals = []
-            for cat, _ in top_categories:
-                cat_deals = await scrape_best_deals(cat)
-                for deal in cat_deals:
-                    deal["category"] = cat
-                all_deals.extend(cat_deals)
 
+        # Otherwise the snapshot already holds deals for the top spending categories
+        snapshot = await get_analytics_snapshot(user_id)
         return {
-                "deals": all_deals,
-                "top_categories": [cat for cat, _ in top_categories],
-                "last_updated": datetime.utcnow().isoformat()
+            "deals": snapshot["deals"],
+            "top_categories": snapshot["top_categories"],
+            "last_updated": snapshot["computed_at"]
         }
     except Exception as e:
         logger.error(f"Error finding deals: {str(e)}")
         raise HTTPException(status_code=400, detail=str(e))
 
+def ndjson_response(items: AsyncIterator[Any], description: str) -> StreamingResponse:
+    """
+    Stream items as newline-delimited JSON. Errors after the first line can't change the
+    status code any more, so they are logged and end the stream.
+    """
+    async def lines():
+        try:
+            async for item in items:
+                yield json.dumps(item) + "\n"
+        except Exception as e:
+            logger.error(f"Error streaming {description}: {str(e)}")
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+@ai_router.get("/expert-tips/stream")
+async def stream_ai_expert_tips(
+    user_data: Annotated[Dict[str, str], Depends(get_authenticated_user)]
+):
+    """
+    Expert tips as newline-delimited JSON strings, each sent as soon as the model finishes it
+    """
+    user_id = user_data["user_id"]
+
+    async def tips():
+        if await insights_version(user_id) is not None:
+            # precomputed by the worker: nothing to wait for
+            for tip in (await get_analytics_snapshot(user_id))["tips"]:
+                yield tip
+            return
+        statistics = await get_statistics_snapshot(user_id)
+        async for tip in stream_expert_tips({
+            "category_spending": statistics["spending_by_category"],
+            "weekly_averages": statistics["weekly_averages"],
+            "subscriptions": statistics.get("subscriptions", [])
+        }):
+            yield tip
+    return ndjson_response(tips(), "expert tips")
+
+@ai_router.get("/deals/stream")
+async def stream_ai_deals(
+    user_data: Annotated[Dict[str, str], Depends(get_authenticated_user)],
+    category: str = "all"
+):
+    """
+    Deals as newline-delimited JSON objects, each sent as soon as the model finishes it
+    """
+    user_id = user_data["user_id"]
+
+    async def deals():
+        if category != "all":
+            async for deal in stream_best_deals(category):
+                yield deal
+            return
+        if await insights_version(user_id) is not None:
+            for deal in (await get_analytics_snapshot(user_id))["deals"]:
+                yield deal
+            return
+        statistics = await get_statistics_snapshot(user_id)
+        async for deal in stream_deals(statistics["top_categories"]):
+            yield deal
+    return ndjson_response(deals(), "deals")
+
+@ai_router.get("/metrics")
+async def get_ai_metrics():
+    """
+    OpenAI call counters, including calls saved by request coalescing
+    """
+    return {
+        "coalescing": get_coalescing_stats(),
+        "resilience": get_resilience_stats(),
+        "token_usage": get_token_usage(),
+        "snapshots": analytics_snapshots.stats,
+        "statistics_snapshots": statistics_snapshots.stats
+    }
+
 @ai_router.post("/marketplace-for-tip")
 async def get_marketplace_for_tip(tip: dict = Body(...)):
     tip_text = tip.get("tip", "")
-    offers_to_check = MOCK_OFFERS
-
-    prompt = (
-        "You are an assistant that helps match financial tips to marketplace offers. "
-        "For each offer, answer YES if the offer is relevant to the tip, otherwise NO. "
-        f"Tip: {tip_text}\n\n"
-        "Offers:\n"
-    )
-    for i, offer in enumerate(offers_to_check, 1):
-        prompt += f"{i}. {offer['title']} - {offer['description']}\n"
-
-    prompt += (
-        "\nRespond with a list of YES/NO, one for each offer, in order. "
-        "Example: YES, NO, YES, NO"
+    # merchants the user pays regularly (GET /api/statistics/subscriptions), optional
+    recurring_merchants = {normalize_merchant(merchant) for merchant in tip.get("recurring_merchants", [])}
+
+    # Offers beyond the prompt budget are left out rather than sent truncated
+    builder = (
+        PromptBuilder("gpt-3.5-turbo", PROMPT_BUDGETS["marketplace"])
+        .text(
+            "You are an assistant that helps match financial tips to marketplace offers. "
+            "For each offer, answer YES if the offer is relevant to the tip, otherwise NO. "
+            f"Tip: {truncate_tokens(tip_text, PROMPT_BUDGETS['marketplace'] // 4)}\n"
+        )
+        .items("Offers", [f"{offer['title']} - {offer['description']}" for offer in MOCK_OFFERS])
+        .text(
+            "\nRespond with a list of YES/NO, one for each offer, in order. "
+            "Example: YES, NO, YES, NO"
+        )
     )
+    prompt = builder.build()
+    offers_to_check = MOCK_OFFERS[:builder.kept["Offers"]]
 
     try:
-        response = openai.chat.completions.create(
+        response = await create_chat_completion(
             model="gpt-3.5-turbo",
             messages=[{"role": "user", "content": prompt}],
-            max_tokens=20,
+            max_tokens=max(20, 3 * len(offers_to_check)),
             temperature=0,
         )
         answer = getattr(response.choices[0].message, "content", None)
@@ -593,19 +642,105 @@ async def get_marketplace_for_tip(tip: dict = Body(...)):
             ]
         else:
             matched_offers = offers_to_check
-    except Exception as e:
+    except Exception:
         matched_offers = offers_to_check
 
     if not matched_offers:
         matched_offers = offers_to_check
 
+    # Rank by how much the platform spends with each brand
+    try:
+        banking = get_banking()
+        popularity = banking.load_merchant_stats(GLOBAL_SCOPE, banking.MERCHANT_STATS_MAX_AGE)
+    except Exception as e:
+        logger.error(f"Error loading merchant popularity: {str(e)}")
+        popularity = None
+    # Offers from brands the user already pays regularly come first, then the most popular brands
+    matched_offers = sorted(
+        matched_offers,
+        key=lambda offer: (
+            normalize_merchant(offer["brand"]) in recurring_merchants,
+            popularity.estimate(normalize_merchant(offer["brand"])) if popularity is not None else 0
+        ),
+        reverse=True
+    )
+
     return {"offers": matched_offers}
 
+# Dashboard endpoint
+async def within_deadline(task: asyncio.Task, deadline: float):
+    """
+    Wait for a shared snapshot task for at most `deadline` seconds. Shielded: a missed deadline
+    leaves the build running, so the snapshot is cached for the next request.
+    """
+    try:
+        return await asyncio.wait_for(asyncio.shield(task), deadline)
+    except asyncio.TimeoutError:
+        # nobody awaits the task any more; retrieve its outcome so a late failure is logged once
+        task.add_done_callback(log_late_failure)
+        raise
+
+def log_late_failure(task: asyncio.Task):
+    if not task.cancelled() and task.exception() is not None:
+        logger.error(f"Dashboard panels failed after their deadline: {str(task.exception())}")
+
+@dashboard_router.get("")
+async def get_dashboard(
+    user_data: Annotated[Dict[str, str], Depends(get_authenticated_user)],
+    category: str = "all"
+):
+    """
+    Every dashboard panel in one round-trip. The statistics panels and the AI panels (tips, deals)
+    have their own deadlines; panels that miss theirs come back as null and are listed in "pending".
+    """
+    user_id = user_data["user_id"]
+    statistics_task = asyncio.create_task(get_statistics_snapshot(user_id))
+    snapshot_task = asyncio.create_task(get_analytics_snapshot(user_id))
+    statistics, snapshot = await asyncio.gather(
+        within_deadline(statistics_task, DASHBOARD_DEADLINES["statistics"]),
+        within_deadline(snapshot_task, DASHBOARD_DEADLINES["ai"]),
+        return_exceptions=True
+    )
+
+    pending = []
+    errors = {}
+    for name, result in (("statistics", statistics), ("ai", snapshot)):
+        if isinstance(result, asyncio.TimeoutError):
+            pending.append(name)
+        elif isinstance(result, Exception):
+            logger.error(f"Error building dashboard {name} panels: {str(result)}")
+            errors[name] = str(result)
+    if not isinstance(snapshot, dict):
+        snapshot = None
+    if not isinstance(statistics, dict):
+        # the full snapshot carries the statistics too
+        statistics = snapshot
+        if snapshot is not None:
+            pending = [name for name in pending if name != "statistics"]
+            errors.pop("statistics", None)
+    if statistics is None and snapshot is None and errors:
+        raise HTTPException(status_code=500, detail=errors)
+
+    return {
+        "summary": statistics["summary"] if statistics else None,
+        "spending_chart": filter_chart_category(statistics["weekly"], category) if statistics else None,
+        "category_spending": statistics["spending_by_category"] if statistics else None,
+        "weekly_averages": statistics["weekly_averages"] if statistics else None,
+        "tips": snapshot["tips"] if snapshot else None,
+        "deals": snapshot["deals"] if snapshot else None,
+        "top_categories": (snapshot or statistics or {}).get("top_categories"),
+        "subscriptions": statistics.get("subscriptions") if statistics else None,
+        "pending": pending,
+        "errors": errors,
+        "last_updated": (snapshot or statistics or {}).get("computed_at")
+    }
+
 # Register routers
 app.include_router(banking_router)
 app.include_router(statistics_router)
 app.include_router(ai_router)
 app.include_router(users_router)
+app.include_router(dashboard_router)
 
 if __name__ == "__main__":
     import uvicorn
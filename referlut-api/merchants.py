@@ -0,0 +1,115 @@
+import re
+from functools import lru_cache
+from typing import Dict, List, Optional
+
+# Cleanup pipeline applied in order to lowercased remittance text
+_CLEANUP_PATTERNS = [
+    # payment rails and card-scheme prefixes banks put in front of the merchant
+    (re.compile(r"^(card payment to|card purchase|contactless payment|direct debit( payment)? to|"
+                r"faster payment to|standing order to|payment to|pos|vis|cp|ddr|dd|fpo)\b[\s:*-]*"), ""),
+    # "so" (standing order) and "bp" (bill payment) are also real names (SO Energy, BP), so they
+    # only count as prefixes when a separator follows: "SO: RENT", "BP - COUNCIL TAX"
+    (re.compile(r"^(so|bp)\s*[:*-][\s:*-]*"), ""),
+    # acquirer prefixes such as "SQ *", "SUMUP *", "ZETTLE_", "PAYPAL *"
+    (re.compile(r"^(sq|sumup|zettle|iz|paypal|pp|crv)\s*[*_]\s*"), ""),
+    # masked card numbers and long reference numbers
+    (re.compile(r"\*+\d+|\b[x*]{4,}\d*|\b\d{5,}\b"), " "),
+    # dates: 12/05, 12-05-2024, 12may, 12 may 2024, "on 12 may"
+    (re.compile(r"\b(on\s+)?\d{1,2}[/.-]\d{1,2}([/.-]\d{2,4})?\b"), " "),
+    (re.compile(r"\b(on\s+)?\d{1,2}\s?(jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)[a-z]*(\s?\d{2,4})?\b"), " "),
+    # references and store numbers
+    (re.compile(r"\b(ref|reference|rrn|auth|id)\s*[:.#]?\s*\S+"), " "),
+    (re.compile(r"#\s*\d+|\b(store|branch|unit|stn)\s*\d+\b|\b\d{1,4}\b"), " "),
+    # web noise
+    (re.compile(r"\bwww\.|\.(com|co\.uk|uk|net|org)\b"), " "),
+    (re.compile(r"[^a-z&' ]+"), " "),
+    (re.compile(r"\s+"), " "),
+]
+
+# Known spellings of the same merchant, matched on the cleaned text's leading words
+MERCHANT_ALIASES = {
+    "amzn": "Amazon",
+    "amazon": "Amazon",
+    "tesco": "Tesco",
+    "sainsbury": "Sainsbury's",
+    "sainsburys": "Sainsbury's",
+    "js online": "Sainsbury's",
+    "asda": "Asda",
+    "aldi": "Aldi",
+    "lidl": "Lidl",
+    "waitrose": "Waitrose",
+    "morrisons": "Morrisons",
+    "m&s": "Marks & Spencer",
+    "marks & spencer": "Marks & Spencer",
+    "marks and spencer": "Marks & Spencer",
+    "tfl": "TfL",
+    "transport for london": "TfL",
+    "uber eats": "Uber Eats",
+    "ubereats": "Uber Eats",
+    "uber": "Uber",
+    "deliveroo": "Deliveroo",
+    "just eat": "Just Eat",
+    "pret": "Pret A Manger",
+    "starbucks": "Starbucks",
+    "costa": "Costa Coffee",
+    "mcdonalds": "McDonald's",
+    "mcdonald's": "McDonald's",
+    "netflix": "Netflix",
+    "spotify": "Spotify",
+    "disney": "Disney+",
+    "prime video": "Amazon Prime",
+    "amazon prime": "Amazon Prime",
+    "apple": "Apple",
+    "google": "Google",
+    "trainline": "Trainline",
+    "bp": "BP",
+}
+# longest alias first so "uber eats" wins over "uber"
+_ALIAS_ORDER = sorted(MERCHANT_ALIASES, key=len, reverse=True)
+
+def clean_merchant_text(raw: Optional[str]) -> str:
+    text = (raw or "").lower()
+    for pattern, replacement in _CLEANUP_PATTERNS:
+        text = pattern.sub(replacement, text)
+    return text.strip(" &'")
+
+@lru_cache(maxsize=65536)
+def normalize_merchant(raw: Optional[str]) -> str:
+    """
+    Canonical display name for a raw remittance string, e.g.
+    "CARD PAYMENT TO TESCO STORES 3297 ON 12 MAY" -> "Tesco".
+    """
+    text = clean_merchant_text(raw)
+    if not text:
+        return "Unknown"
+    for alias in _ALIAS_ORDER:
+        if text == alias or text.startswith(alias + " "):
+            return MERCHANT_ALIASES[alias]
+    return text.title()
+
+class MerchantIndex:
+    """
+    Interns canonical merchant names to compact integer ids so aggregation and
+    caches can key on ints instead of raw strings. Ids are only meaningful
+    within one index.
+    """
+    def __init__(self):
+        self.ids: Dict[str, int] = {}
+        self.names: List[str] = []
+
+    def intern(self, canonical: str) -> int:
+        merchant_id = self.ids.get(canonical)
+        if merchant_id is None:
+            merchant_id = len(self.names)
+            self.ids[canonical] = merchant_id
+            self.names.append(canonical)
+        return merchant_id
+
+    def id_for(self, raw: Optional[str]) -> int:
+        return self.intern(normalize_merchant(raw))
+
+    def name(self, merchant_id: int) -> str:
+        return self.names[merchant_id]
+
+# Process-wide index used by the request-path aggregations
+merchant_index = MerchantIndex()
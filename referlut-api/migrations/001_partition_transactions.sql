@@ -0,0 +1,97 @@
+-- Migrate an existing database to the monthly-partitioned transactions table from schema.sql
+-- and replace the single-column indexes with the (account_id, booking_date) covering index.
+-- Run in the Supabase SQL editor during a quiet period (the worker should be stopped):
+-- the copy holds a lock on transactions until it commits. Afterwards check the query plans with
+--   python check_query_plans.py
+
+BEGIN;
+
+ALTER TABLE public.transactions RENAME TO transactions_unpartitioned;
+-- index names are global; free them for the new table
+DROP INDEX IF EXISTS public.idx_transactions_account_id;
+DROP INDEX IF EXISTS public.idx_transactions_booking_date;
+DROP INDEX IF EXISTS public.idx_transactions_pending;
+
+CREATE TABLE public.transactions (
+  transaction_id TEXT NOT NULL,
+  account_id TEXT NOT NULL REFERENCES public.accounts(account_id) ON DELETE CASCADE,
+  entry_reference TEXT,
+  internal_transaction_id TEXT,
+  additional_information TEXT,
+  merchant_name TEXT,
+  merchant_canonical TEXT,
+  amount NUMERIC NOT NULL,
+  currency TEXT,
+  booking_date DATE,
+  value_date DATE,
+  proprietary_bank_transaction_code TEXT,
+  category TEXT,
+  status TEXT NOT NULL DEFAULT 'booked',
+  content_hash TEXT,
+  created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+  CONSTRAINT transactions_id_booking_date_key UNIQUE NULLS NOT DISTINCT (transaction_id, booking_date)
+) PARTITION BY RANGE (booking_date);
+
+CREATE TABLE public.transactions_default PARTITION OF public.transactions DEFAULT;
+
+CREATE OR REPLACE FUNCTION public.ensure_transaction_partitions(p_from DATE, p_to DATE)
+RETURNS INTEGER
+LANGUAGE plpgsql AS $$
+DECLARE
+  month_start DATE := date_trunc('month', p_from)::DATE;
+  month_end DATE;
+  partition_name TEXT;
+  created INTEGER := 0;
+BEGIN
+  WHILE month_start < p_to LOOP
+    partition_name := 'transactions_' || to_char(month_start, 'YYYY_MM');
+    month_end := (month_start + INTERVAL '1 month')::DATE;
+    IF to_regclass('public.' || partition_name) IS NULL THEN
+      EXECUTE format('CREATE TABLE public.%I (LIKE public.transactions INCLUDING DEFAULTS)', partition_name);
+      EXECUTE format(
+        'WITH moved AS (DELETE FROM public.transactions_default WHERE booking_date >= %L AND booking_date < %L RETURNING *) '
+        'INSERT INTO public.%I SELECT * FROM moved',
+        month_start, month_end, partition_name
+      );
+      EXECUTE format(
+        'ALTER TABLE public.transactions ATTACH PARTITION public.%I FOR VALUES FROM (%L) TO (%L)',
+        partition_name, month_start, month_end
+      );
+      created := created + 1;
+    END IF;
+    month_start := (month_start + INTERVAL '1 month')::DATE;
+  END LOOP;
+  RETURN created;
+END;
+$$;
+
+-- Partitions for every month with data, through a year ahead
+SELECT public.ensure_transaction_partitions(
+  COALESCE((SELECT MIN(booking_date) FROM public.transactions_unpartitioned), CURRENT_DATE),
+  (CURRENT_DATE + INTERVAL '12 months')::DATE
+);
+
+INSERT INTO public.transactions (
+  transaction_id, account_id, entry_reference, internal_transaction_id, additional_information,
+  merchant_name, merchant_canonical, amount, currency, booking_date, value_date,
+  proprietary_bank_transaction_code, category, status, content_hash, created_at
+)
+-- The original table has no status, content_hash or merchant_canonical: existing rows are booked,
+-- and imports fill in the hash and canonical name when they next rewrite a row
+SELECT
+  transaction_id, account_id, entry_reference, internal_transaction_id, additional_information,
+  merchant_name, NULL, amount, currency, booking_date, value_date,
+  proprietary_bank_transaction_code, category, 'booked', NULL, created_at
+FROM public.transactions_unpartitioned;
+
+CREATE INDEX idx_transactions_account_booking ON public.transactions(account_id, booking_date)
+  INCLUDE (amount, category, merchant_canonical, merchant_name, status);
+CREATE INDEX idx_transactions_pending ON public.transactions(account_id) WHERE status = 'pending';
+
+COMMIT;
+
+-- Index-only scans depend on the visibility map; refresh it and the planner statistics now
+VACUUM ANALYZE public.transactions;
+
+-- Once the application has been verified against the new table:
+-- DROP TABLE public.transactions_unpartitioned;
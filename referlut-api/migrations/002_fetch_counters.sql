@@ -0,0 +1,18 @@
+-- Seed the fetch_counters rolling counters from the existing fetch_logs rows.
+-- Run after applying the fetch_counters, fetch_log_daily, record_fetch and compact_fetch_logs
+-- definitions from schema.sql, and before deploying the code that reads the counters.
+
+INSERT INTO public.fetch_counters (account_id, scope, recent_fetches, total_fetches, updated_at)
+SELECT account_id, scope,
+       (array_agg(fetched_at ORDER BY fetched_at DESC))[1:4],  -- quota.DAILY_FETCH_LIMIT newest
+       COUNT(*), NOW()
+FROM public.fetch_logs
+GROUP BY account_id, scope
+ON CONFLICT (account_id, scope) DO NOTHING;
+
+-- array slices keep the DESC order from the aggregate; store them oldest first like record_fetch
+UPDATE public.fetch_counters
+SET recent_fetches = ARRAY(SELECT t FROM unnest(recent_fetches) AS t ORDER BY t);
+
+-- Compact raw rows older than quota.FETCH_LOG_RETENTION
+SELECT public.compact_fetch_logs(NOW() - INTERVAL '7 days');
@@ -0,0 +1,16 @@
+-- Add the spending category column and the user_insights table used by the worker's precompute stage
+
+ALTER TABLE public.transactions ADD COLUMN IF NOT EXISTS spending_category TEXT;
+
+CREATE TABLE IF NOT EXISTS public.user_insights (
+  user_id TEXT PRIMARY KEY REFERENCES public.users(auth0_id) ON DELETE CASCADE,
+  summary JSONB,
+  weekly JSONB,
+  spending_by_category JSONB,
+  weekly_averages JSONB,
+  tips JSONB,
+  deals JSONB,
+  top_categories JSONB,
+  transaction_count INTEGER,
+  computed_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
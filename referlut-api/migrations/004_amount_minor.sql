@@ -0,0 +1,53 @@
+-- Store transaction amounts as integer minor units and aggregate them per currency.
+-- Run before deploying the code that reads amount_minor.
+
+ALTER TABLE public.transactions ADD COLUMN IF NOT EXISTS amount_minor BIGINT;
+
+-- Backfill from the NUMERIC amount; exponents match money.MINOR_UNIT_EXPONENTS
+UPDATE public.transactions
+SET amount_minor = round(amount * power(10, CASE
+    WHEN upper(currency) IN ('BIF', 'CLP', 'DJF', 'GNF', 'ISK', 'JPY', 'KMF', 'KRW', 'PYG',
+                             'RWF', 'UGX', 'VND', 'VUV', 'XAF', 'XOF', 'XPF') THEN 0
+    WHEN upper(currency) IN ('BHD', 'IQD', 'JOD', 'KWD', 'LYD', 'OMR', 'TND') THEN 3
+    ELSE 2
+  END))::BIGINT
+WHERE amount_minor IS NULL;
+
+-- The covering index carries amount_minor and currency instead of amount so aggregates stay index-only
+DROP INDEX IF EXISTS public.idx_transactions_account_booking;
+CREATE INDEX idx_transactions_account_booking ON public.transactions(account_id, booking_date)
+  INCLUDE (amount_minor, currency, category, merchant_canonical, merchant_name, status);
+
+-- transaction_aggregates changes its result columns, which CREATE OR REPLACE can't do
+DROP FUNCTION IF EXISTS public.transaction_aggregates(TEXT[], DATE);
+-- Recreate it; keep in sync with the definition in schema.sql
+CREATE OR REPLACE FUNCTION public.transaction_aggregates(p_account_ids TEXT[], p_since DATE)
+RETURNS TABLE (dimension TEXT, key TEXT, currency TEXT, total BIGINT, spending BIGINT, income BIGINT, tx_count BIGINT)
+LANGUAGE sql STABLE AS $$
+  SELECT
+    CASE
+      WHEN GROUPING(t.month) = 0 THEN 'month'
+      WHEN GROUPING(t.category) = 0 THEN 'category'
+      WHEN GROUPING(t.merchant) = 0 THEN 'merchant'
+      ELSE 'total'
+    END AS dimension,
+    COALESCE(t.month, t.category, t.merchant) AS key,
+    t.currency,
+    SUM(t.amount_minor)::BIGINT AS total,
+    SUM(-t.amount_minor) FILTER (WHERE t.amount_minor < 0)::BIGINT AS spending,
+    SUM(t.amount_minor) FILTER (WHERE t.amount_minor >= 0)::BIGINT AS income,
+    COUNT(*) AS tx_count
+  FROM (
+    SELECT
+      to_char(booking_date, 'YYYY-MM') AS month,
+      COALESCE(category, 'Uncategorized') AS category,
+      COALESCE(merchant_canonical, merchant_name, 'Unknown') AS merchant,
+      currency,
+      amount_minor
+    FROM public.transactions
+    WHERE account_id = ANY(p_account_ids) AND booking_date >= p_since
+  ) t
+  GROUP BY GROUPING SETS ((t.month, t.currency), (t.category, t.currency), (t.merchant, t.currency), (t.currency));
+$$;
+
+VACUUM ANALYZE public.transactions;
@@ -0,0 +1,3 @@
+-- Store the recurring payments found by the worker's precompute stage with the rest of the insights
+
+ALTER TABLE public.user_insights ADD COLUMN IF NOT EXISTS subscriptions JSONB;
@@ -0,0 +1,4 @@
+-- Keep the latest balances on each account; the worker refreshes them on the quota planner's schedule
+
+ALTER TABLE public.accounts ADD COLUMN IF NOT EXISTS balances JSONB;
+ALTER TABLE public.accounts ADD COLUMN IF NOT EXISTS balances_updated_at TIMESTAMP WITH TIME ZONE;
@@ -0,0 +1,9 @@
+-- Store the normalized merchant name (merchants.normalize_merchant) on each transaction.
+-- Imports fill it for new and changed rows; aggregates fall back to merchant_name where it is NULL.
+
+ALTER TABLE public.transactions ADD COLUMN IF NOT EXISTS merchant_canonical TEXT;
+
+-- Databases created from an earlier schema.sql also interned merchants to ids nothing read
+DROP INDEX IF EXISTS public.idx_transactions_merchant_id;
+ALTER TABLE public.transactions DROP COLUMN IF EXISTS merchant_id;
+DROP TABLE IF EXISTS public.merchants;
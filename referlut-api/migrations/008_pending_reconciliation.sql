@@ -0,0 +1,13 @@
+-- Add the booked/pending status and content hash used by banking.fetch_transactions to skip
+-- unchanged rows and reconcile settled pending items, and the per-account sync watermark.
+-- Idempotent: databases migrated by 001_partition_transactions.sql already have the columns.
+
+ALTER TABLE public.transactions ADD COLUMN IF NOT EXISTS status TEXT NOT NULL DEFAULT 'booked';
+ALTER TABLE public.transactions ADD COLUMN IF NOT EXISTS content_hash TEXT;
+CREATE INDEX IF NOT EXISTS idx_transactions_pending ON public.transactions(account_id) WHERE status = 'pending';
+
+CREATE TABLE IF NOT EXISTS public.account_sync_state (
+  account_id TEXT PRIMARY KEY REFERENCES public.accounts(account_id) ON DELETE CASCADE,
+  last_booked_date DATE,
+  synced_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
@@ -0,0 +1,14 @@
+-- Add the scheduling columns worker.py and scheduler.py use on account_queue: priority,
+-- consecutive failed attempts, backoff time, last error and last successful import.
+
+ALTER TABLE public.account_queue ADD COLUMN IF NOT EXISTS priority INTEGER NOT NULL DEFAULT 1;
+ALTER TABLE public.account_queue ADD COLUMN IF NOT EXISTS attempts INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE public.account_queue ADD COLUMN IF NOT EXISTS next_attempt_at TIMESTAMP WITH TIME ZONE;
+ALTER TABLE public.account_queue ADD COLUMN IF NOT EXISTS last_error TEXT;
+ALTER TABLE public.account_queue ADD COLUMN IF NOT EXISTS processed_at TIMESTAMP WITH TIME ZONE;
+
+-- The old statuses (processing, completed, error) become due entries: the worker's quota planner
+-- defers any that aren't due for a refresh yet
+UPDATE public.account_queue SET status = 'pending' WHERE status NOT IN ('pending', 'dead');
+
+CREATE INDEX IF NOT EXISTS idx_account_queue_due ON public.account_queue(status, priority, next_attempt_at);
@@ -0,0 +1,8 @@
+-- Add the merchant_stats table holding the streaming top-merchant sketches ('global' or a user id),
+-- written with compare-and-set on updated_at by banking.record_merchant_spend
+
+CREATE TABLE IF NOT EXISTS public.merchant_stats (
+  scope TEXT PRIMARY KEY,
+  sketch JSONB NOT NULL,
+  updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
@@ -10,6 +10,18 @@ def load_mock_data():
         data = json.load(f)
         return {"transactions": data["transactions"]}
 
-# Load the mock data
-MOCK_TRANSACTIONS = load_mock_data()
+_mock_transactions = None
+
+def get_mock_transactions():
+    """Mock data, loaded from disk on first use rather than at import"""
+    global _mock_transactions
+    if _mock_transactions is None:
+        _mock_transactions = load_mock_data()
+    return _mock_transactions
+
+def __getattr__(name):
+    # MOCK_TRANSACTIONS stays importable, but is only read when first accessed
+    if name == "MOCK_TRANSACTIONS":
+        return get_mock_transactions()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
@@ -0,0 +1,138 @@
+import json
+import os
+import logging
+from decimal import Decimal, InvalidOperation, ROUND_HALF_EVEN
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Currency the statistics are reported in; other currencies are converted with the FX table
+DISPLAY_CURRENCY = os.getenv("DISPLAY_CURRENCY", "GBP")
+# Local FX table: {"base": "GBP", "as_of": "2026-10-01", "rates": {"EUR": "0.86", ...}}, where each
+# rate is units of base per one unit of the currency. Optional; without it only same-currency sums convert.
+FX_RATES_PATH = os.getenv("FX_RATES_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "fx_rates.json"))
+
+# ISO 4217 currencies whose minor unit isn't 1/100
+MINOR_UNIT_EXPONENTS = {
+    "BIF": 0, "CLP": 0, "DJF": 0, "GNF": 0, "ISK": 0, "JPY": 0, "KMF": 0, "KRW": 0, "PYG": 0,
+    "RWF": 0, "UGX": 0, "VND": 0, "VUV": 0, "XAF": 0, "XOF": 0, "XPF": 0,
+    "BHD": 3, "IQD": 3, "JOD": 3, "KWD": 3, "LYD": 3, "OMR": 3, "TND": 3,
+}
+DEFAULT_EXPONENT = 2
+
+def minor_exponent(currency: Optional[str]) -> int:
+    return MINOR_UNIT_EXPONENTS.get((currency or DISPLAY_CURRENCY).upper(), DEFAULT_EXPONENT)
+
+def to_minor(amount: Any, currency: Optional[str]) -> int:
+    """
+    Parse a provider amount ("-12.30", 12.3, Decimal) into integer minor units of `currency`.
+    Raises ValueError for anything that isn't a number.
+    """
+    try:
+        value = Decimal(str(amount).strip())
+    except InvalidOperation:
+        raise ValueError(f"Invalid amount {amount!r}")
+    if not value.is_finite():
+        raise ValueError(f"Invalid amount {amount!r}")
+    return int(value.scaleb(minor_exponent(currency)).quantize(Decimal(1), rounding=ROUND_HALF_EVEN))
+
+def row_minor(row: Dict[str, Any]) -> int:
+    """
+    A stored transaction row's amount in minor units: set at import, parsed here only for older rows.
+    """
+    minor = row.get("amount_minor")
+    return minor if minor is not None else to_minor(row.get("amount") or 0, row.get("currency"))
+
+def from_minor(minor: int, currency: Optional[str]) -> Decimal:
+    return Decimal(minor).scaleb(-minor_exponent(currency))
+
+def to_major(minor: int, currency: Optional[str]) -> float:
+    """
+    Minor units as a float in major units, for JSON responses. Only at the edge: sum in minor units.
+    """
+    return float(from_minor(minor, currency))
+
+class FxRates:
+    """
+    Exchange rates relative to one base currency: `rates[c]` is units of base per unit of c.
+    """
+    def __init__(self, base: str, rates: Dict[str, Decimal], as_of: Optional[str] = None):
+        self.base = base
+        self.rates = {**rates, base: Decimal(1)}
+        self.as_of = as_of
+
+    def rate(self, source: str, target: str) -> Optional[Decimal]:
+        if source == target:
+            return Decimal(1)
+        if source not in self.rates or target not in self.rates:
+            return None
+        return self.rates[source] / self.rates[target]
+
+    def convert_minor(self, minor: int, source: str, target: str) -> Optional[int]:
+        """
+        Minor units of `source` as minor units of `target`, or None when there is no rate.
+        """
+        if source == target:
+            return minor
+        rate = self.rate(source, target)
+        if rate is None:
+            return None
+        converted = from_minor(minor, source) * rate
+        return int(converted.scaleb(minor_exponent(target)).quantize(Decimal(1), rounding=ROUND_HALF_EVEN))
+
+# FX table loaded from FX_RATES_PATH, reloaded when the file changes
+_fx_rates: Optional[FxRates] = None
+_fx_rates_mtime: Optional[float] = None
+
+def get_fx_rates(path: str = FX_RATES_PATH) -> FxRates:
+    """
+    The locally cached FX table, or an empty one (same-currency conversion only) if there is none.
+    """
+    global _fx_rates, _fx_rates_mtime
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        mtime = None
+    if _fx_rates is None or mtime != _fx_rates_mtime:
+        _fx_rates = FxRates(DISPLAY_CURRENCY, {})
+        if mtime is not None:
+            try:
+                with open(path) as f:
+                    table = json.load(f)
+                _fx_rates = FxRates(
+                    table["base"],
+                    {currency: Decimal(str(rate)) for currency, rate in table["rates"].items()},
+                    table.get("as_of")
+                )
+            except (OSError, ValueError, KeyError, InvalidOperation) as e:
+                logger.warning(f"Ignoring unreadable FX table {path}: {e}")
+        _fx_rates_mtime = mtime
+    return _fx_rates
+
+def display_totals(totals: Dict[Tuple[Hashable, str], int], currency: str = DISPLAY_CURRENCY,
+                   rates: Optional[FxRates] = None) -> Dict[Hashable, float]:
+    """
+    Collapse exact per-(key, currency) sums in minor units into one display-currency amount per key.
+    Currencies without a rate are left out (see unconverted_currencies).
+    """
+    rates = rates or get_fx_rates()
+    display: Dict[Hashable, int] = {}
+    for (key, source), minor in totals.items():
+        converted = rates.convert_minor(minor, source or currency, currency)
+        if converted is not None:
+            display[key] = display.get(key, 0) + converted
+    return {key: to_major(minor, currency) for key, minor in display.items()}
+
+def unconverted_currencies(totals: Dict[Tuple[Hashable, str], int], currency: str = DISPLAY_CURRENCY,
+                           rates: Optional[FxRates] = None) -> list:
+    rates = rates or get_fx_rates()
+    return sorted({source for _, source in totals if source and rates.rate(source, currency) is None})
+
+def minor_units_by_currency(totals: Dict[Tuple[Hashable, str], int]) -> Dict[str, Dict[Hashable, int]]:
+    """
+    {(key, currency): minor} regrouped as {currency: {key: minor}}, for responses that report exact sums.
+    """
+    grouped: Dict[str, Dict[Hashable, int]] = {}
+    for (key, currency), minor in totals.items():
+        grouped.setdefault(currency, {})[key] = minor
+    return grouped
@@ -0,0 +1,135 @@
+import os
+import time
+import select
+import socket
+import logging
+from abc import ABC, abstractmethod
+
+logger = logging.getLogger("notifier")
+
+# How a newly due queue entry wakes the worker:
+#   "postgres" - LISTEN on QUEUE_CHANNEL; the account_queue trigger in schema.sql sends the NOTIFY
+#   "udp"      - a datagram to the worker on this host, for co-located processes and the SQLite backend
+#   "none"     - no wakeups, the worker polls
+#   "auto"     - postgres when DATABASE_URL is set, udp otherwise
+QUEUE_NOTIFY = os.getenv("QUEUE_NOTIFY", "auto")
+QUEUE_CHANNEL = "account_queue"
+QUEUE_NOTIFY_PORT = int(os.getenv("QUEUE_NOTIFY_PORT", "8765"))
+DATABASE_URL = os.getenv("DATABASE_URL", "")
+
+def notify_mode() -> str:
+    if QUEUE_NOTIFY != "auto":
+        return QUEUE_NOTIFY
+    return "postgres" if DATABASE_URL else "udp"
+
+def notify_queue(account_id: str = ""):
+    """
+    Tell the worker an account_queue entry is due now. Best effort: a lost wakeup
+    only delays the entry until the worker's safety-net poll.
+    """
+    if notify_mode() != "udp":
+        # postgres: the database trigger notifies on the write itself
+        return
+    try:
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+            sock.sendto(account_id.encode(), ("127.0.0.1", QUEUE_NOTIFY_PORT))
+    except OSError as e:
+        logger.warning(f"Could not notify worker: {e}")
+
+class QueueListener(ABC):
+    """
+    Worker side of the wakeup channel: PollingListener, UDPListener or PostgresListener.
+    """
+
+    @abstractmethod
+    def wait(self, timeout: float) -> bool:
+        """Block until a notification arrives or the timeout passes; return whether it was woken."""
+
+    def close(self):
+        pass
+
+class PollingListener(QueueListener):
+    def wait(self, timeout):
+        time.sleep(timeout)
+        return False
+
+class UDPListener(QueueListener):
+    def __init__(self, port: int = QUEUE_NOTIFY_PORT):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind(("127.0.0.1", port))
+
+    def wait(self, timeout):
+        readable, _, _ = select.select([self.sock], [], [], timeout)
+        if not readable:
+            return False
+        # coalesce a burst of enqueues into one wakeup
+        self.sock.setblocking(False)
+        try:
+            while True:
+                self.sock.recv(256)
+        except BlockingIOError:
+            pass
+        finally:
+            self.sock.setblocking(True)
+        return True
+
+    def close(self):
+        self.sock.close()
+
+class PostgresListener(QueueListener):
+    """
+    LISTEN on a dedicated connection. Needs a session connection: on Supabase use the
+    direct or session-pooler connection string, not the transaction pooler.
+    """
+    def __init__(self, database_url: str = DATABASE_URL, channel: str = QUEUE_CHANNEL):
+        self.database_url = database_url
+        self.channel = channel
+        self.conn = None
+
+    def _connect(self):
+        import psycopg
+        self.conn = psycopg.connect(self.database_url, autocommit=True)
+        self.conn.execute(f"LISTEN {self.channel}")
+
+    def wait(self, timeout):
+        try:
+            if self.conn is None or self.conn.closed:
+                self._connect()
+            woken = False
+            for _ in self.conn.notifies(timeout=timeout, stop_after=1):
+                woken = True
+            if woken:
+                # drain the rest of a burst without blocking
+                for _ in self.conn.notifies(timeout=0):
+                    pass
+            return woken
+        except Exception as e:
+            logger.warning(f"LISTEN connection failed, falling back to polling this round: {e}")
+            self.close()
+            time.sleep(timeout)
+            return False
+
+    def close(self):
+        if self.conn is not None:
+            try:
+                self.conn.close()
+            except Exception:
+                pass
+            self.conn = None
+
+def queue_listener() -> QueueListener:
+    """
+    Listener for the configured notify mode, falling back to plain polling if it can't be set up.
+    """
+    mode = notify_mode()
+    try:
+        if mode == "postgres":
+            import psycopg  # noqa: F401 - optional dependency, only the worker needs it
+            return PostgresListener()
+        if mode == "udp":
+            return UDPListener()
+    except ImportError:
+        logger.warning("QUEUE_NOTIFY=postgres needs psycopg (pip install 'psycopg[binary]'); polling instead")
+    except OSError as e:
+        logger.warning(f"Could not bind the queue notification port {QUEUE_NOTIFY_PORT}: {e}; polling instead")
+    return PollingListener()
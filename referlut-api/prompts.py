@@ -0,0 +1,157 @@
+import json
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Prompt token budgets per call site; inputs are shrunk to fit before the request is sent
+PROMPT_BUDGETS = {
+    "classify": 120,
+    "tips": 600,
+    "deals": 250,
+    "marketplace": 700,
+}
+CHARS_PER_TOKEN = 4  # estimate when tiktoken isn't installed
+MAX_ITEM_TOKENS = 60  # longest single list item (an offer description) kept whole
+
+# tiktoken encodings by model, loaded on first use; None when tiktoken isn't installed
+_encodings: Dict[str, Any] = {}
+
+def _encoding(model: str):
+    if model not in _encodings:
+        try:
+            import tiktoken
+        except ImportError:
+            _encodings[model] = None
+        else:
+            try:
+                _encodings[model] = tiktoken.encoding_for_model(model)
+            except KeyError:
+                _encodings[model] = tiktoken.get_encoding("cl100k_base")
+    return _encodings[model]
+
+def count_tokens(text: str, model: str = "gpt-3.5-turbo") -> int:
+    """
+    Tokens in `text` for `model`: exact with tiktoken, otherwise about one per CHARS_PER_TOKEN characters.
+    """
+    encoding = _encoding(model)
+    if encoding is not None:
+        return len(encoding.encode(text))
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+def truncate_tokens(text: str, budget: int, model: str = "gpt-3.5-turbo") -> str:
+    if count_tokens(text, model) <= budget:
+        return text
+    encoding = _encoding(model)
+    if encoding is not None:
+        return encoding.decode(encoding.encode(text)[:max(budget - 1, 0)]) + "…"
+    return text[:max(budget - 1, 0) * CHARS_PER_TOKEN] + "…"
+
+def compact_json(value: Any) -> str:
+    """
+    JSON without whitespace and with amounts rounded to pennies; indent=2 costs about a third more tokens.
+    """
+    def rounded(item):
+        if isinstance(item, float):
+            return round(item, 2)
+        if isinstance(item, dict):
+            return {key: rounded(val) for key, val in item.items()}
+        if isinstance(item, list):
+            return [rounded(val) for val in item]
+        return item
+    return json.dumps(rounded(value), separators=(",", ":"), ensure_ascii=False, default=str)
+
+def fit_amounts(amounts: Dict[str, float], budget: int, model: str = "gpt-3.5-turbo") -> Dict[str, float]:
+    """
+    Keep the largest amounts that fit in `budget` tokens; the rest are summed into one "other (n more)" entry.
+    """
+    ranked = sorted(amounts.items(), key=lambda x: abs(x[1]), reverse=True)
+    kept = len(ranked)
+    while kept > 0:
+        fitted = dict(ranked[:kept])
+        rest = ranked[kept:]
+        if rest:
+            fitted[f"other ({len(rest)} more)"] = sum(amount for _, amount in rest)
+        if count_tokens(compact_json(fitted), model) <= budget:
+            return fitted
+        kept -= 1
+    return {f"all ({len(ranked)})": sum(amount for _, amount in ranked)} if ranked else {}
+
+class PromptBuilder:
+    """
+    Assembles a prompt from fixed text and shrinkable sections so it fits a token budget.
+
+    Fixed text is always kept. The budget left over is shared between the sections:
+    amount mappings keep their largest entries (fit_amounts), item lists keep a prefix
+    of their items. build() records how many items of each list made it in `kept`.
+    """
+    def __init__(self, model: str, budget: int):
+        self.model = model
+        self.budget = budget
+        self.parts: List[Tuple[str, Any]] = []
+        self.kept: Dict[str, int] = {}
+
+    def text(self, text: str) -> "PromptBuilder":
+        self.parts.append(("text", text))
+        return self
+
+    def amounts(self, label: str, amounts: Dict[str, float]) -> "PromptBuilder":
+        self.parts.append(("amounts", (label, amounts)))
+        return self
+
+    def items(self, label: str, items: List[str]) -> "PromptBuilder":
+        self.parts.append(("items", (label, items)))
+        return self
+
+    def _fit_items(self, label: str, items: List[str], budget: int) -> str:
+        lines = [f"{label}:"]
+        used = count_tokens(lines[0], self.model)
+        for i, item in enumerate(items, 1):
+            line = f"{i}. {truncate_tokens(item, MAX_ITEM_TOKENS, self.model)}"
+            cost = count_tokens(line, self.model) + 1
+            if used + cost > budget and i > 1:
+                break
+            lines.append(line)
+            used += cost
+        self.kept[label] = len(lines) - 1
+        return "\n".join(lines)
+
+    def build(self) -> str:
+        fixed = sum(count_tokens(value, self.model) for kind, value in self.parts if kind == "text")
+        sections = sum(1 for kind, _ in self.parts if kind != "text")
+        share = max(self.budget - fixed, 0) // sections if sections else 0
+        rendered = []
+        for kind, value in self.parts:
+            if kind == "text":
+                rendered.append(value)
+            elif kind == "amounts":
+                label, amounts = value
+                rendered.append(f"{label}: {compact_json(fit_amounts(amounts, share, self.model))}")
+            else:
+                label, items = value
+                rendered.append(self._fit_items(label, items, share))
+        prompt = "\n".join(rendered)
+        tokens = count_tokens(prompt, self.model)
+        if tokens > self.budget:
+            logger.warning(f"Prompt is {tokens} tokens, over its budget of {self.budget}")
+        return prompt
+
+# Tokens reported by the API, per model
+token_usage: Dict[str, Dict[str, int]] = {}
+
+def record_usage(model: str, usage: Optional[Any]):
+    """
+    Tally prompt and completion tokens from a response's `usage` and log them.
+    """
+    if usage is None:
+        return
+    prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+    completion_tokens = getattr(usage, "completion_tokens", 0) or 0
+    totals = token_usage.setdefault(model, {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0})
+    totals["calls"] += 1
+    totals["prompt_tokens"] += prompt_tokens
+    totals["completion_tokens"] += completion_tokens
+    logger.info(f"{model}: {prompt_tokens} prompt + {completion_tokens} completion tokens")
+
+def get_token_usage() -> Dict[str, Dict[str, int]]:
+    return {model: dict(totals) for model, totals in token_usage.items()}
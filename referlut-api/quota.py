@@ -0,0 +1,38 @@
+from datetime import datetime, timedelta
+from typing import List
+
+# Nordigen allows 4 calls per account and scope in any rolling 24 hours
+DAILY_FETCH_LIMIT = 4
+QUOTA_WINDOW = timedelta(hours=24)
+# Calls per scope held back so a user-triggered refresh always has quota left
+USER_RESERVED_FETCHES = 1
+PLANNED_SCOPES = ("balances", "transactions")
+# Raw fetch_logs rows are kept this long, then compacted into the daily audit summary
+FETCH_LOG_RETENTION = timedelta(days=7)
+
+def scheduled_budget() -> int:
+    return DAILY_FETCH_LIMIT - USER_RESERVED_FETCHES
+
+def refresh_interval() -> timedelta:
+    """
+    Spacing between scheduled refreshes, spreading the scheduled budget evenly over the day.
+    """
+    return QUOTA_WINDOW / scheduled_budget()
+
+def next_refresh_at(fetch_times: List[datetime], now: datetime, user_triggered: bool = False) -> datetime:
+    """
+    Earliest time the next fetch for one (account, scope) may run.
+
+    Scheduled refreshes may only use the scheduled budget and are spaced
+    refresh_interval() apart, so the data never goes stale for longer than that.
+    User-triggered refreshes may also use the reserved headroom and are not spaced.
+    """
+    window = sorted(t for t in fetch_times if t > now - QUOTA_WINDOW)
+    budget = DAILY_FETCH_LIMIT if user_triggered else scheduled_budget()
+    earliest = now
+    if len(window) >= budget:
+        # wait until enough calls age out of the window to bring us under budget
+        earliest = max(earliest, window[len(window) - budget] + QUOTA_WINDOW)
+    if window and not user_triggered:
+        earliest = max(earliest, window[-1] + refresh_interval())
+    return earliest
@@ -0,0 +1,98 @@
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+from money import from_minor, to_minor
+
+# Columns of a stored transaction that internal processing reads, in TransactionRecord field order
+TRANSACTION_COLUMNS = (
+    "transaction_id", "account_id", "amount", "amount_minor", "currency", "merchant_name", "merchant_canonical",
+    "booking_date", "value_date", "proprietary_bank_transaction_code", "internal_transaction_id",
+    "category", "spending_category", "status"
+)
+
+class TransactionRecord:
+    """
+    A transaction we already trust: read back from our own storage or built by our own code.
+
+    Plain slots and no validation, so building one per row costs a fraction of a pydantic
+    ai.Transaction; validate with ai.Transaction only where data comes from outside. The
+    camelCase properties mirror ai.Transaction's fields, so a record can be passed to the
+    classifiers in ai.py as is.
+    """
+    __slots__ = TRANSACTION_COLUMNS
+
+    def __init__(self, transaction_id: str, account_id: Optional[str] = None, amount: Any = None,
+                 amount_minor: Optional[int] = None, currency: Optional[str] = None,
+                 merchant_name: Optional[str] = None, merchant_canonical: Optional[str] = None,
+                 booking_date: Optional[str] = None, value_date: Optional[str] = None,
+                 proprietary_bank_transaction_code: Optional[str] = None,
+                 internal_transaction_id: Optional[str] = None, category: Optional[str] = None,
+                 spending_category: Optional[str] = None, status: Optional[str] = None):
+        self.transaction_id = transaction_id
+        self.account_id = account_id
+        self.amount = amount
+        self.amount_minor = amount_minor
+        self.currency = currency
+        self.merchant_name = merchant_name
+        self.merchant_canonical = merchant_canonical
+        self.booking_date = booking_date
+        self.value_date = value_date
+        self.proprietary_bank_transaction_code = proprietary_bank_transaction_code
+        self.internal_transaction_id = internal_transaction_id
+        self.category = category
+        self.spending_category = spending_category
+        self.status = status
+
+    @classmethod
+    def from_tuples(cls, rows: Iterable[Sequence[Any]]) -> List["TransactionRecord"]:
+        """
+        Records from row tuples in TRANSACTION_COLUMNS order, without per-field checks.
+        """
+        return [cls(*row) for row in rows]
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[Dict[str, Any]]) -> List["TransactionRecord"]:
+        """
+        Records from stored-row dicts (schema.sql column names); missing columns are None.
+        """
+        return [cls(*[row.get(column) for column in TRANSACTION_COLUMNS]) for row in rows]
+
+    @property
+    def minor(self) -> int:
+        """Amount in minor units of currency; parsed from amount only for rows imported before amount_minor."""
+        if self.amount_minor is not None:
+            return self.amount_minor
+        return to_minor(self.amount or 0, self.currency)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {column: getattr(self, column) for column in TRANSACTION_COLUMNS}
+
+    # ai.Transaction field names, for the classifiers
+
+    @property
+    def transactionId(self) -> str:
+        return self.transaction_id
+
+    @property
+    def bookingDate(self) -> str:
+        return self.booking_date or ""
+
+    @property
+    def valueDate(self) -> str:
+        return self.value_date or ""
+
+    @property
+    def transactionAmount(self) -> Dict[str, str]:
+        amount = self.amount if self.amount is not None else from_minor(self.minor, self.currency)
+        return {"amount": str(amount), "currency": self.currency or ""}
+
+    @property
+    def remittanceInformationUnstructured(self) -> str:
+        return self.merchant_name or ""
+
+    @property
+    def proprietaryBankTransactionCode(self) -> str:
+        return self.proprietary_bank_transaction_code or ""
+
+    @property
+    def internalTransactionId(self) -> str:
+        return self.internal_transaction_id or ""
@@ -0,0 +1,166 @@
+from datetime import date, timedelta
+from statistics import median
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from merchants import normalize_merchant
+from money import DISPLAY_CURRENCY, display_totals, to_major
+from records import TransactionRecord
+
+# Cadences we recognise: (name, period in days, calendar months per period or 0, tolerance in days, minimum payments)
+CADENCES = (
+    ("weekly", 7, 0, 1, 4),
+    ("fortnightly", 14, 0, 2, 3),
+    ("monthly", 30.44, 1, 4, 3),
+    ("quarterly", 91.31, 3, 7, 2),
+    ("annual", 365.25, 12, 10, 2),
+)
+MONTH_DAYS = 30.44
+AMOUNT_TOLERANCE = 0.1  # payments within 10% of the smallest in a band count as the same charge
+MIN_AMOUNT_BAND = 50  # minor units; small charges may vary by this much regardless of the ratio
+MATCHING_INTERVALS = 0.75  # share of gaps between payments that must fit the cadence
+
+# (date, minor units spent, transaction id, spending category)
+Payment = Tuple[date, int, str, Optional[str]]
+
+def add_months(day: date, months: int) -> date:
+    month = day.month - 1 + months
+    year = day.year + month // 12
+    month = month % 12 + 1
+    # clamp the 31st into shorter months
+    for last_day in (31, 30, 29, 28):
+        try:
+            return day.replace(year=year, month=month, day=min(day.day, last_day))
+        except ValueError:
+            continue
+    raise ValueError(f"Cannot add {months} months to {day}")
+
+def amount_bands(payments: List[Payment]) -> List[List[Payment]]:
+    """
+    Split one merchant's payments into bands of similar amounts: sort by amount and start a
+    new band where an amount is more than AMOUNT_TOLERANCE above the band's smallest.
+    """
+    bands: List[List[Payment]] = []
+    for payment in sorted(payments, key=lambda p: p[1]):
+        if bands:
+            floor = bands[-1][0][1]
+            if payment[1] - floor <= max(floor * AMOUNT_TOLERANCE, MIN_AMOUNT_BAND):
+                bands[-1].append(payment)
+                continue
+        bands.append([payment])
+    return bands
+
+def match_cadence(days: List[date]) -> Optional[tuple]:
+    """
+    The cadence the gaps between sorted payment dates follow, or None if they aren't periodic.
+    """
+    gaps = [(later - earlier).days for earlier, later in zip(days, days[1:])]
+    if not gaps:
+        return None
+    typical = median(gaps)
+    for cadence in CADENCES:
+        _, period, _, tolerance, min_payments = cadence
+        if len(days) < min_payments or abs(typical - period) > tolerance:
+            continue
+        fitting = sum(1 for gap in gaps if abs(gap - period) <= tolerance)
+        if fitting >= MATCHING_INTERVALS * len(gaps):
+            return cadence
+    return None
+
+def describe_band(merchant: str, currency: Optional[str], band: List[Payment], today: date) -> Optional[Dict[str, Any]]:
+    band = sorted(band)
+    # one charge per day: duplicates and same-day refunds shouldn't break the cadence
+    days = sorted({payment[0] for payment in band})
+    cadence = match_cadence(days)
+    if cadence is None:
+        return None
+    name, period, months, tolerance, _ = cadence
+    # the latest charge, so a price rise within the band shows the current price
+    amount_minor = band[-1][1]
+    last_seen = days[-1]
+    next_expected = add_months(last_seen, months) if months else last_seen + timedelta(days=period)
+    monthly_cost_minor = round(amount_minor * MONTH_DAYS / period)
+    categories = [payment[3] for payment in band if payment[3]]
+    return {
+        "merchant": merchant,
+        "currency": currency,
+        "cadence": name,
+        "amount": to_major(amount_minor, currency),
+        "amount_minor": amount_minor,
+        "monthly_cost": to_major(monthly_cost_minor, currency),
+        "monthly_cost_minor": monthly_cost_minor,
+        "occurrences": len(days),
+        "first_seen": days[0].isoformat(),
+        "last_seen": last_seen.isoformat(),
+        "next_expected": next_expected.isoformat(),
+        "active": today <= next_expected + timedelta(days=tolerance),
+        "category": max(set(categories), key=categories.count) if categories else None
+    }
+
+class RecurringDetector:
+    """
+    Recurring payments and subscriptions found in a stream of transactions.
+
+    Outgoing payments are grouped by canonical merchant and currency, split into amount
+    bands and tested for a weekly, fortnightly, monthly, quarterly or annual cadence.
+    add() can be called again as new transactions arrive: already seen transactions are
+    skipped and only the merchants that received new payments are re-evaluated.
+    """
+    def __init__(self):
+        self.payments: Dict[Tuple[str, Optional[str]], List[Payment]] = {}
+        self.seen: Set[str] = set()
+        self.dirty: Set[Tuple[str, Optional[str]]] = set()
+        self.found: Dict[Tuple[str, Optional[str]], List[Dict[str, Any]]] = {}
+        self.evaluated_on: Optional[date] = None
+
+    def add(self, records: Iterable[TransactionRecord]) -> int:
+        """
+        Feed transactions; returns how many were new outgoing booked payments.
+        """
+        added = 0
+        for record in records:
+            if record.transaction_id in self.seen or not record.booking_date or record.status == "pending":
+                continue
+            minor = record.minor
+            if minor >= 0:
+                continue
+            self.seen.add(record.transaction_id)
+            merchant = record.merchant_canonical or normalize_merchant(record.merchant_name)
+            key = (merchant, record.currency)
+            self.payments.setdefault(key, []).append(
+                (date.fromisoformat(record.booking_date[:10]), -minor, record.transaction_id, record.spending_category)
+            )
+            self.dirty.add(key)
+            added += 1
+        return added
+
+    def subscriptions(self, today: Optional[date] = None) -> List[Dict[str, Any]]:
+        """
+        Detected recurring payments, largest monthly cost first.
+        """
+        today = today or date.today()
+        # "active" depends on the day, so a new day re-evaluates everything
+        stale = self.payments.keys() if today != self.evaluated_on else self.dirty
+        for key in list(stale):
+            merchant, currency = key
+            found = [describe_band(merchant, currency, band, today) for band in amount_bands(self.payments[key])]
+            self.found[key] = [subscription for subscription in found if subscription is not None]
+        self.dirty.clear()
+        self.evaluated_on = today
+        subscriptions = [subscription for found in self.found.values() for subscription in found]
+        return sorted(subscriptions, key=lambda s: s["monthly_cost_minor"], reverse=True)
+
+def monthly_subscription_cost(subscriptions: List[Dict[str, Any]], currency: str = DISPLAY_CURRENCY) -> float:
+    """
+    What the active subscriptions cost a month together, in `currency` (see money.display_totals).
+    """
+    totals: Dict[Tuple[str, str], int] = {}
+    for subscription in subscriptions:
+        if subscription.get("active"):
+            key = ("monthly", subscription.get("currency") or currency)
+            totals[key] = totals.get(key, 0) + subscription["monthly_cost_minor"]
+    return display_totals(totals, currency).get("monthly", 0.0)
+
+def detect_subscriptions(records: Iterable[TransactionRecord], today: Optional[date] = None) -> List[Dict[str, Any]]:
+    detector = RecurringDetector()
+    detector.add(records)
+    return detector.subscriptions(today)
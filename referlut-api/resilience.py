@@ -0,0 +1,132 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Awaitable, Callable, Deque, Optional, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling upstream while the circuit breaker is open"""
+
+class LatencyTracker:
+    """
+    Rolling window of successful call latencies, used to pick the hedging threshold.
+    """
+    def __init__(self, window: int = 200, min_samples: int = 20):
+        self.samples: Deque[float] = deque(maxlen=window)
+        self.min_samples = min_samples
+
+    def record(self, seconds: float):
+        self.samples.append(seconds)
+
+    def p95(self) -> Optional[float]:
+        if len(self.samples) < self.min_samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[int(len(ordered) * 0.95) - 1]
+
+class CircuitBreaker:
+    """
+    Opens when the error rate over the recent calls spikes, and lets a single trial
+    call through once the cooldown has passed (half-open).
+    """
+    def __init__(self, name: str, window: int = 20, min_calls: int = 10,
+                 error_rate: float = 0.5, cooldown_seconds: float = 30):
+        self.name = name
+        self.outcomes: Deque[bool] = deque(maxlen=window)
+        self.min_calls = min_calls
+        self.error_rate = error_rate
+        self.cooldown_seconds = cooldown_seconds
+        self.opened_at: Optional[float] = None
+        self.trial_in_flight = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at < self.cooldown_seconds:
+            return "open"
+        return "half_open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self.trial_in_flight:
+            self.trial_in_flight = True
+            return True
+        return False
+
+    def record(self, success: bool):
+        if self.opened_at is not None and self.trial_in_flight:
+            # result of the half-open trial decides whether we close again
+            self.trial_in_flight = False
+            if success:
+                self.opened_at = None
+                self.outcomes.clear()
+            else:
+                self.opened_at = time.monotonic()
+            return
+        self.outcomes.append(success)
+        failures = self.outcomes.count(False)
+        if len(self.outcomes) >= self.min_calls and failures / len(self.outcomes) >= self.error_rate:
+            logger.warning(f"Circuit {self.name} opened after {failures}/{len(self.outcomes)} failed calls")
+            self.opened_at = time.monotonic()
+
+async def call_with_resilience(
+    call: Callable[[], Awaitable[T]],
+    *,
+    deadline: float,
+    breaker: CircuitBreaker,
+    latency: LatencyTracker,
+    hedge: bool = False
+) -> T:
+    """
+    Run `call` under a deadline, behind a circuit breaker.
+
+    With `hedge`, a duplicate request is started if the first one is still running after
+    the observed p95 latency, and whichever succeeds first wins. Raises CircuitOpenError
+    without calling upstream while the breaker is open, and asyncio.TimeoutError when
+    the deadline passes.
+    """
+    if not breaker.allow():
+        raise CircuitOpenError(f"Circuit {breaker.name} is open")
+
+    started = time.monotonic()
+    tasks = [asyncio.ensure_future(call())]
+    try:
+        hedge_after = latency.p95() if hedge else None
+        if hedge_after is not None and hedge_after < deadline:
+            done, _ = await asyncio.wait(tasks, timeout=hedge_after)
+            if not done:
+                tasks.append(asyncio.ensure_future(call()))
+
+        error: Optional[BaseException] = None
+        pending = set(tasks)
+        while pending:
+            remaining = deadline - (time.monotonic() - started)
+            if remaining <= 0:
+                break
+            done, pending = await asyncio.wait(pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    latency.record(time.monotonic() - started)
+                    breaker.record(True)
+                    return task.result()
+                error = task.exception()
+
+        breaker.record(False)
+        if pending or error is None:
+            raise asyncio.TimeoutError(f"{breaker.name} call exceeded its {deadline}s deadline")
+        raise error
+    except asyncio.CancelledError:
+        # caller gave up; don't leave a half-open trial slot taken
+        breaker.trial_in_flight = False
+        raise
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
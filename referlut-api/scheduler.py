@@ -0,0 +1,89 @@
+import random
+from collections import OrderedDict, deque
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+
+# Queue priorities, lower runs first
+PRIORITY_NEW = 0      # freshly linked account, nothing imported yet
+PRIORITY_REFRESH = 1  # periodic refresh of an account we already have
+
+BASE_BACKOFF_SECONDS = 60
+MAX_BACKOFF_SECONDS = 6 * 60 * 60
+MAX_ATTEMPTS = 8  # failures before an entry is moved to the dead-letter state
+
+def parse_timestamp(value: Optional[str]) -> Optional[datetime]:
+    if not value:
+        return None
+    ts = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    return ts if ts.tzinfo else ts.replace(tzinfo=timezone.utc)
+
+def backoff_delay(attempts: int) -> timedelta:
+    """
+    Exponential backoff with jitter for the given number of failed attempts.
+    """
+    ceiling = min(MAX_BACKOFF_SECONDS, BASE_BACKOFF_SECONDS * 2 ** max(attempts - 1, 0))
+    return timedelta(seconds=random.uniform(ceiling / 2, ceiling))
+
+def due_since(entry: Dict) -> Optional[datetime]:
+    """
+    When an entry became runnable: its backoff/refresh time, or when it was enqueued.
+    """
+    return parse_timestamp(entry.get("next_attempt_at") or entry.get("created_at"))
+
+def is_due(entry: Dict, now: datetime) -> bool:
+    next_attempt = parse_timestamp(entry.get("next_attempt_at"))
+    return entry.get("status") == "pending" and (next_attempt is None or next_attempt <= now)
+
+def order_batch(entries: List[Dict], now: datetime, limit: int) -> List[Dict]:
+    """
+    Pick up to `limit` due queue entries, round-robin across users.
+
+    Within a user, freshly linked accounts come first, then the longest waiting. Users
+    take turns in the order of their most urgent entry, so one user with many accounts
+    cannot starve everyone else.
+    """
+    due = [e for e in entries if is_due(e, now)]
+    due.sort(key=lambda e: (e.get("priority", PRIORITY_REFRESH), due_since(e) or now))
+    per_user: "OrderedDict[str, deque]" = OrderedDict()
+    for entry in due:
+        per_user.setdefault(entry.get("user_id"), deque()).append(entry)
+
+    batch = []
+    while per_user and len(batch) < limit:
+        for user_id in list(per_user):
+            batch.append(per_user[user_id].popleft())
+            if not per_user[user_id]:
+                del per_user[user_id]
+            if len(batch) >= limit:
+                break
+    return batch
+
+def failure_update(entry: Dict, error: str, now: datetime) -> Dict:
+    """
+    Queue row changes after a failed attempt: back off, or dead-letter once exhausted.
+    """
+    attempts = (entry.get("attempts") or 0) + 1
+    if attempts >= MAX_ATTEMPTS:
+        return {"status": "dead", "attempts": attempts, "last_error": error, "next_attempt_at": None}
+    return {
+        "status": "pending",
+        "attempts": attempts,
+        "last_error": error,
+        "next_attempt_at": (now + backoff_delay(attempts)).isoformat()
+    }
+
+def queue_metrics(due_entries: List[Dict], depth: Dict[str, int], now: datetime) -> Dict:
+    """
+    Queue depth and age metrics for the worker log.
+
+    `depth` is the row count per status; `due_entries` are the rows ready to run now.
+    """
+    became_due = [due_since(e) for e in due_entries]
+    oldest = min((d for d in became_due if d), default=None)
+    return {
+        "depth": depth,
+        "due": len(due_entries),
+        "scheduled": depth.get("pending", 0) - len(due_entries),
+        "users_waiting": len({e.get("user_id") for e in due_entries}),
+        "oldest_due_age_seconds": (now - oldest).total_seconds() if oldest else 0
+    }
@@ -38,6 +38,28 @@ CREATE TABLE IF NOT EXISTS public.fetch_logs (
   user_id TEXT REFERENCES public.users(auth0_id) ON DELETE CASCADE
 );
 
+-- Create fetch_counters table: the most recent fetch times per account and scope, enough to
+-- answer every quota question in O(1) however large fetch_logs grows
+CREATE TABLE IF NOT EXISTS public.fetch_counters (
+  account_id TEXT NOT NULL,
+  scope TEXT NOT NULL,
+  recent_fetches TIMESTAMP WITH TIME ZONE[] NOT NULL DEFAULT '{}',  -- newest last, at most the daily limit
+  total_fetches BIGINT NOT NULL DEFAULT 0,
+  updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+  PRIMARY KEY (account_id, scope)
+);
+
+-- Create fetch_log_daily table: audit summary of raw fetch_logs rows compacted after the retention period
+CREATE TABLE IF NOT EXISTS public.fetch_log_daily (
+  account_id TEXT NOT NULL,
+  scope TEXT NOT NULL,
+  day DATE NOT NULL,
+  fetches INTEGER NOT NULL,
+  first_fetched_at TIMESTAMP WITH TIME ZONE,
+  last_fetched_at TIMESTAMP WITH TIME ZONE,
+  PRIMARY KEY (account_id, scope, day)
+);
+
 -- Create requisitions table to track bank account connection requests
 CREATE TABLE IF NOT EXISTS public.requisitions (
   requisition_id TEXT PRIMARY KEY,
@@ -59,6 +81,8 @@ CREATE TABLE IF NOT EXISTS public.accounts (
   owner_name TEXT,
   status TEXT,
   currency TEXT,
+  balances JSONB,  -- latest GET /accounts/{id}/balances/ result, refreshed by the worker
+  balances_updated_at TIMESTAMP WITH TIME ZONE,
   created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
   updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
 );
@@ -67,34 +91,120 @@ CREATE TABLE IF NOT EXISTS public.accounts (
 CREATE TABLE IF NOT EXISTS public.account_queue (
   account_id TEXT PRIMARY KEY REFERENCES public.accounts(account_id) ON DELETE CASCADE,
   user_id TEXT NOT NULL REFERENCES public.users(auth0_id) ON DELETE CASCADE,
-  status TEXT NOT NULL, -- pending, processing, completed, error
+  status TEXT NOT NULL, -- pending (due at next_attempt_at), dead
+  priority INTEGER NOT NULL DEFAULT 1,  -- 0: freshly linked, 1: refresh
+  attempts INTEGER NOT NULL DEFAULT 0,  -- consecutive failed attempts
+  next_attempt_at TIMESTAMP WITH TIME ZONE,  -- backoff: not picked up before this time
+  last_error TEXT,
+  processed_at TIMESTAMP WITH TIME ZONE,  -- last successful import
   created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
   updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
 );
 
--- Create transactions table to store bank transactions
+-- Create transactions table to store bank transactions, range-partitioned by month of booking_date
+-- so one user's recent history is read from a few small partitions (see migrations/ for existing databases)
 CREATE TABLE IF NOT EXISTS public.transactions (
-  transaction_id TEXT PRIMARY KEY,
+  transaction_id TEXT NOT NULL,
   account_id TEXT NOT NULL REFERENCES public.accounts(account_id) ON DELETE CASCADE,
   entry_reference TEXT,
   internal_transaction_id TEXT,
   additional_information TEXT,
   merchant_name TEXT,
+  merchant_canonical TEXT,  -- normalized merchant name, e.g. "Tesco"
   amount NUMERIC NOT NULL,
+  amount_minor BIGINT,  -- amount in minor units of currency (pence, cents), parsed once at import
   currency TEXT,
   booking_date DATE,
   value_date DATE,
   proprietary_bank_transaction_code TEXT,
   category TEXT,  -- debit, credit, cash, transfer, other
-  created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+  spending_category TEXT,  -- groceries, dining_out, ...; set by the worker's precompute stage
+  status TEXT NOT NULL DEFAULT 'booked',  -- booked, pending
+  content_hash TEXT,  -- hash of the imported fields, used to skip unchanged rows
+  created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+  -- unique keys on a partitioned table must contain the partition key; pending rows may have no booking_date
+  CONSTRAINT transactions_id_booking_date_key UNIQUE NULLS NOT DISTINCT (transaction_id, booking_date)
+) PARTITION BY RANGE (booking_date);
+
+-- Rows outside every monthly partition, including undated pending rows
+CREATE TABLE IF NOT EXISTS public.transactions_default PARTITION OF public.transactions DEFAULT;
+
+-- Create the monthly partitions covering [p_from, p_to); run ahead of time for upcoming months
+CREATE OR REPLACE FUNCTION public.ensure_transaction_partitions(p_from DATE, p_to DATE)
+RETURNS INTEGER
+LANGUAGE plpgsql AS $$
+DECLARE
+  month_start DATE := date_trunc('month', p_from)::DATE;
+  month_end DATE;
+  partition_name TEXT;
+  created INTEGER := 0;
+BEGIN
+  WHILE month_start < p_to LOOP
+    partition_name := 'transactions_' || to_char(month_start, 'YYYY_MM');
+    month_end := (month_start + INTERVAL '1 month')::DATE;
+    IF to_regclass('public.' || partition_name) IS NULL THEN
+      -- rows for this month may already sit in the default partition, which would block a plain
+      -- CREATE ... PARTITION OF; move them into a standalone table and attach it instead
+      EXECUTE format('CREATE TABLE public.%I (LIKE public.transactions INCLUDING DEFAULTS)', partition_name);
+      EXECUTE format(
+        'WITH moved AS (DELETE FROM public.transactions_default WHERE booking_date >= %L AND booking_date < %L RETURNING *) '
+        'INSERT INTO public.%I SELECT * FROM moved',
+        month_start, month_end, partition_name
+      );
+      EXECUTE format(
+        'ALTER TABLE public.transactions ATTACH PARTITION public.%I FOR VALUES FROM (%L) TO (%L)',
+        partition_name, month_start, month_end
+      );
+      created := created + 1;
+    END IF;
+    month_start := (month_start + INTERVAL '1 month')::DATE;
+  END LOOP;
+  RETURN created;
+END;
+$$;
+
+-- Bank history goes back at most 24 months; keep a year of partitions ready ahead
+SELECT public.ensure_transaction_partitions((CURRENT_DATE - INTERVAL '24 months')::DATE, (CURRENT_DATE + INTERVAL '12 months')::DATE);
+
+-- Create account_sync_state table to track the incremental transaction sync watermark
+CREATE TABLE IF NOT EXISTS public.account_sync_state (
+  account_id TEXT PRIMARY KEY REFERENCES public.accounts(account_id) ON DELETE CASCADE,
+  last_booked_date DATE,  -- latest settled booking date imported
+  synced_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+-- Create merchant_stats table holding the streaming top-merchant sketches ('global' or a user id)
+CREATE TABLE IF NOT EXISTS public.merchant_stats (
+  scope TEXT PRIMARY KEY,
+  sketch JSONB NOT NULL,  -- Space-Saving counters, see heavy_hitters.py
+  updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+-- Create user_insights table: derived statistics, tips and deals precomputed by the worker after each import
+CREATE TABLE IF NOT EXISTS public.user_insights (
+  user_id TEXT PRIMARY KEY REFERENCES public.users(auth0_id) ON DELETE CASCADE,
+  summary JSONB,  -- statistics summary
+  weekly JSONB,  -- spending chart: [{week, total, categories}]
+  spending_by_category JSONB,
+  weekly_averages JSONB,
+  tips JSONB,
+  deals JSONB,
+  top_categories JSONB,
+  subscriptions JSONB,  -- recurring payments: [{merchant, cadence, amount_minor, next_expected, ...}]
+  transaction_count INTEGER,
+  computed_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
 );
 
 -- Add indexes for performance
 CREATE INDEX IF NOT EXISTS idx_users_auth0_id ON public.users(auth0_id);
 CREATE INDEX IF NOT EXISTS idx_accounts_user_id ON public.accounts(user_id);
-CREATE INDEX IF NOT EXISTS idx_transactions_account_id ON public.transactions(account_id);
-CREATE INDEX IF NOT EXISTS idx_transactions_booking_date ON public.transactions(booking_date);
+-- Covering index for per-account date-range reads and aggregates, so they stay index-only scans
+CREATE INDEX IF NOT EXISTS idx_transactions_account_booking ON public.transactions(account_id, booking_date)
+  INCLUDE (amount_minor, currency, category, merchant_canonical, merchant_name, status);
+CREATE INDEX IF NOT EXISTS idx_transactions_pending ON public.transactions(account_id) WHERE status = 'pending';
+CREATE INDEX IF NOT EXISTS idx_account_queue_due ON public.account_queue(status, priority, next_attempt_at);
 CREATE INDEX IF NOT EXISTS idx_fetch_logs_account_scope ON public.fetch_logs(account_id, scope);
+CREATE INDEX IF NOT EXISTS idx_fetch_logs_fetched_at ON public.fetch_logs(fetched_at);
 
 -- Create function to update updated_at timestamp
 CREATE OR REPLACE FUNCTION update_updated_at_column()
@@ -124,4 +234,100 @@ EXECUTE FUNCTION update_updated_at_column();
 CREATE TRIGGER set_account_queue_updated_at
 BEFORE UPDATE ON public.account_queue
 FOR EACH ROW
-EXECUTE FUNCTION update_updated_at_column();
\ No newline at end of file
+EXECUTE FUNCTION update_updated_at_column();
+-- Statistics aggregates computed next to the data: one row per month, per category and per
+-- merchant over the given accounts since p_since, plus a grand total (dimension 'total'), each
+-- per currency. Sums are exact, in minor units: spending is the absolute sum of outflows,
+-- income the sum of inflows, total the net amount.
+CREATE OR REPLACE FUNCTION public.transaction_aggregates(p_account_ids TEXT[], p_since DATE)
+RETURNS TABLE (dimension TEXT, key TEXT, currency TEXT, total BIGINT, spending BIGINT, income BIGINT, tx_count BIGINT)
+LANGUAGE sql STABLE AS $$
+  SELECT
+    CASE
+      WHEN GROUPING(t.month) = 0 THEN 'month'
+      WHEN GROUPING(t.category) = 0 THEN 'category'
+      WHEN GROUPING(t.merchant) = 0 THEN 'merchant'
+      ELSE 'total'
+    END AS dimension,
+    COALESCE(t.month, t.category, t.merchant) AS key,
+    t.currency,
+    SUM(t.amount_minor)::BIGINT AS total,
+    SUM(-t.amount_minor) FILTER (WHERE t.amount_minor < 0)::BIGINT AS spending,
+    SUM(t.amount_minor) FILTER (WHERE t.amount_minor >= 0)::BIGINT AS income,
+    COUNT(*) AS tx_count
+  FROM (
+    SELECT
+      to_char(booking_date, 'YYYY-MM') AS month,
+      COALESCE(category, 'Uncategorized') AS category,
+      COALESCE(merchant_canonical, merchant_name, 'Unknown') AS merchant,
+      currency,
+      amount_minor
+    FROM public.transactions
+    WHERE account_id = ANY(p_account_ids) AND booking_date >= p_since
+  ) t
+  GROUP BY GROUPING SETS ((t.month, t.currency), (t.category, t.currency), (t.merchant, t.currency), (t.currency));
+$$;
+
+-- Record one provider call: append to the audit log and update the rolling counter atomically,
+-- keeping only the newest p_keep fetch times
+CREATE OR REPLACE FUNCTION public.record_fetch(p_account_id TEXT, p_scope TEXT, p_fetched_at TIMESTAMPTZ, p_keep INTEGER)
+RETURNS TIMESTAMPTZ[]
+LANGUAGE plpgsql AS $$
+DECLARE
+  recent TIMESTAMPTZ[];
+BEGIN
+  INSERT INTO public.fetch_logs (account_id, scope, fetched_at) VALUES (p_account_id, p_scope, p_fetched_at);
+  INSERT INTO public.fetch_counters AS c (account_id, scope, recent_fetches, total_fetches, updated_at)
+  VALUES (p_account_id, p_scope, ARRAY[p_fetched_at], 1, NOW())
+  ON CONFLICT (account_id, scope) DO UPDATE SET
+    recent_fetches = (
+      SELECT array_agg(t ORDER BY t) FROM (
+        SELECT t FROM unnest(c.recent_fetches || p_fetched_at) AS t ORDER BY t DESC LIMIT p_keep
+      ) newest
+    ),
+    total_fetches = c.total_fetches + 1,
+    updated_at = NOW()
+  RETURNING recent_fetches INTO recent;
+  RETURN recent;
+END;
+$$;
+
+-- Roll raw fetch_logs rows older than p_before into fetch_log_daily and delete them. Returns rows compacted.
+CREATE OR REPLACE FUNCTION public.compact_fetch_logs(p_before TIMESTAMPTZ)
+RETURNS INTEGER
+LANGUAGE plpgsql AS $$
+DECLARE
+  compacted INTEGER;
+BEGIN
+  WITH moved AS (
+    DELETE FROM public.fetch_logs WHERE fetched_at < p_before
+    RETURNING account_id, scope, fetched_at
+  ), daily AS (
+    INSERT INTO public.fetch_log_daily AS d (account_id, scope, day, fetches, first_fetched_at, last_fetched_at)
+    SELECT account_id, scope, (fetched_at AT TIME ZONE 'UTC')::DATE, COUNT(*), MIN(fetched_at), MAX(fetched_at)
+    FROM moved
+    GROUP BY account_id, scope, (fetched_at AT TIME ZONE 'UTC')::DATE
+    ON CONFLICT (account_id, scope, day) DO UPDATE SET
+      fetches = d.fetches + EXCLUDED.fetches,
+      first_fetched_at = LEAST(d.first_fetched_at, EXCLUDED.first_fetched_at),
+      last_fetched_at = GREATEST(d.last_fetched_at, EXCLUDED.last_fetched_at)
+  )
+  SELECT COUNT(*) INTO compacted FROM moved;
+  RETURN compacted;
+END;
+$$;
+
+-- Wake the worker (LISTEN account_queue) as soon as an entry becomes due, instead of waiting for its poll
+CREATE OR REPLACE FUNCTION public.notify_account_queue()
+RETURNS TRIGGER AS $$
+BEGIN
+  PERFORM pg_notify('account_queue', NEW.account_id);
+  RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER account_queue_notify
+AFTER INSERT OR UPDATE OF status, next_attempt_at ON public.account_queue
+FOR EACH ROW
+WHEN (NEW.status = 'pending' AND (NEW.next_attempt_at IS NULL OR NEW.next_attempt_at <= NOW()))
+EXECUTE FUNCTION public.notify_account_queue();
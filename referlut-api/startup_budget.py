@@ -0,0 +1,48 @@
+import os
+import subprocess
+import sys
+
+# Cold-start budget for `import main`; raise deliberately, never to paper over a regression
+IMPORT_BUDGET_SECONDS = float(os.getenv("IMPORT_BUDGET_SECONDS", "1.5"))
+# Modules that must stay out of the import path and load lazily on first use
+LAZY_MODULES = ("openai", "nordigen", "supabase", "banking", "jwt", "requests")
+
+PROBE = """
+import sys, time
+started = time.perf_counter()
+import main
+elapsed = time.perf_counter() - started
+print(elapsed)
+print(",".join(m for m in {lazy!r} if m in sys.modules))
+"""
+
+def parse_probe_output(stdout: str):
+    """
+    (seconds, eagerly imported lazy modules) from the probe's last two lines. The second is
+    empty when nothing was imported eagerly, so the output is split without stripping it.
+    """
+    elapsed, eager = stdout.splitlines()[-2:]
+    return float(elapsed), [m for m in eager.split(",") if m]
+
+def measure_import():
+    """
+    Import main in a fresh interpreter and return (seconds, eagerly imported lazy modules).
+    """
+    here = os.path.dirname(os.path.abspath(__file__))
+    result = subprocess.run(
+        [sys.executable, "-c", PROBE.format(lazy=LAZY_MODULES)],
+        cwd=here, capture_output=True, text=True, check=True
+    )
+    return parse_probe_output(result.stdout)
+
+if __name__ == "__main__":
+    elapsed, eager = measure_import()
+    print(f"import main: {elapsed:.3f}s (budget {IMPORT_BUDGET_SECONDS:.3f}s)")
+    failed = False
+    if elapsed > IMPORT_BUDGET_SECONDS:
+        print("FAIL: import time is over budget; run `python -X importtime -c 'import main'` to find the cost")
+        failed = True
+    if eager:
+        print(f"FAIL: modules that should load lazily were imported eagerly: {', '.join(eager)}")
+        failed = True
+    sys.exit(1 if failed else 0)
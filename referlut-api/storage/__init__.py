@@ -0,0 +1,32 @@
+import os
+from typing import Optional
+
+from storage.base import Storage
+
+# "supabase" (default) or "sqlite" for an embedded single-node database
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "supabase")
+STORAGE_PATH = os.getenv("STORAGE_PATH", os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "referlut.sqlite"))
+
+_storage: Optional[Storage] = None
+
+def get_storage() -> Storage:
+    """
+    Process-wide storage for the configured backend, created on first use.
+    """
+    global _storage
+    if _storage is None:
+        if STORAGE_BACKEND == "sqlite":
+            from storage.sqlite_storage import SQLiteStorage
+            _storage = SQLiteStorage(STORAGE_PATH)
+        elif STORAGE_BACKEND == "supabase":
+            from storage.supabase_storage import SupabaseStorage
+            url = os.getenv("SUPABASE_URL", "")
+            key = os.getenv("SUPABASE_KEY", "")
+            if not url or not key:
+                raise ValueError("SUPABASE_URL and SUPABASE_KEY environment variables must be set")
+            _storage = SupabaseStorage(url, key)
+        else:
+            raise ValueError(f"Unknown STORAGE_BACKEND: {STORAGE_BACKEND}")
+    return _storage
+
+__all__ = ["Storage", "STORAGE_BACKEND", "STORAGE_PATH", "get_storage"]
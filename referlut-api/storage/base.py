@@ -0,0 +1,201 @@
+from abc import ABC, abstractmethod
+from datetime import date, datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from money import DISPLAY_CURRENCY, display_totals, get_fx_rates, minor_units_by_currency, unconverted_currencies
+from records import TransactionRecord
+
+def rollup_aggregates(rows: Iterable[Dict[str, Any]], currency: str = DISPLAY_CURRENCY) -> Dict[str, Any]:
+    """
+    Shape (dimension, key, currency, total, spending, income) rows from transaction_aggregates,
+    sums in minor units, into the totals the statistics summary returns in `currency`.
+    """
+    buckets = {"month": "monthly_spending", "category": "category_spending", "merchant": "merchant_totals"}
+    grouped: Dict[str, Dict[Tuple[str, str], int]] = {bucket: {} for bucket in buckets.values()}
+    totals: Dict[Tuple[str, str], int] = {}
+    for row in rows:
+        source = row.get("currency") or currency
+        if row["dimension"] == "total":
+            totals[("spending", source)] = int(row["spending"] or 0)
+            totals[("income", source)] = int(row["income"] or 0)
+        elif row["dimension"] in buckets:
+            grouped[buckets[row["dimension"]]][(row["key"], source)] = int(row["total"] or 0)
+    rates = get_fx_rates()
+    display_total = display_totals(totals, currency, rates)
+    summary = {bucket: display_totals(sums, currency, rates) for bucket, sums in grouped.items()}
+    summary.update({
+        "total_spending": display_total.get("spending", 0.0),
+        "total_income": display_total.get("income", 0.0),
+        "currency": currency,
+        "minor_units_by_currency": minor_units_by_currency(totals),
+        "unconverted_currencies": unconverted_currencies(totals, currency, rates)
+    })
+    return summary
+
+class Storage(ABC):
+    """
+    Repository for everything banking.py, worker.py and the statistics endpoints persist.
+
+    Rows are plain dicts using the column names from schema.sql. Implementations:
+    SupabaseStorage (remote, the default) and SQLiteStorage (embedded, single node,
+    offline tests and load benchmarks).
+    """
+
+    @abstractmethod
+    def verify(self):
+        """Raise if the backing store is unreachable or its tables are missing."""
+
+    # --- requisitions ---
+
+    @abstractmethod
+    def insert_requisition(self, rec: Dict[str, Any]):
+        ...
+
+    @abstractmethod
+    def latest_requisition(self, user_id: str) -> Optional[Dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    def update_requisition_status(self, requisition_id: str, status: str):
+        ...
+
+    @abstractmethod
+    def linked_requisitions(self, user_id: str) -> List[Dict[str, Any]]:
+        ...
+
+    # --- accounts ---
+
+    @abstractmethod
+    def get_account(self, account_id: str) -> Optional[Dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    def upsert_account(self, rec: Dict[str, Any]):
+        ...
+
+    @abstractmethod
+    def save_account_balances(self, account_id: str, balances: List[Dict[str, Any]], updated_at: datetime):
+        """Store the latest balances of an existing account."""
+
+    # --- fetch_logs and fetch_counters ---
+
+    @abstractmethod
+    def log_fetch(self, account_id: str, scope: str, fetched_at: datetime, keep: int):
+        """Append to the audit log and push fetched_at into the counter's newest `keep` fetch times."""
+
+    @abstractmethod
+    def fetch_times(self, account_id: str, scope: str, since: datetime) -> List[datetime]:
+        """Counted fetch times since `since`, oldest first, read from the counter rather than the log."""
+
+    def count_fetches(self, account_id: str, scope: str, since: datetime) -> int:
+        return len(self.fetch_times(account_id, scope, since))
+
+    @abstractmethod
+    def compact_fetch_logs(self, before: datetime) -> int:
+        """Fold raw log rows older than `before` into the daily audit summary. Returns rows compacted."""
+
+    # --- account_queue ---
+
+    @abstractmethod
+    def enqueue_account(self, rec: Dict[str, Any]):
+        """Insert or replace the queue entry for rec["account_id"]."""
+
+    @abstractmethod
+    def update_queue_entry(self, account_id: str, changes: Dict[str, Any]):
+        ...
+
+    @abstractmethod
+    def due_queue_entries(self, now: datetime, limit: int) -> List[Dict[str, Any]]:
+        """Pending entries whose next_attempt_at is unset or has passed, by priority then due time."""
+
+    @abstractmethod
+    def queue_depth(self, statuses: Iterable[str]) -> Dict[str, int]:
+        ...
+
+    # --- transactions ---
+
+    @abstractmethod
+    def transactions_for_sync(self, account_id: str, date_from: Optional[str]) -> List[Dict[str, Any]]:
+        """Stored rows an import can overlap: booked from date_from on (all if None) plus every pending row."""
+
+    @abstractmethod
+    def upsert_transactions(self, rows: List[Dict[str, Any]]):
+        ...
+
+    @abstractmethod
+    def delete_pending_transactions(self, transaction_ids: List[str]):
+        """Delete pending rows only; a booked row may share the id of the authorisation it settled."""
+
+    @abstractmethod
+    def account_transactions(self, account_id: str) -> List[Dict[str, Any]]:
+        ...
+
+    def ensure_transaction_partitions(self, date_from: date, date_to: date) -> int:
+        """
+        Create the monthly transactions partitions covering [date_from, date_to). Returns partitions
+        created; backends without partitioning have nothing to do.
+        """
+        return 0
+
+    @abstractmethod
+    def transaction_aggregates(self, account_ids: List[str], since: date) -> Dict[str, Any]:
+        """
+        Month, category and merchant totals plus the spending/income split for the accounts'
+        transactions booked on or after `since`, aggregated by the database (see rollup_aggregates).
+        """
+
+    @abstractmethod
+    def user_transactions(self, user_id: str, since: date) -> List[Dict[str, Any]]:
+        """Transactions booked on or after `since` across all of the user's accounts."""
+
+    def user_transaction_records(self, user_id: str, since: date) -> List[TransactionRecord]:
+        """user_transactions as TransactionRecords, for internal processing without validation."""
+        return TransactionRecord.from_rows(self.user_transactions(user_id, since))
+
+    @abstractmethod
+    def set_spending_categories(self, categories: Dict[str, str]):
+        """Store classified spending categories, transaction_id -> category."""
+
+    # --- user_insights ---
+
+    @abstractmethod
+    def get_user_insights(self, user_id: str) -> Optional[Dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    def save_user_insights(self, rec: Dict[str, Any]):
+        ...
+
+    @abstractmethod
+    def user_insights_version(self, user_id: str) -> Optional[str]:
+        """computed_at of the user's stored insights, a cheap check for whether they changed."""
+
+    # --- account_sync_state ---
+
+    @abstractmethod
+    def get_sync_state(self, account_id: str) -> Optional[Dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    def save_sync_state(self, rec: Dict[str, Any]):
+        ...
+
+    # --- merchant_stats ---
+
+    @abstractmethod
+    def get_merchant_stats(self, scope: str) -> Optional[Dict[str, Any]]:
+        """The scope's row as {"sketch", "updated_at"}, or None."""
+
+    @abstractmethod
+    def save_merchant_stats(self, scope: str, sketch: Dict[str, Any], updated_at: datetime,
+                            expected_updated_at: Optional[str]) -> bool:
+        """
+        Compare-and-set: write the sketch only if the stored row's updated_at is still
+        `expected_updated_at` (or, when None, no row exists yet). Returns whether it was written.
+        """
+
+    # --- user_statistics ---
+
+    @abstractmethod
+    def upsert_user_statistics(self, rec: Dict[str, Any]):
+        ...
@@ -0,0 +1,422 @@
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+from records import TRANSACTION_COLUMNS, TransactionRecord
+from storage.base import Storage, rollup_aggregates
+
+# Mirrors the tables in schema.sql that the backend reads and writes. Timestamps are stored
+# as fixed-width UTC ISO strings so they compare correctly as text; arrays and JSONB as JSON.
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS requisitions (
+  requisition_id TEXT PRIMARY KEY,
+  user_id TEXT NOT NULL,
+  institution_id TEXT NOT NULL,
+  created_at TEXT NOT NULL,
+  status TEXT NOT NULL,
+  updated_at TEXT
+);
+CREATE TABLE IF NOT EXISTS accounts (
+  account_id TEXT PRIMARY KEY,
+  user_id TEXT NOT NULL,
+  institution_id TEXT NOT NULL,
+  iban TEXT,
+  bban TEXT,
+  name TEXT,
+  owner_name TEXT,
+  status TEXT,
+  currency TEXT,
+  balances TEXT,
+  balances_updated_at TEXT,
+  created_at TEXT,
+  updated_at TEXT
+);
+CREATE TABLE IF NOT EXISTS fetch_logs (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  account_id TEXT NOT NULL,
+  scope TEXT NOT NULL,
+  fetched_at TEXT NOT NULL,
+  user_id TEXT
+);
+CREATE TABLE IF NOT EXISTS fetch_counters (
+  account_id TEXT NOT NULL,
+  scope TEXT NOT NULL,
+  recent_fetches TEXT NOT NULL DEFAULT '[]',
+  total_fetches INTEGER NOT NULL DEFAULT 0,
+  updated_at TEXT,
+  PRIMARY KEY (account_id, scope)
+);
+CREATE TABLE IF NOT EXISTS fetch_log_daily (
+  account_id TEXT NOT NULL,
+  scope TEXT NOT NULL,
+  day TEXT NOT NULL,
+  fetches INTEGER NOT NULL,
+  first_fetched_at TEXT,
+  last_fetched_at TEXT,
+  PRIMARY KEY (account_id, scope, day)
+);
+CREATE TABLE IF NOT EXISTS account_queue (
+  account_id TEXT PRIMARY KEY,
+  user_id TEXT NOT NULL,
+  status TEXT NOT NULL,
+  priority INTEGER NOT NULL DEFAULT 1,
+  attempts INTEGER NOT NULL DEFAULT 0,
+  next_attempt_at TEXT,
+  last_error TEXT,
+  processed_at TEXT,
+  created_at TEXT DEFAULT (strftime('%Y-%m-%dT%H:%M:%f000+00:00', 'now')),
+  updated_at TEXT
+);
+CREATE TABLE IF NOT EXISTS transactions (
+  transaction_id TEXT PRIMARY KEY,
+  account_id TEXT NOT NULL,
+  entry_reference TEXT,
+  internal_transaction_id TEXT,
+  additional_information TEXT,
+  merchant_name TEXT,
+  merchant_canonical TEXT,
+  amount REAL NOT NULL,
+  amount_minor INTEGER,
+  currency TEXT,
+  booking_date TEXT,
+  value_date TEXT,
+  proprietary_bank_transaction_code TEXT,
+  category TEXT,
+  spending_category TEXT,
+  status TEXT NOT NULL DEFAULT 'booked',
+  content_hash TEXT,
+  created_at TEXT
+);
+CREATE TABLE IF NOT EXISTS account_sync_state (
+  account_id TEXT PRIMARY KEY,
+  last_booked_date TEXT,
+  synced_at TEXT
+);
+CREATE TABLE IF NOT EXISTS merchant_stats (
+  scope TEXT PRIMARY KEY,
+  sketch TEXT NOT NULL,
+  updated_at TEXT
+);
+CREATE TABLE IF NOT EXISTS user_insights (
+  user_id TEXT PRIMARY KEY,
+  summary TEXT,
+  weekly TEXT,
+  spending_by_category TEXT,
+  weekly_averages TEXT,
+  tips TEXT,
+  deals TEXT,
+  top_categories TEXT,
+  subscriptions TEXT,
+  transaction_count INTEGER,
+  computed_at TEXT
+);
+CREATE TABLE IF NOT EXISTS user_statistics (
+  user_id TEXT PRIMARY KEY,
+  total_spending REAL,
+  total_income REAL,
+  category_spending TEXT,
+  monthly_spending TEXT,
+  top_merchants TEXT,
+  last_updated TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_accounts_user_id ON accounts(user_id);
+CREATE INDEX IF NOT EXISTS idx_transactions_account_booking ON transactions(account_id, booking_date, amount_minor, currency, category, merchant_canonical, merchant_name, status);
+CREATE INDEX IF NOT EXISTS idx_transactions_pending ON transactions(account_id) WHERE status = 'pending';
+CREATE INDEX IF NOT EXISTS idx_account_queue_due ON account_queue(status, priority, next_attempt_at);
+CREATE INDEX IF NOT EXISTS idx_fetch_logs_fetched_at ON fetch_logs(fetched_at);
+CREATE INDEX IF NOT EXISTS idx_requisitions_user_id ON requisitions(user_id, created_at);
+"""
+
+# SQLite has no GROUPING SETS, so the transaction_aggregates function in schema.sql is
+# expressed as one grouped scan per dimension over the same filtered rows
+AGGREGATES_SQL = """
+WITH t AS (
+  SELECT substr(booking_date, 1, 7) AS month,
+         COALESCE(category, 'Uncategorized') AS category,
+         COALESCE(merchant_canonical, merchant_name, 'Unknown') AS merchant,
+         currency,
+         amount_minor
+  FROM transactions
+  WHERE account_id IN ({placeholders}) AND booking_date >= ?
+)
+SELECT 'month' AS dimension, month AS key, currency, SUM(amount_minor) AS total, NULL AS spending, NULL AS income FROM t GROUP BY month, currency
+UNION ALL
+SELECT 'category', category, currency, SUM(amount_minor), NULL, NULL FROM t GROUP BY category, currency
+UNION ALL
+SELECT 'merchant', merchant, currency, SUM(amount_minor), NULL, NULL FROM t GROUP BY merchant, currency
+UNION ALL
+SELECT 'total', NULL, currency, SUM(amount_minor), SUM(CASE WHEN amount_minor < 0 THEN -amount_minor END),
+       SUM(CASE WHEN amount_minor >= 0 THEN amount_minor END) FROM t GROUP BY currency
+"""
+
+JSON_COLUMNS = ("balances", "sketch", "recent_fetches", "summary", "weekly", "spending_by_category",
+                "weekly_averages", "tips", "deals", "top_categories", "subscriptions")
+TIMESTAMP_COLUMNS = ("balances_updated_at", "next_attempt_at", "processed_at", "fetched_at", "synced_at", "updated_at", "created_at", "computed_at")
+
+def _timestamp(value) -> Optional[str]:
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%f+00:00")
+
+def _encode(column: str, value):
+    if column in JSON_COLUMNS:
+        return json.dumps(value)
+    if column in TIMESTAMP_COLUMNS:
+        return _timestamp(value)
+    return value
+
+def _decode(row: sqlite3.Row) -> Dict[str, Any]:
+    rec = dict(row)
+    for column in JSON_COLUMNS:
+        if rec.get(column) is not None:
+            rec[column] = json.loads(rec[column])
+    return rec
+
+class SQLiteStorage(Storage):
+    """
+    Embedded single-file storage in WAL mode, so the API and worker processes on one
+    node can share it. Multi-row writes go through one executemany in one transaction.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+
+    def _connection(self) -> sqlite3.Connection:
+        # one connection per thread and per process, as in cache.SQLiteCache
+        conn = getattr(self._local, "conn", None)
+        if conn is None or getattr(self._local, "pid", None) != os.getpid():
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5.0)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(SCHEMA)
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _query(self, sql: str, params: Sequence = ()) -> List[Dict[str, Any]]:
+        return [_decode(row) for row in self._connection().execute(sql, params).fetchall()]
+
+    def _execute(self, sql: str, params: Sequence = ()) -> int:
+        conn = self._connection()
+        with conn:
+            return conn.execute(sql, params).rowcount
+
+    def _upsert(self, table: str, rows: List[Dict[str, Any]], key: str):
+        """
+        Insert rows or update them in place on a `key` conflict, as one batched statement.
+        Every row must have the same columns as the first.
+        """
+        if not rows:
+            return
+        columns = list(rows[0])
+        if columns == [key]:
+            conflict = "DO NOTHING"
+        else:
+            conflict = "DO UPDATE SET " + ", ".join(f"{c} = excluded.{c}" for c in columns if c != key)
+        sql = (f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' for _ in columns)}) "
+               f"ON CONFLICT ({key}) {conflict}")
+        conn = self._connection()
+        with conn:
+            conn.executemany(sql, [tuple(_encode(c, row.get(c)) for c in columns) for row in rows])
+
+    def _update(self, table: str, changes: Dict[str, Any], key: str, value):
+        if not changes:
+            return
+        assignments = ", ".join(f"{c} = ?" for c in changes)
+        params = [_encode(c, v) for c, v in changes.items()] + [value]
+        self._execute(f"UPDATE {table} SET {assignments} WHERE {key} = ?", params)
+
+    def verify(self):
+        self._query("SELECT 1 FROM requisitions LIMIT 1")
+
+    def insert_requisition(self, rec):
+        columns = list(rec)
+        self._execute(
+            f"INSERT INTO requisitions ({', '.join(columns)}) VALUES ({', '.join('?' for _ in columns)})",
+            [_encode(c, rec[c]) for c in columns]
+        )
+        return rec
+
+    def latest_requisition(self, user_id):
+        rows = self._query(
+            "SELECT * FROM requisitions WHERE user_id = ? ORDER BY created_at DESC LIMIT 1", (user_id,)
+        )
+        return rows[0] if rows else None
+
+    def update_requisition_status(self, requisition_id, status):
+        self._update("requisitions", {"status": status, "updated_at": datetime.now(timezone.utc)},
+                     "requisition_id", requisition_id)
+
+    def linked_requisitions(self, user_id):
+        return self._query(
+            "SELECT requisition_id FROM requisitions WHERE user_id = ? AND status = 'LN'", (user_id,)
+        )
+
+    def get_account(self, account_id):
+        rows = self._query("SELECT * FROM accounts WHERE account_id = ? LIMIT 1", (account_id,))
+        return rows[0] if rows else None
+
+    def upsert_account(self, rec):
+        self._upsert("accounts", [rec], "account_id")
+
+    def save_account_balances(self, account_id, balances, updated_at):
+        self._update("accounts", {"balances": balances, "balances_updated_at": updated_at}, "account_id", account_id)
+
+    def log_fetch(self, account_id, scope, fetched_at, keep):
+        fetched_at = _timestamp(fetched_at)
+        conn = self._connection()
+        with conn:
+            # take the write lock up front so concurrent processes can't lose an update
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(
+                "INSERT INTO fetch_logs (account_id, scope, fetched_at) VALUES (?, ?, ?)",
+                (account_id, scope, fetched_at)
+            )
+            row = conn.execute(
+                "SELECT recent_fetches FROM fetch_counters WHERE account_id = ? AND scope = ?", (account_id, scope)
+            ).fetchone()
+            recent = sorted((json.loads(row[0]) if row else []) + [fetched_at])[-keep:]
+            conn.execute(
+                "INSERT INTO fetch_counters (account_id, scope, recent_fetches, total_fetches, updated_at) "
+                "VALUES (?, ?, ?, 1, ?) ON CONFLICT (account_id, scope) DO UPDATE SET "
+                "recent_fetches = excluded.recent_fetches, total_fetches = total_fetches + 1, "
+                "updated_at = excluded.updated_at",
+                (account_id, scope, json.dumps(recent), _timestamp(datetime.now(timezone.utc)))
+            )
+
+    def fetch_times(self, account_id, scope, since):
+        rows = self._query(
+            "SELECT recent_fetches FROM fetch_counters WHERE account_id = ? AND scope = ?", (account_id, scope)
+        )
+        since = _timestamp(since)
+        return [datetime.fromisoformat(t) for t in (rows[0]["recent_fetches"] if rows else []) if t >= since]
+
+    def compact_fetch_logs(self, before):
+        before = _timestamp(before)
+        conn = self._connection()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(
+                "INSERT INTO fetch_log_daily (account_id, scope, day, fetches, first_fetched_at, last_fetched_at) "
+                "SELECT account_id, scope, substr(fetched_at, 1, 10), COUNT(*), MIN(fetched_at), MAX(fetched_at) "
+                "FROM fetch_logs WHERE fetched_at < ? GROUP BY account_id, scope, substr(fetched_at, 1, 10) "
+                "ON CONFLICT (account_id, scope, day) DO UPDATE SET "
+                "fetches = fetches + excluded.fetches, "
+                "first_fetched_at = MIN(first_fetched_at, excluded.first_fetched_at), "
+                "last_fetched_at = MAX(last_fetched_at, excluded.last_fetched_at)",
+                (before,)
+            )
+            return conn.execute("DELETE FROM fetch_logs WHERE fetched_at < ?", (before,)).rowcount
+
+    def enqueue_account(self, rec):
+        self._upsert("account_queue", [rec], "account_id")
+
+    def update_queue_entry(self, account_id, changes):
+        self._update("account_queue", changes, "account_id", account_id)
+
+    def due_queue_entries(self, now, limit):
+        return self._query(
+            "SELECT account_id, user_id, status, priority, attempts, next_attempt_at, created_at "
+            "FROM account_queue WHERE status = 'pending' AND (next_attempt_at IS NULL OR next_attempt_at <= ?) "
+            "ORDER BY priority, next_attempt_at IS NOT NULL, next_attempt_at LIMIT ?",
+            (_timestamp(now), limit)
+        )
+
+    def queue_depth(self, statuses: Iterable[str]):
+        statuses = list(statuses)
+        counts = dict(self._connection().execute(
+            f"SELECT status, COUNT(*) FROM account_queue WHERE status IN ({', '.join('?' for _ in statuses)}) "
+            "GROUP BY status", statuses
+        ).fetchall())
+        return {status: counts.get(status, 0) for status in statuses}
+
+    def transactions_for_sync(self, account_id, date_from):
+        sql = ("SELECT transaction_id, status, content_hash, amount, amount_minor, currency, merchant_name, booking_date, value_date "
+               "FROM transactions WHERE account_id = ?")
+        if date_from:
+            return self._query(sql + " AND (booking_date >= ? OR status = 'pending')", (account_id, date_from))
+        return self._query(sql, (account_id,))
+
+    def upsert_transactions(self, rows):
+        self._upsert("transactions", rows, "transaction_id")
+
+    def delete_pending_transactions(self, transaction_ids):
+        if not transaction_ids:
+            return
+        conn = self._connection()
+        with conn:
+            conn.executemany("DELETE FROM transactions WHERE transaction_id = ? AND status = 'pending'",
+                             [(i,) for i in transaction_ids])
+
+    def account_transactions(self, account_id):
+        return self._query("SELECT * FROM transactions WHERE account_id = ?", (account_id,))
+
+    def transaction_aggregates(self, account_ids, since):
+        if not account_ids:
+            return rollup_aggregates([])
+        account_ids = list(account_ids)
+        sql = AGGREGATES_SQL.format(placeholders=", ".join("?" for _ in account_ids))
+        return rollup_aggregates(self._query(sql, account_ids + [since.isoformat()]))
+
+    def _user_transactions_sql(self) -> str:
+        columns = ", ".join("t." + column for column in TRANSACTION_COLUMNS)
+        return (f"SELECT {columns} FROM transactions t JOIN accounts a ON a.account_id = t.account_id "
+                "WHERE a.user_id = ? AND t.booking_date >= ?")
+
+    def user_transactions(self, user_id, since):
+        return self._query(self._user_transactions_sql(), (user_id, since.isoformat()))
+
+    def user_transaction_records(self, user_id, since):
+        # rows come back in TRANSACTION_COLUMNS order; none of them need decoding
+        cursor = self._connection().execute(self._user_transactions_sql(), (user_id, since.isoformat()))
+        return TransactionRecord.from_tuples(cursor.fetchall())
+
+    def set_spending_categories(self, categories):
+        conn = self._connection()
+        with conn:
+            conn.executemany(
+                "UPDATE transactions SET spending_category = ? WHERE transaction_id = ?",
+                [(category, transaction_id) for transaction_id, category in categories.items()]
+            )
+
+    def get_user_insights(self, user_id):
+        rows = self._query("SELECT * FROM user_insights WHERE user_id = ? LIMIT 1", (user_id,))
+        return rows[0] if rows else None
+
+    def save_user_insights(self, rec):
+        self._upsert("user_insights", [rec], "user_id")
+
+    def user_insights_version(self, user_id):
+        rows = self._query("SELECT computed_at FROM user_insights WHERE user_id = ? LIMIT 1", (user_id,))
+        return rows[0]["computed_at"] if rows else None
+
+    def get_sync_state(self, account_id):
+        rows = self._query("SELECT * FROM account_sync_state WHERE account_id = ? LIMIT 1", (account_id,))
+        return rows[0] if rows else None
+
+    def save_sync_state(self, rec):
+        self._upsert("account_sync_state", [rec], "account_id")
+
+    def get_merchant_stats(self, scope):
+        rows = self._query("SELECT sketch, updated_at FROM merchant_stats WHERE scope = ? LIMIT 1", (scope,))
+        return rows[0] if rows else None
+
+    def save_merchant_stats(self, scope, sketch, updated_at, expected_updated_at):
+        params = (_encode("sketch", sketch), _timestamp(updated_at))
+        if expected_updated_at is None:
+            sql = "INSERT INTO merchant_stats (sketch, updated_at, scope) VALUES (?, ?, ?) ON CONFLICT (scope) DO NOTHING"
+            return self._execute(sql, params + (scope,)) == 1
+        sql = "UPDATE merchant_stats SET sketch = ?, updated_at = ? WHERE scope = ? AND updated_at = ?"
+        return self._execute(sql, params + (scope, _timestamp(expected_updated_at))) == 1
+
+    def upsert_user_statistics(self, rec):
+        self._upsert("user_statistics", [rec], "user_id")
@@ -0,0 +1,180 @@
+from datetime import datetime
+from typing import Dict, Iterable, List
+
+from supabase import create_client, Client
+from postgrest.types import CountMethod
+
+from records import TRANSACTION_COLUMNS
+from storage.base import Storage, rollup_aggregates
+
+def _timestamp(value: datetime) -> str:
+    # PostgREST filters travel in the URL, where "+00:00" would decode as a space
+    return value.strftime("%Y-%m-%dT%H:%M:%S.%fZ") if value.utcoffset() is not None else value.isoformat()
+
+class SupabaseStorage(Storage):
+    def __init__(self, url: str, key: str):
+        self.client: Client = create_client(url, key)
+
+    def verify(self):
+        self.client.table("requisitions").select("*").limit(1).execute()
+
+    def insert_requisition(self, rec):
+        return self.client.table("requisitions").insert(rec).execute()
+
+    def latest_requisition(self, user_id):
+        resp = self.client.table("requisitions").select("*").eq("user_id", user_id) \
+            .order("created_at", desc=True).limit(1).execute()
+        return resp.data[0] if resp.data else None
+
+    def update_requisition_status(self, requisition_id, status):
+        self.client.table("requisitions").update({"status": status}).eq("requisition_id", requisition_id).execute()
+
+    def linked_requisitions(self, user_id):
+        resp = self.client.table("requisitions").select("requisition_id").eq("user_id", user_id).eq("status", "LN").execute()
+        return resp.data or []
+
+    def get_account(self, account_id):
+        resp = self.client.table("accounts").select("*").eq("account_id", account_id).limit(1).execute()
+        return resp.data[0] if resp.data else None
+
+    def upsert_account(self, rec):
+        self.client.table("accounts").upsert(rec, on_conflict="account_id").execute()
+
+    def save_account_balances(self, account_id, balances, updated_at):
+        self.client.table("accounts").update({
+            "balances": balances,
+            "balances_updated_at": updated_at.isoformat()
+        }).eq("account_id", account_id).execute()
+
+    def log_fetch(self, account_id, scope, fetched_at, keep):
+        self.client.rpc("record_fetch", {
+            "p_account_id": account_id,
+            "p_scope": scope,
+            "p_fetched_at": fetched_at.isoformat(),
+            "p_keep": keep
+        }).execute()
+
+    def fetch_times(self, account_id, scope, since):
+        resp = self.client.table("fetch_counters").select("recent_fetches") \
+            .eq("account_id", account_id).eq("scope", scope).limit(1).execute()
+        if not resp.data:
+            return []
+        times = [datetime.fromisoformat(t.replace("Z", "+00:00")) for t in resp.data[0]["recent_fetches"] or []]
+        return [t for t in times if t >= since]
+
+    def compact_fetch_logs(self, before):
+        return self.client.rpc("compact_fetch_logs", {"p_before": before.isoformat()}).execute().data or 0
+
+    def ensure_transaction_partitions(self, date_from, date_to):
+        return self.client.rpc("ensure_transaction_partitions", {
+            "p_from": date_from.isoformat(),
+            "p_to": date_to.isoformat()
+        }).execute().data or 0
+
+    def enqueue_account(self, rec):
+        self.client.table("account_queue").upsert(rec, on_conflict="account_id").execute()
+
+    def update_queue_entry(self, account_id, changes):
+        self.client.table("account_queue").update(changes).eq("account_id", account_id).execute()
+
+    def due_queue_entries(self, now, limit):
+        resp = self.client.table("account_queue") \
+            .select("account_id, user_id, status, priority, attempts, next_attempt_at, created_at") \
+            .eq("status", "pending") \
+            .or_(f"next_attempt_at.is.null,next_attempt_at.lte.{_timestamp(now)}") \
+            .order("priority").order("next_attempt_at", nullsfirst=True) \
+            .limit(limit) \
+            .execute()
+        return resp.data or []
+
+    def queue_depth(self, statuses: Iterable[str]):
+        depth = {}
+        for status in statuses:
+            result = self.client.table("account_queue").select("*", count=CountMethod.exact, head=True) \
+                .eq("status", status).execute()
+            depth[status] = result.count or 0
+        return depth
+
+    def transactions_for_sync(self, account_id, date_from):
+        query = self.client.table("transactions") \
+            .select("transaction_id, status, content_hash, amount, amount_minor, currency, merchant_name, booking_date, value_date") \
+            .eq("account_id", account_id)
+        if date_from:
+            query = query.or_(f"booking_date.gte.{date_from},status.eq.pending")
+        return query.execute().data or []
+
+    def upsert_transactions(self, rows):
+        if rows:
+            # transactions is partitioned by booking_date, which is part of its unique key
+            self.client.table("transactions").upsert(rows, on_conflict="transaction_id,booking_date").execute()
+
+    def delete_pending_transactions(self, transaction_ids):
+        if transaction_ids:
+            self.client.table("transactions").delete() \
+                .in_("transaction_id", transaction_ids).eq("status", "pending").execute()
+
+    def account_transactions(self, account_id):
+        return self.client.table("transactions").select("*").eq("account_id", account_id).execute().data or []
+
+    def transaction_aggregates(self, account_ids, since):
+        if not account_ids:
+            return rollup_aggregates([])
+        resp = self.client.rpc("transaction_aggregates", {
+            "p_account_ids": list(account_ids),
+            "p_since": since.isoformat()
+        }).execute()
+        return rollup_aggregates(resp.data or [])
+
+    def user_transactions(self, user_id, since):
+        accounts = self.client.table("accounts").select("account_id").eq("user_id", user_id).execute().data or []
+        if not accounts:
+            return []
+        return self.client.table("transactions") \
+            .select(", ".join(TRANSACTION_COLUMNS)) \
+            .in_("account_id", [row["account_id"] for row in accounts]) \
+            .gte("booking_date", since.isoformat()) \
+            .execute().data or []
+
+    def set_spending_categories(self, categories):
+        by_category: Dict[str, List[str]] = {}
+        for transaction_id, category in categories.items():
+            by_category.setdefault(category, []).append(transaction_id)
+        # one update per category rather than per row
+        for category, transaction_ids in by_category.items():
+            self.client.table("transactions").update({"spending_category": category}) \
+                .in_("transaction_id", transaction_ids).execute()
+
+    def get_user_insights(self, user_id):
+        resp = self.client.table("user_insights").select("*").eq("user_id", user_id).limit(1).execute()
+        return resp.data[0] if resp.data else None
+
+    def save_user_insights(self, rec):
+        self.client.table("user_insights").upsert(rec, on_conflict="user_id").execute()
+
+    def user_insights_version(self, user_id):
+        resp = self.client.table("user_insights").select("computed_at").eq("user_id", user_id).limit(1).execute()
+        return resp.data[0]["computed_at"] if resp.data else None
+
+    def get_sync_state(self, account_id):
+        resp = self.client.table("account_sync_state").select("*").eq("account_id", account_id).limit(1).execute()
+        return resp.data[0] if resp.data else None
+
+    def save_sync_state(self, rec):
+        self.client.table("account_sync_state").upsert(rec, on_conflict="account_id").execute()
+
+    def get_merchant_stats(self, scope):
+        resp = self.client.table("merchant_stats").select("sketch, updated_at").eq("scope", scope).limit(1).execute()
+        return resp.data[0] if resp.data else None
+
+    def save_merchant_stats(self, scope, sketch, updated_at, expected_updated_at):
+        rec = {"scope": scope, "sketch": sketch, "updated_at": updated_at.isoformat()}
+        if expected_updated_at is None:
+            # ON CONFLICT DO NOTHING: returns no row when another writer created it first
+            resp = self.client.table("merchant_stats").upsert(rec, on_conflict="scope", ignore_duplicates=True).execute()
+        else:
+            resp = self.client.table("merchant_stats").update(rec) \
+                .eq("scope", scope).eq("updated_at", expected_updated_at).execute()
+        return bool(resp.data)
+
+    def upsert_user_statistics(self, rec):
+        self.client.table("user_statistics").upsert(rec).execute()
@@ -0,0 +1,86 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("pydantic")
+
+import ai
+from resilience import CircuitBreaker
+
+class FakeStream:
+    def __init__(self, deltas, fail=None, delay=0.01):
+        self.chunks = [
+            SimpleNamespace(usage=None, choices=[SimpleNamespace(delta=SimpleNamespace(content=delta))])
+            for delta in deltas
+        ]
+        self.chunks.append(SimpleNamespace(usage=SimpleNamespace(prompt_tokens=5, completion_tokens=len(deltas)), choices=[]))
+        self.fail = fail
+        self.delay = delay
+        self.closed = False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        await asyncio.sleep(self.delay)
+        if self.fail and len(self.chunks) == 1:
+            raise self.fail
+        if not self.chunks:
+            raise StopAsyncIteration
+        return self.chunks.pop(0)
+
+    async def close(self):
+        self.closed = True
+
+@pytest.fixture
+def upstream(monkeypatch):
+    opened = []
+
+    def client(deltas, fail=None):
+        async def create(**request):
+            stream = FakeStream(deltas, fail)
+            opened.append(stream)
+            return stream
+        completions = SimpleNamespace(create=create)
+        monkeypatch.setattr(ai, "get_client", lambda: SimpleNamespace(chat=SimpleNamespace(completions=completions)))
+    monkeypatch.setattr(ai, "_breakers", {})
+    monkeypatch.setattr(ai, "_latencies", {})
+    client.opened = opened
+    return client
+
+async def read(**request):
+    return "".join([delta async for delta in ai.stream_chat_completion(**request)])
+
+def test_identical_streams_share_one_upstream_stream(upstream):
+    upstream(['{"tips": ', '["a"', ', "b"]}'])
+
+    async def both():
+        return await asyncio.gather(read(model="m", messages=[]), read(model="m", messages=[]))
+
+    assert asyncio.run(both()) == ['{"tips": ["a", "b"]}'] * 2
+    assert len(upstream.opened) == 1 and upstream.opened[0].closed
+    assert not ai._inflight_streams
+    assert len(ai._latencies["m"].samples) == 1
+
+def test_failure_mid_stream_counts_against_the_breaker(upstream):
+    upstream(["partial"], fail=ConnectionError("reset"))
+    ai._breakers["m"] = CircuitBreaker("m", min_calls=1)
+    with pytest.raises(ConnectionError):
+        asyncio.run(read(model="m", messages=[]))
+    assert ai._breakers["m"].state == "open"
+    assert upstream.opened[0].closed
+
+def test_stream_is_cancelled_when_its_last_reader_leaves(upstream):
+    upstream(["a", "b", "c"])
+
+    async def first_delta():
+        deltas = ai.stream_chat_completion(model="m", messages=[])
+        delta = await deltas.__anext__()
+        await deltas.aclose()
+        await asyncio.sleep(0.05)
+        return delta
+
+    assert asyncio.run(first_delta()) == "a"
+    assert upstream.opened[0].closed
+    assert not ai._inflight_streams
@@ -0,0 +1,28 @@
+import pytest
+
+# the tool schemas are built by openai-agents at import time
+pytest.importorskip("agents")
+
+import financial_agent
+from ai import Transaction
+
+def test_tools_build_their_schemas_at_import():
+    tools = {tool.name: tool for tool in financial_agent.FinancialAdvisorAgent.tools}
+    assert set(tools) == {"analyze_category_spending", "find_relevant_offers"}
+    assert "transactions" in tools["analyze_category_spending"].params_json_schema["properties"]
+
+def transaction(transaction_id, day, amount, category):
+    return Transaction(
+        transactionId=transaction_id, bookingDate=day, valueDate=day,
+        transactionAmount={"amount": amount, "currency": "GBP"},
+        remittanceInformationUnstructured="", proprietaryBankTransactionCode="FPO",
+        internalTransactionId=transaction_id, category=category
+    )
+
+def test_group_weekly_spending():
+    transactions = [
+        transaction("1", "2025-05-12", "-10.50", "groceries"),
+        transaction("2", "2025-05-14", "-4.50", "groceries"),
+        transaction("3", "2025-05-14", "2100.00", "other"),
+    ]
+    assert financial_agent.group_weekly_spending(transactions) == {"groceries": {"2025-05-12": 15.0}, "other": {}}
@@ -0,0 +1,21 @@
+from heavy_hitters import GLOBAL_SCOPE, MerchantHeavyHitters, SpaceSaving
+
+def test_space_saving_keeps_heavy_hitters_within_capacity():
+    sketch = SpaceSaving(capacity=3)
+    for merchant, spend in [("Tesco", 50), ("Netflix", 11), ("Pret", 4), ("Tesco", 30), ("Uber", 9), ("Tesco", 20)]:
+        sketch.update(merchant, spend)
+    assert len(sketch.counts) == 3
+    assert sketch.top(1) == [("Tesco", 100)]
+    assert SpaceSaving.from_dict(sketch.to_dict()).top(3) == sketch.top(3)
+
+def test_loaded_user_sketches_are_bounded():
+    hitters = MerchantHeavyHitters(max_users=2)
+    data = SpaceSaving(4).to_dict()
+    hitters.load(GLOBAL_SCOPE, data)
+    hitters.load("alice", data)
+    hitters.load("bob", None)
+    hitters.sketch("alice")
+    hitters.load("carol", data)
+    assert set(hitters.loaded) == {GLOBAL_SCOPE, "alice", "carol"}
+    assert hitters.sketch("bob") is None and hitters.loaded_at("bob") is None
+    assert hitters.sketch(GLOBAL_SCOPE) is not None
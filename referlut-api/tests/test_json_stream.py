@@ -0,0 +1,49 @@
+import asyncio
+
+from json_stream import JSONArrayParser, iter_json_array
+
+def test_parser_emits_elements_as_they_close():
+    parser = JSONArrayParser()
+    assert parser.feed('{"tips": ["save on ') == []
+    assert parser.feed('groceries", "cancel') == ["save on groceries"]
+    assert parser.feed(' gym", {"a": [1, 2]}, 3]} trailing') == ["cancel gym", {"a": [1, 2]}, 3]
+    assert parser.done
+    assert parser.feed('["ignored"]') == []
+
+def test_iter_json_array_drains_and_closes_the_stream():
+    read = []
+
+    async def chunks():
+        try:
+            for chunk in ('{"deals": [{"title": "x"}', ']}', "", "usage"):
+                read.append(chunk)
+                yield chunk
+        finally:
+            read.append("closed")
+
+    async def collect():
+        return [item async for item in iter_json_array(chunks())]
+
+    assert asyncio.run(collect()) == [{"title": "x"}]
+    # the chunk after the array (where the usage arrives) is still read
+    assert read == ['{"deals": [{"title": "x"}', "]}", "", "usage", "closed"]
+
+def test_iter_json_array_closes_the_stream_when_stopped_early():
+    read = []
+
+    async def chunks():
+        try:
+            for chunk in ('["a", ', '"b", ', '"c"]'):
+                read.append(chunk)
+                yield chunk
+        finally:
+            read.append("closed")
+
+    async def first():
+        items = iter_json_array(chunks())
+        item = await items.__anext__()
+        await items.aclose()
+        return item
+
+    assert asyncio.run(first()) == "a"
+    assert read == ['["a", ', "closed"]
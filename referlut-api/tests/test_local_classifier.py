@@ -0,0 +1,75 @@
+import json
+import os
+
+import local_classifier
+from local_classifier import (
+    NaiveBayesClassifier, evaluate, extract_features, flush_labels, get_model, load_labels,
+    record_label, save_model, split_holdout
+)
+
+SAMPLES = [
+    (extract_features("TESCO STORES 3217", -23.10, "FPO"), "groceries"),
+    (extract_features("TESCO EXPRESS", -4.50, "FPO"), "groceries"),
+    (extract_features("SAINSBURYS SUPERMARKET", -41.00, "FPO"), "groceries"),
+    (extract_features("TFL TRAVEL CHARGE", -7.80, "FPO"), "transportation"),
+    (extract_features("UBER TRIP", -12.40, "FPO"), "transportation"),
+    (extract_features("NETFLIX.COM", -10.99, "FPO"), "entertainment"),
+    (extract_features("SALARY ACME LTD", 2100.00, "BGC"), "other"),
+]
+
+def test_extract_features():
+    assert extract_features("Tesco Stores", -5, "FPO") == ["tesco", "stores", "sign:debit", "code:FPO"]
+    assert extract_features(None, 10, None) == ["sign:credit"]
+
+def test_fit_and_predict():
+    model = NaiveBayesClassifier().fit(SAMPLES)
+    category, confidence = model.predict(extract_features("TESCO METRO", -8.00, "FPO"))
+    assert category == "groceries"
+    assert 0.5 < confidence <= 1.0
+    assert model.predict(extract_features("TFL TRAVEL", -2.80, "FPO"))[0] == "transportation"
+
+def test_untrained_model_predicts_other():
+    assert NaiveBayesClassifier().predict(["tesco"]) == ("other", 0.0)
+
+def test_save_and_load_round_trip(tmp_path):
+    path = str(tmp_path / "model.json")
+    model = NaiveBayesClassifier().fit(SAMPLES)
+    save_model(model, path)
+    loaded = local_classifier.load_model(path)
+    features = extract_features("UBER", -9.00, "FPO")
+    assert loaded.predict(features) == model.predict(features)
+
+def test_get_model_reloads_after_retraining(tmp_path, monkeypatch):
+    monkeypatch.setattr(local_classifier, "_model", None)
+    monkeypatch.setattr(local_classifier, "_model_mtime", None)
+    path = str(tmp_path / "model.json")
+    assert get_model(path) is None
+
+    save_model(NaiveBayesClassifier().fit(SAMPLES[:3]), path)
+    first = get_model(path)
+    assert set(first.label_counts) == {"groceries"}
+    assert get_model(path) is first
+
+    save_model(NaiveBayesClassifier().fit(SAMPLES), path)
+    os.utime(path, (os.path.getmtime(path) + 1, os.path.getmtime(path) + 1))
+    assert "transportation" in get_model(path).label_counts
+
+def test_record_label_buffers_until_flushed(tmp_path, monkeypatch):
+    monkeypatch.setattr(local_classifier, "LABEL_FLUSH_SIZE", 2)
+    path = str(tmp_path / "labels.jsonl")
+    assert record_label("TESCO", -3.0, "FPO", "groceries", path) is False
+    assert not os.path.exists(path)
+    assert record_label("UBER", -9.0, None, "transportation", path) is True
+    flush_labels()
+    with open(path) as f:
+        rows = [json.loads(line) for line in f]
+    assert [row["category"] for row in rows] == ["groceries", "transportation"]
+    assert [label for _, label in load_labels(path)] == ["groceries", "transportation"]
+
+def test_holdout_split_keeps_evaluation_out_of_training():
+    training, held_out = split_holdout(SAMPLES, 0.3)
+    assert len(training) + len(held_out) == len(SAMPLES)
+    assert held_out and not any(sample in training for sample in held_out)
+    report = evaluate(NaiveBayesClassifier().fit(training), held_out, threshold=0.9)
+    assert report["rows"] == len(held_out)
+    assert 0.0 <= report["accuracy"] <= 1.0
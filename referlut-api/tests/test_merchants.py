@@ -0,0 +1,40 @@
+import pytest
+
+from merchants import MerchantIndex, normalize_merchant
+
+@pytest.mark.parametrize("raw, canonical", [
+    ("CARD PAYMENT TO TESCO STORES 3297 ON 12 MAY", "Tesco"),
+    ("SQ *PRET A MANGER", "Pret A Manger"),
+    ("AMZN Mktp UK*2K4L81XY5", "Amazon"),
+    ("UBER *EATS", "Uber Eats"),
+    ("DD TESCO MOBILE", "Tesco"),
+    ("NETFLIX.COM 12/05", "Netflix"),
+    ("", "Unknown"),
+    (None, "Unknown"),
+])
+def test_normalize_merchant(raw, canonical):
+    assert normalize_merchant(raw) == canonical
+
+@pytest.mark.parametrize("raw, canonical", [
+    ("BP CONNECT LONDON", "BP"),
+    ("BP 1234 WATFORD", "BP"),
+    ("BP", "BP"),
+    ("SO ENERGY", "So Energy"),
+])
+def test_short_rail_codes_keep_real_merchant_names(raw, canonical):
+    assert normalize_merchant(raw) == canonical
+
+@pytest.mark.parametrize("raw, canonical", [
+    ("SO: RENT LANDLORD", "Rent Landlord"),
+    ("BP - COUNCIL TAX", "Council Tax"),
+    ("SO*GYM GROUP", "Gym Group"),
+])
+def test_short_rail_codes_stripped_before_a_separator(raw, canonical):
+    assert normalize_merchant(raw) == canonical
+
+def test_merchant_index_interns_canonical_names():
+    index = MerchantIndex()
+    tesco = index.id_for("TESCO STORES 3297")
+    assert index.id_for("CARD PAYMENT TO TESCO EXPRESS") == tesco
+    assert index.id_for("NETFLIX.COM") != tesco
+    assert index.name(tesco) == "Tesco"
@@ -0,0 +1,24 @@
+import pytest
+
+from startup_budget import IMPORT_BUDGET_SECONDS, measure_import, parse_probe_output
+
+@pytest.fixture(scope="module")
+def startup():
+    # `import main` needs the app's own dependencies; the measurement runs in a fresh interpreter
+    pytest.importorskip("fastapi")
+    return measure_import()
+
+def test_parse_probe_output():
+    assert parse_probe_output("0.412\n\n") == (0.412, [])
+    assert parse_probe_output("startup noise\n0.5\nopenai,jwt\n") == (0.5, ["openai", "jwt"])
+
+def test_import_main_within_budget(startup):
+    elapsed, _ = startup
+    assert elapsed <= IMPORT_BUDGET_SECONDS, (
+        f"import main took {elapsed:.3f}s, over the {IMPORT_BUDGET_SECONDS:.3f}s budget; "
+        "run `python -X importtime -c 'import main'` to find the cost"
+    )
+
+def test_heavy_modules_load_lazily(startup):
+    _, eager = startup
+    assert not eager, f"imported eagerly by `import main`, should load on first use: {', '.join(eager)}"
@@ -1,59 +1,175 @@
-import os
 import time
+import asyncio
 import logging
-from datetime import datetime, timedelta
-from supabase import create_client, Client
-from banking import fetch_transactions
+import sqlite3
+from datetime import date, datetime, timedelta, timezone
+from banking import fetch_transactions, plan_refreshes, refresh_balances, verify_supabase_table
+from storage import get_storage
+from scheduler import PRIORITY_REFRESH, order_batch, failure_update, queue_metrics
+from quota import FETCH_LOG_RETENTION
+from notifier import PollingListener, queue_listener
+from analytics import precompute_user_insights
+from cache import purge_expired_entries
 from dotenv import load_dotenv
 
 # Load env
 load_dotenv()
-SUPABASE_URL = os.getenv("SUPABASE_URL")
-SUPABASE_KEY = os.getenv("SUPABASE_KEY")
-
-# Ensure environment variables are set
-if not SUPABASE_URL or not SUPABASE_KEY:
-    raise ValueError("SUPABASE_URL and SUPABASE_KEY environment variables must be set")
-
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+storage = get_storage()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("worker")
 
-POLL_INTERVAL = 60  # seconds
+POLL_INTERVAL = 60  # seconds, when nothing can wake the worker
+SAFETY_POLL_INTERVAL = 300  # seconds between scans when enqueues wake the worker
 TRANSACTION_MONTHS = 6
+BATCH_SIZE = 20
+QUEUE_SCAN_LIMIT = 1000  # queue rows considered per scan when picking a fair batch
+COMPACTION_INTERVAL = 3600  # seconds between maintenance runs (fetch_logs retention, partitions, cache purge)
+PARTITION_DAYS_AHEAD = 366  # keep a year of monthly transactions partitions ready
+PRECOMPUTE_TIMEOUT = 120  # seconds one user's precompute (classification, tips, deals) may take
+PRECOMPUTE_CONCURRENCY = 4  # users precomputed at once after a batch
+
+# one loop for the worker's lifetime, so the AI clients and in-flight request maps stay bound to it
+_loop = asyncio.new_event_loop()
+
+async def precompute_user(user_id: str, semaphore: asyncio.Semaphore):
+    async with semaphore:
+        started = time.monotonic()
+        try:
+            insights = await asyncio.wait_for(precompute_user_insights(storage, user_id), PRECOMPUTE_TIMEOUT)
+        except asyncio.TimeoutError:
+            logger.warning(f"Precomputing insights for user {user_id} exceeded {PRECOMPUTE_TIMEOUT}s, retrying after their next import")
+        except Exception as e:
+            logger.error(f"Error precomputing insights for user {user_id}: {e}")
+        else:
+            logger.info(f"Precomputed insights for user {user_id} from {insights['transaction_count']} transactions "
+                        f"in {time.monotonic() - started:.1f}s")
+
+def precompute(user_ids):
+    """
+    Post-import stage: classify the users' new rows and refresh their stored insights, tips and deals,
+    each bounded by PRECOMPUTE_TIMEOUT. Failures are logged and left for the next import; the
+    imports themselves already succeeded.
+    """
+    async def run():
+        semaphore = asyncio.Semaphore(PRECOMPUTE_CONCURRENCY)
+        await asyncio.gather(*(precompute_user(user_id, semaphore) for user_id in user_ids))
+    _loop.run_until_complete(run())
+
+def update_entry(acct_id: str, changes: dict):
+    storage.update_queue_entry(acct_id, changes)
+
+def process_entry(entry: dict, now: datetime) -> bool:
+    """
+    Import one due account. Returns whether its user's insights need precomputing.
+    """
+    acct_id = entry.get("account_id")
+    user_id = entry.get("user_id")
+    if acct_id is None:
+        logger.error(f"Skipping account with None account_id for user {user_id}")
+        return False
+    plan = plan_refreshes(str(acct_id))
+    if plan["balances"] <= now:
+        # balances are a cheap extra; a failure here doesn't hold up the transaction sync
+        try:
+            refresh_balances(str(acct_id))
+        except Exception as e:
+            logger.warning(f"Error refreshing balances for account {acct_id}: {e}")
+    if plan["transactions"] > now:
+        # Quota planner says not yet: defer without counting a failed attempt
+        next_refresh = min(plan_refreshes(str(acct_id)).values())
+        logger.info(f"Account {acct_id} has no scheduled transactions quota left, deferring to {next_refresh.isoformat()}")
+        update_entry(acct_id, {"next_attempt_at": next_refresh.isoformat()})
+        return False
+    logger.info(f"Processing account {acct_id} for user {user_id}")
+    try:
+        written = fetch_transactions(str(acct_id), user_id)
+    except Exception as e:
+        changes = failure_update(entry, str(e), now)
+        if changes["status"] == "dead":
+            logger.error(f"Account {acct_id} moved to dead letter after {changes['attempts']} attempts: {e}")
+        else:
+            logger.warning(f"Error processing account {acct_id} (attempt {changes['attempts']}), "
+                           f"retrying at {changes['next_attempt_at']}: {e}")
+        update_entry(acct_id, changes)
+        return False
+    # mark processed and schedule the next planned refresh of either scope
+    next_refresh = min(plan_refreshes(str(acct_id)).values())
+    update_entry(acct_id, {
+        "status": "pending",
+        "priority": PRIORITY_REFRESH,
+        "processed_at": datetime.now(timezone.utc).isoformat(),
+        "attempts": 0,
+        "last_error": None,
+        "next_attempt_at": next_refresh.isoformat()
+    })
+    logger.info(f"Finished processing account {acct_id}, next refresh at {next_refresh.isoformat()}")
+    return bool(user_id) and (written > 0 or storage.get_user_insights(user_id) is None)
+
+def queue_depth() -> dict:
+    return storage.queue_depth(("pending", "dead"))
+
+def run_once() -> int:
+    """
+    Scan the due part of the queue, log its metrics and process one fair batch. Returns entries processed.
+    """
+    now = datetime.now(timezone.utc)
+    entries = storage.due_queue_entries(now, QUEUE_SCAN_LIMIT)
+    logger.info(f"Queue metrics: {queue_metrics(entries, queue_depth(), now)}")
+    batch = order_batch(entries, now, BATCH_SIZE)
+    stale_users = {entry.get("user_id") for entry in batch if process_entry(entry, now)}
+    # after the whole batch is fetched, so slow model calls never hold up another account's import,
+    # and once per user however many of their accounts were in it
+    if stale_users:
+        precompute(stale_users)
+    return len(batch)
+
+def compact_fetch_logs():
+    """
+    Retention job: fold raw fetch_logs rows older than FETCH_LOG_RETENTION into the daily audit summary.
+    """
+    compacted = storage.compact_fetch_logs(datetime.now(timezone.utc) - FETCH_LOG_RETENTION)
+    if compacted:
+        logger.info(f"Compacted {compacted} fetch log rows into the daily summary")
+
+def ensure_partitions():
+    """
+    Maintenance job: create upcoming monthly transactions partitions so new rows never land in
+    the default partition, where they would defeat partition pruning.
+    """
+    today = date.today()
+    created = storage.ensure_transaction_partitions(today.replace(day=1), today + timedelta(days=PARTITION_DAYS_AHEAD))
+    if created:
+        logger.info(f"Created {created} transactions partitions")
+
+def purge_cache():
+    """
+    Maintenance job: delete expired entries from this node's shared cache file so it doesn't grow without bound.
+    """
+    try:
+        purged = purge_expired_entries()
+    except sqlite3.Error as e:
+        logger.warning(f"Could not purge the shared cache: {e}")
+        return
+    if purged:
+        logger.info(f"Purged {purged} expired cache entries")
 
 if __name__ == "__main__":
     logger.info("Starting account queue worker...")
+    verify_supabase_table()
+    listener = queue_listener()
+    idle_wait = POLL_INTERVAL if isinstance(listener, PollingListener) else SAFETY_POLL_INTERVAL
+    logger.info(f"Waiting for work with {type(listener).__name__}, scanning at least every {idle_wait}s")
+    last_compaction = 0.0
     while True:
         try:
-            # fetch pending accounts
-            resp = supabase.table("account_queue").select("account_id, user_id").eq("status", "pending").limit(20).execute()
-            queue = resp.data or []
-            if not queue:
-                time.sleep(POLL_INTERVAL)
-                continue
-            for entry in queue:
-                acct_id = entry.get("account_id")
-                user_id = entry.get("user_id")
-                logger.info(f"Processing account {acct_id} for user {user_id}")
-                # fetch and persist last 90 days via background fetch_transactions
-                try:
-                    if acct_id is not None:
-                        fetch_transactions(str(acct_id))
-                    else:
-                        logger.error(f"Skipping account with None account_id for user {user_id}")
-                        continue
-                    # mark processed
-                    supabase.table("account_queue").update({
-                        "status": "processed",
-                        "processed_at": datetime.utcnow().isoformat()
-                    }).eq("account_id", acct_id).execute()
-                    logger.info(f"Finished processing account {acct_id}")
-                except Exception as e:
-                    logger.error(f"Error processing account {acct_id}: {e}")
-                    # optionally retry later
-            # throttle between batches
-            time.sleep(POLL_INTERVAL)
+            if time.monotonic() - last_compaction > COMPACTION_INTERVAL:
+                last_compaction = time.monotonic()
+                compact_fetch_logs()
+                ensure_partitions()
+                purge_cache()
+            # only wait when there was nothing due; an enqueue ends the wait early
+            if not run_once():
+                listener.wait(idle_wait)
         except Exception as e:
             logger.error(f"Worker encountered error: {e}")
             time.sleep(POLL_INTERVAL)
@@ -3,7 +3,7 @@ import { Card, CardContent, CardHeader, CardTitle } from "@/components/ui/card";
 import { Button } from "@/components/ui/button";
 import { Badge } from "@/components/ui/badge";
 import { Collapsible, CollapsibleContent, CollapsibleTrigger } from "@/components/ui/collapsible";
-import { useState, useEffect } from "react";
+import { useState } from "react";
 import { apiClient } from "@/lib/apiClient";
 import React from "react";
 import { useNavigate } from "react-router-dom";
@@ -65,56 +65,37 @@ function cleanTipText(text: string) {
   return text.replace(/^£?\d+\.?\s*/, "").trim();
 }
 
-export function ExpertTips() {
+interface Subscription {
+  merchant: string;
+  active: boolean;
+}
+
+interface ExpertTipsProps {
+  // tips and detected recurring payments from the dashboard endpoint
+  tips?: string[] | null;
+  subscriptions?: Subscription[] | null;
+  loading?: boolean;
+  error?: string | null;
+}
+
+export function ExpertTips({ tips: tipTexts, subscriptions, loading = false, error = null }: ExpertTipsProps) {
   const [openAlerts, setOpenAlerts] = useState(true);
-  const [tips, setTips] = useState<Tip[]>([]);
-  const [loading, setLoading] = useState(true);
-  const [error, setError] = useState<string | null>(null);
   const navigate = useNavigate();
 
-  useEffect(() => {
-    const fetchTips = async () => {
-      try {
-        setLoading(true);
-        const response = await apiClient.ai.getInsights();
-        if (response.success && response.data.tips) {
-          // Convert the tips array to the required format
-          const formattedTips = response.data.tips.map((tip: string, index: number) => {
-            // Use the first sentence as title, cleaned
-            const firstSentence = cleanTipText(tip.split('.')[0]);
-            return {
-              id: index + 1,
-              title: firstSentence,
-              description: cleanTipText(tip)
-            };
-          });
-          setTips(formattedTips);
-        }
-      } catch (err) {
-        setError('Failed to load expert tips');
-        console.error('Error fetching tips:', err);
-      } finally {
-        setLoading(false);
-      }
-    };
-
-    fetchTips();
-  }, []);
+  // Use the first sentence of each tip as its title, cleaned
+  const tips: Tip[] = (tipTexts || []).map((tip, index) => ({
+    id: index + 1,
+    title: cleanTipText(tip.split('.')[0]),
+    description: cleanTipText(tip)
+  }));
 
   const handleTipClick = async (tip: string) => {
     try {
-      const response = await fetch("http://localhost:8000/api/ai/marketplace-for-tip", {
-        method: "POST",
-        headers: { "Content-Type": "application/json" },
-        body: JSON.stringify({ tip }),
-      });
-      if (!response.ok) {
-        const text = await response.text();
-        console.error("API error:", response.status, text);
-        alert("Failed to fetch offers for this tip.");
-        return;
-      }
-      const data = await response.json();
+      // offers from brands the user already pays regularly are ranked first
+      const recurringMerchants = (subscriptions || [])
+        .filter((subscription) => subscription.active)
+        .map((subscription) => subscription.merchant);
+      const data = await apiClient.ai.getMarketplaceForTip(tip, recurringMerchants);
       navigate("/marketplace", { state: { offers: data.offers } });
     } catch (err) {
       console.error("Fetch error:", err);
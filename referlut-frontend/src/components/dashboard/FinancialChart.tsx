@@ -1,6 +1,6 @@
 import { TrendingUp } from "lucide-react";
 import { CartesianGrid, Line, LineChart, XAxis, Tooltip } from "recharts";
-import { useEffect, useState } from "react";
+import { useState } from "react";
 
 import {
   Card,
@@ -105,57 +105,28 @@ const chartConfig = {
   },
 } as ChartConfig;
 
-export function FinancialChart() {
-  const [chartData, setChartData] = useState<ChartData[]>([]);
-  const [selectedCategory, setSelectedCategory] = useState("all");
-  const [loading, setLoading] = useState(true);
-  const [error, setError] = useState<string | null>(null);
-
-  useEffect(() => {
-    const fetchChartData = async () => {
-      try {
-        setLoading(true);
-        setError(null);
-
-        // Use a mock token for development
-        const token = "mock_token";
-
-        const response = await fetch(`${import.meta.env.VITE_API_URL || 'http://127.0.0.1:8000'}/api/statistics/spending/chart?category=${selectedCategory}`, {
-          headers: {
-            'Authorization': `Bearer ${token}`,
-            'Content-Type': 'application/json',
-          },
-        });
-
-        if (!response.ok) {
-          throw new Error(`HTTP error! status: ${response.status}`);
-        }
-
-        const data = await response.json();
+// Weeks with spending in one category, like the API's filter_chart_category
+const filterChartCategory = (data: ChartData[], category: string): ChartData[] => {
+  if (category === "all") return data;
+  return data
+    .filter((item) => (item.categories[category] || 0) > 0)
+    .map((item) => ({
+      week: item.week,
+      total: item.categories[category],
+      categories: { [category]: item.categories[category] },
+    }));
+};
 
-        if (data.success) {
-          if (!data.data || data.data.length === 0) {
-            setError("No spending data available");
-            setChartData([]);
-          } else {
-            setChartData(data.data);
-          }
-        } else {
-          setError(data.error || "Failed to fetch chart data");
-          setChartData([]);
-        }
-      } catch (err) {
-        const errorMessage = err instanceof Error ? err.message : "Failed to fetch chart data";
-        setError(errorMessage);
-        console.error("Error fetching chart data:", err);
-        setChartData([]);
-      } finally {
-        setLoading(false);
-      }
-    }
+interface FinancialChartProps {
+  // spending_chart from the dashboard endpoint, for every category
+  data?: ChartData[] | null;
+  loading?: boolean;
+  error?: string | null;
+}
 
-    fetchChartData();
-  }, [selectedCategory]);
+export function FinancialChart({ data, loading = false, error = null }: FinancialChartProps) {
+  const [selectedCategory, setSelectedCategory] = useState("all");
+  const chartData = filterChartCategory(data || [], selectedCategory);
 
   const calculateTrend = () => {
     if (chartData.length < 2) return 0;
@@ -192,15 +163,7 @@ export function FinancialChart() {
               </div>
             ) : error ? (
               <div className="h-[200px] flex items-center justify-center">
-                <div className="text-center">
-                  <div className="text-red-500 mb-2">{error}</div>
-                  <button
-                    onClick={() => setSelectedCategory(selectedCategory)}
-                    className="text-sm text-primary hover:underline"
-                  >
-                    Try again
-                  </button>
-                </div>
+                <div className="text-red-500">{error}</div>
               </div>
             ) : chartData.length === 0 ? (
               <div className="h-[200px] flex items-center justify-center text-muted-foreground">
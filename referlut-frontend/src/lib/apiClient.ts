@@ -255,6 +255,38 @@ export const apiClient = {
         token
       );
     },
+
+    /**
+     * Get detected recurring payments with next expected date and monthly cost
+     */
+    getSubscriptions: async (token?: string, authProvider: string = "auth0") => {
+      return apiClient.fetch(
+        "/api/statistics/subscriptions",
+        { authProvider },
+        token
+      );
+    },
+  },
+
+  /**
+   * Dashboard endpoint: every panel in one request
+   */
+  dashboard: {
+    /**
+     * Get summary, spending chart, expert tips and deals. Panels still being
+     * computed are null and listed in `pending`.
+     */
+    get: async (
+      category = "all",
+      token?: string,
+      authProvider: string = "auth0"
+    ) => {
+      return apiClient.fetch(
+        `/api/dashboard?category=${category}`,
+        { authProvider },
+        token
+      );
+    },
   },
 
   /**
@@ -352,6 +384,27 @@ export const apiClient = {
         token
       );
     },
+
+    /**
+     * Get marketplace offers matching a tip; offers from the user's recurring
+     * merchants are ranked first
+     */
+    getMarketplaceForTip: async (
+      tip: string,
+      recurringMerchants: string[] = [],
+      token?: string,
+      authProvider: string = "auth0"
+    ) => {
+      return apiClient.fetch(
+        `/api/ai/marketplace-for-tip`,
+        {
+          method: "POST",
+          body: { tip, recurring_merchants: recurringMerchants },
+          authProvider,
+        },
+        token
+      );
+    },
   },
 };
 
@@ -1,4 +1,4 @@
-import { useState } from "react";
+import { useEffect, useState } from "react";
 import { Search, Plus } from "lucide-react";
 import { Button } from "@/components/ui/button";
 import { Input } from "@/components/ui/input";
@@ -6,10 +6,49 @@ import { FinancialChart } from "@/components/dashboard/FinancialChart";
 import { ExpertTips } from "@/components/dashboard/ExpertTips";
 import { Link } from "react-router-dom";
 import { useAuth0 } from "@auth0/auth0-react"; // Import Auth0 hook directly
+import { apiClient } from "@/lib/apiClient";
+
+// How long to wait before asking again for panels the API reports as still pending
+const PENDING_RETRY_MS = 5000;
 
 const Dashboard = () => {
   const [searchQuery, setSearchQuery] = useState("");
-  const { user, isLoading } = useAuth0(); // Use Auth0's hook to get user data
+  const { user, isLoading, isAuthenticated, getAccessTokenSilently } = useAuth0(); // Use Auth0's hook to get user data
+  const [dashboard, setDashboard] = useState<any>(null);
+  const [dashboardLoading, setDashboardLoading] = useState(true);
+  const [dashboardError, setDashboardError] = useState<string | null>(null);
+
+  // Every panel comes from one request; the chart filters its categories client-side
+  useEffect(() => {
+    if (isLoading) return;
+    let cancelled = false;
+    let retry: ReturnType<typeof setTimeout> | undefined;
+
+    const fetchDashboard = async () => {
+      try {
+        const token = isAuthenticated ? await getAccessTokenSilently() : undefined;
+        const data = await apiClient.dashboard.get("all", token);
+        if (cancelled) return;
+        setDashboard(data);
+        setDashboardError(null);
+        if (data.pending?.length) {
+          retry = setTimeout(fetchDashboard, PENDING_RETRY_MS);
+        }
+      } catch (err) {
+        if (cancelled) return;
+        console.error("Error fetching dashboard:", err);
+        setDashboardError("Failed to load dashboard");
+      } finally {
+        if (!cancelled) setDashboardLoading(false);
+      }
+    };
+
+    fetchDashboard();
+    return () => {
+      cancelled = true;
+      clearTimeout(retry);
+    };
+  }, [isLoading, isAuthenticated, getAccessTokenSilently]);
 
   // Get the user's name, with fallbacks
   const userName = user?.name || user?.nickname || "User";
@@ -59,12 +98,21 @@ const Dashboard = () => {
         <div className="grid grid-cols-1 lg:grid-cols-3 gap-6 mb-6">
           {/* Financial Chart - Takes up 2/3 on larger screens */}
           <div className="lg:col-span-2">
-            <FinancialChart />
+            <FinancialChart
+              data={dashboard?.spending_chart}
+              loading={dashboardLoading || (!dashboard?.spending_chart && dashboard?.pending?.includes("statistics"))}
+              error={dashboardError || dashboard?.errors?.statistics}
+            />
           </div>
 
           {/* Expert Tips - Takes up 1/3 on larger screens */}
           <div className="lg:col-span-1">
-            <ExpertTips />
+            <ExpertTips
+              tips={dashboard?.tips}
+              subscriptions={dashboard?.subscriptions}
+              loading={dashboardLoading || (!dashboard?.tips && dashboard?.pending?.includes("ai"))}
+              error={dashboardError || dashboard?.errors?.ai}
+            />
           </div>
         </div>
 